@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""
+admission.py
+------------
+HF uç noktasına giden LLM çağrıları için sınırlı kabul kuyruğu (admission control).
+
+`qa` süreç genelinde tek bir nesne (st.cache_resource); ani yoğunlukta tüm oturumlar aynı
+anda HF'e gider, rate limit'e takılır ve hep birlikte zaman aşımına uğrar. AdmissionQueue:
+- aynı anda en fazla `limit` çağrıya izin verir, gerisini FIFO sırada bekletir
+- kuyrukta en fazla `max_queue` istek tutar; dolarsa yeni istek hemen reddedilir (QueueFull)
+- `timeout` saniyeden uzun bekleyen istek kuyruktan çıkar (QueueTimeout)
+- bekleyenlere sıradaki yerlerini bildirir (listen(...) ile bağlanan geri çağırma)
+
+Hem thread'lerden (slot) hem event loop'tan (aslot) kullanılabilir; ikisi aynı kuyruğu
+paylaşır. Boşalan yer doğrudan sıradaki bekleyene devredilir (araya giren olamaz).
+
+Kullanım:
+    queue = AdmissionQueue(limit=4, max_queue=32, timeout=30)
+    with listen(lambda pos: print("sıradaki yerin:", pos)):
+        with queue.slot() as ticket:
+            ...  # HF çağrısı; ticket.waited_ms kuyrukta geçen süre
+"""
+
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Callable, Deque, Iterator, Optional
+
+import metrics
+
+ADMISSION_LIMIT = int(os.getenv("FOCUSIA_LLM_CONCURRENCY", "4"))            # 0 = sınırsız (kuyruk kapalı)
+ADMISSION_MAX_QUEUE = int(os.getenv("FOCUSIA_LLM_QUEUE_SIZE", "32"))        # bekleyebilecek en fazla istek
+ADMISSION_TIMEOUT = float(os.getenv("FOCUSIA_LLM_QUEUE_TIMEOUT", "30"))     # kuyrukta en fazla bekleme (sn)
+
+_POLL_S = 0.25  # bekleyenlerin sıra bilgisini yenileme aralığı
+
+_WAIT_SECONDS = metrics.histogram("focusia_admission_wait_seconds", "LLM kabul kuyruğunda bekleme süresi")
+_REJECTED = metrics.counter("focusia_admission_rejected_total", "Kabul kuyruğunda reddedilen istekler (reason=full|timeout)")
+
+# Süren isteğin sıra bilgisi dinleyicisi (thread/async görev başına; submit() ile loop'a da taşınır)
+_LISTENER: contextvars.ContextVar[Optional[Callable[[int], None]]] = contextvars.ContextVar(
+    "focusia_admission_listener", default=None
+)
+
+
+class AdmissionError(RuntimeError):
+    """Kabul kuyruğu isteği geri çevirdi (mesaj kullanıcıya gösterilebilir)."""
+
+
+class QueueFull(AdmissionError):
+    pass
+
+
+class QueueTimeout(AdmissionError, TimeoutError):
+    pass
+
+
+@contextmanager
+def listen(callback: Callable[[int], None]) -> Iterator[None]:
+    """
+    Blok içinde başlayan isteklerin sıra bilgisini callback'e iletir:
+    kuyrukta beklerken 1, 2, ... (sıradaki yer), kabul edilince 0.
+    callback bekleyen thread'de (async yolda loop thread'inde) çağrılır.
+    """
+    token = _LISTENER.set(callback)
+    try:
+        yield
+    finally:
+        _LISTENER.reset(token)
+
+
+def _report(position: int) -> None:
+    callback = _LISTENER.get()
+    if callback is None:
+        return
+    try:
+        callback(position)
+    except Exception as e:  # arayüz hatası isteği düşürmesin
+        print(f"[Admission] Sıra bildirimi başarısız: {e}")
+
+
+class Ticket:
+    """Kabul edilen isteğin özeti: ilk sıradaki yeri (0 = beklemeden) ve bekleme süresi."""
+    __slots__ = ("position", "waited_ms")
+
+    def __init__(self, position: int, waited_ms: float):
+        self.position = position
+        self.waited_ms = waited_ms
+
+
+class _Waiter:
+    __slots__ = ("granted", "event", "loop", "future")
+
+    def __init__(self) -> None:
+        self.granted = False
+        self.event: Optional[threading.Event] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.future: Optional[asyncio.Future] = None
+
+    def wake(self) -> None:
+        if self.event is not None:
+            self.event.set()
+        elif self.loop is not None and self.future is not None:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class AdmissionQueue:
+    """
+    Sınırlı eşzamanlılık + sınırlı FIFO kuyruk.
+    - limit: aynı anda kabul edilen en fazla istek
+    - max_queue: kuyrukta bekleyebilecek en fazla istek (aşılırsa QueueFull)
+    - timeout: kuyrukta en fazla bekleme (sn); aşılırsa QueueTimeout. 0 = süresiz
+    """
+    def __init__(
+        self,
+        limit: int = ADMISSION_LIMIT,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+        timeout: float = ADMISSION_TIMEOUT,
+    ):
+        self.limit = max(1, int(limit))
+        self.max_queue = max(0, int(max_queue))
+        self.timeout = float(timeout)
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiters: Deque[_Waiter] = deque()
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    # ---- iç yardımcılar ----
+
+    def _enter(self, waiter: _Waiter) -> int:
+        """Yer varsa hemen kabul (0); yoksa kuyruğa ekler ve sıradaki yeri döner."""
+        with self._lock:
+            if self._active < self.limit and not self._waiters:
+                self._active += 1
+                return 0
+            if len(self._waiters) >= self.max_queue:
+                _REJECTED.inc(reason="full")
+                raise QueueFull(
+                    f"Şu anda çok yoğunuz ({len(self._waiters)} kişi sırada). Lütfen biraz sonra tekrar dene."
+                )
+            self._waiters.append(waiter)
+            return len(self._waiters)
+
+    def _position(self, waiter: _Waiter) -> int:
+        with self._lock:
+            try:
+                return self._waiters.index(waiter) + 1
+            except ValueError:
+                return 0
+
+    def _abandon(self, waiter: _Waiter) -> bool:
+        """Bekleyeni kuyruktan çıkarır; yer zaten devredildiyse False (çağıran serbest bırakmalı)."""
+        with self._lock:
+            if waiter.granted:
+                return False
+            self._waiters.remove(waiter)
+            return True
+
+    def _timed_out(self, waited: float) -> QueueTimeout:
+        _REJECTED.inc(reason="timeout")
+        return QueueTimeout(f"Sıra bekleme süresi doldu ({waited:.0f} sn). Lütfen biraz sonra tekrar dene.")
+
+    def release(self) -> None:
+        with self._lock:
+            if self._waiters:
+                waiter = self._waiters.popleft()  # yer doğrudan devredilir, _active değişmez
+                waiter.granted = True
+                waiter.wake()
+            else:
+                self._active -= 1
+
+    def _admitted(self, position: int, started: float) -> Ticket:
+        waited = time.perf_counter() - started
+        _WAIT_SECONDS.observe(waited)
+        if position:
+            _report(0)
+        return Ticket(position, waited * 1000.0)
+
+    # ---- thread arayüzü ----
+
+    def acquire(self) -> Ticket:
+        """Yer açılana kadar bekler (thread'i bloklar); release() ile bırakılmalı."""
+        started = time.perf_counter()
+        waiter = _Waiter()
+        waiter.event = threading.Event()
+        position = self._enter(waiter)
+        if not position:
+            return self._admitted(0, started)
+
+        last = position
+        _report(position)
+        try:
+            while not waiter.event.wait(_POLL_S):
+                waited = time.perf_counter() - started
+                if self.timeout > 0 and waited >= self.timeout and self._abandon(waiter):
+                    raise self._timed_out(waited)
+                current = self._position(waiter)
+                if current and current != last:
+                    last = current
+                    _report(current)
+        except QueueTimeout:
+            raise
+        except BaseException:
+            if not self._abandon(waiter):
+                self.release()  # tam devredilirken kesildik; yeri geri ver
+            raise
+        return self._admitted(position, started)
+
+    @contextmanager
+    def slot(self) -> Iterator[Ticket]:
+        ticket = self.acquire()
+        try:
+            yield ticket
+        finally:
+            self.release()
+
+    # ---- async arayüz ----
+
+    async def aacquire(self) -> Ticket:
+        """acquire'ın async karşılığı: loop'u bloklamadan bekler; görev iptali kuyruktan çıkarır."""
+        started = time.perf_counter()
+        waiter = _Waiter()
+        waiter.loop = asyncio.get_running_loop()
+        waiter.future = waiter.loop.create_future()
+        position = self._enter(waiter)
+        if not position:
+            return self._admitted(0, started)
+
+        last = position
+        _report(position)
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(asyncio.shield(waiter.future), _POLL_S)
+                    break
+                except asyncio.TimeoutError:
+                    pass
+                if waiter.granted:
+                    break  # devredildi; future sonucu bir sonraki tur gelecekti
+                waited = time.perf_counter() - started
+                if self.timeout > 0 and waited >= self.timeout and self._abandon(waiter):
+                    raise self._timed_out(waited)
+                current = self._position(waiter)
+                if current and current != last:
+                    last = current
+                    _report(current)
+        except QueueTimeout:
+            raise
+        except BaseException:
+            if not self._abandon(waiter):
+                self.release()
+            raise
+        return self._admitted(position, started)
+
+    @asynccontextmanager
+    async def aslot(self) -> AsyncIterator[Ticket]:
+        ticket = await self.aacquire()
+        try:
+            yield ticket
+        finally:
+            self.release()
+
+
+def make_admission_queue() -> Optional[AdmissionQueue]:
+    """Ortam değişkenlerine göre kuyruk; FOCUSIA_LLM_CONCURRENCY=0 ise None (sınırsız)."""
+    if ADMISSION_LIMIT <= 0:
+        return None
+    return AdmissionQueue(ADMISSION_LIMIT, ADMISSION_MAX_QUEUE, ADMISSION_TIMEOUT)
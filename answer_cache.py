@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+answer_cache.py
+---------------
+LLM'in önünde duran anlamsal yanıt önbelleği.
+
+Birçok kullanıcı neredeyse aynı şikayeti yazar ("telefona bakıyorum, odaklanamıyorum").
+Bir yanıt şu iki koşul sağlandığında yeniden kullanılır:
+- sorgu embedding'inin önbellekteki sorguya kosinüs benzerliği eşiğin üzerinde, ve
+- retriever'ın getirdiği kaynak kümesi (belge içerikleri) birebir aynı.
+Kaynak kümesi şartı, benzer görünen ama farklı bağlam getiren sorguların yanlış yanıt
+almasını engeller; indeks değişince eski yanıtlar da kendiliğinden eşleşmez.
+
+- Boyut (LRU) ve süre (TTL) ile tahliye
+- İsteğe bağlı diske kalıcılık (.npz: vektörler + JSON kayıtlar, atomik yazım)
+- hits / misses sayaçları (+ metrics: focusia_answer_cache_total{result=...})
+
+Kullanım:
+    cache = AnswerCache(max_entries=512, ttl=3600, threshold=0.92, path="answer_cache.npz")
+    skey = source_key(docs)
+    answer = cache.get(query_vec, skey)
+    if answer is None:
+        answer = llm.invoke(...)
+        cache.put(query_vec, skey, answer)
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+import metrics
+
+ANSWER_CACHE_ENABLED = os.getenv("FOCUSIA_ANSWER_CACHE", "1") != "0"
+ANSWER_CACHE_SIZE = int(os.getenv("FOCUSIA_ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL = float(os.getenv("FOCUSIA_ANSWER_CACHE_TTL", "3600"))          # sn; 0 = süresiz
+ANSWER_CACHE_THRESHOLD = float(os.getenv("FOCUSIA_ANSWER_CACHE_THRESHOLD", "0.92"))
+ANSWER_CACHE_PATH = os.getenv("FOCUSIA_ANSWER_CACHE_PATH", "")                    # boş = yalnızca bellek
+
+_LOOKUPS = metrics.counter("focusia_answer_cache_total", "Anlamsal yanıt önbelleği sorguları (result=hit|miss)")
+
+
+def source_key(docs: Sequence[Any]) -> str:
+    """Getirilen belge kümesinin sıradan bağımsız özeti (page_content üzerinden)."""
+    digests = sorted(
+        hashlib.blake2b(getattr(d, "page_content", str(d)).encode("utf-8"), digest_size=16).hexdigest()
+        for d in docs
+    )
+    return hashlib.blake2b("".join(digests).encode("ascii"), digest_size=16).hexdigest()
+
+
+class _Entry:
+    __slots__ = ("vector", "source", "answer", "created")
+
+    def __init__(self, vector: np.ndarray, source: str, answer: str, created: float):
+        self.vector = vector
+        self.source = source
+        self.answer = answer
+        self.created = created
+
+
+class AnswerCache:
+    """
+    Sorgu vektörü + kaynak kümesi → son işlenmiş yanıt.
+    - max_entries: en fazla kayıt (aşılınca en uzun süredir kullanılmayan silinir)
+    - ttl: kaydın geçerlilik süresi (sn); 0 ya da negatif = süresiz
+    - threshold: isabet için gereken en düşük kosinüs benzerliği
+    - path: verilirse kayıtlar bu .npz dosyasına yazılır ve açılışta okunur
+    - namespace: model/prompt kimliği; diskteki dosya başka bir namespace'e aitse yok sayılır
+    """
+    def __init__(
+        self,
+        max_entries: int = ANSWER_CACHE_SIZE,
+        ttl: float = ANSWER_CACHE_TTL,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        path: Optional[str] = None,
+        namespace: str = "",
+    ):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = float(ttl)
+        self.threshold = float(threshold)
+        self.path = Path(path) if path else None
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()  # LRU sırası: baş = en eski
+        self._by_source: Dict[str, List[int]] = {}
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+        if self.path is not None and self.path.exists():
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # ---- iç yardımcılar (kilit altında çağrılır) ----
+
+    def _expired(self, entry: _Entry, now: float) -> bool:
+        return self.ttl > 0 and now - entry.created > self.ttl
+
+    def _drop(self, eid: int) -> None:
+        entry = self._entries.pop(eid)
+        ids = self._by_source.get(entry.source, [])
+        if eid in ids:
+            ids.remove(eid)
+        if not ids:
+            self._by_source.pop(entry.source, None)
+
+    def _insert(self, entry: _Entry) -> None:
+        eid = self._next_id
+        self._next_id += 1
+        self._entries[eid] = entry
+        self._by_source.setdefault(entry.source, []).append(eid)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    # ---- genel arayüz ----
+
+    def get(self, query_vector: Sequence[float], source: str) -> Optional[str]:
+        """Eşleşen (benzer sorgu + aynı kaynak kümesi, süresi dolmamış) yanıt; yoksa None."""
+        q = np.asarray(query_vector, dtype=np.float32)
+        norm = float(np.linalg.norm(q))
+        with self._lock:
+            now = time.time()
+            best_id, best_sim = None, self.threshold
+            for eid in list(self._by_source.get(source, ())):
+                entry = self._entries[eid]
+                if self._expired(entry, now):
+                    self._drop(eid)
+                    continue
+                sim = float(entry.vector @ q) / norm if norm else 0.0
+                if sim >= best_sim:
+                    best_id, best_sim = eid, sim
+            if best_id is None:
+                self.misses += 1
+                _LOOKUPS.inc(result="miss")
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            _LOOKUPS.inc(result="hit")
+            return self._entries[best_id].answer
+
+    def put(self, query_vector: Sequence[float], source: str, answer: str) -> None:
+        q = np.asarray(query_vector, dtype=np.float32)
+        norm = float(np.linalg.norm(q))
+        if not answer or not norm:
+            return
+        with self._lock:
+            self._insert(_Entry(q / norm, source, answer, time.time()))
+            if self.path is not None:
+                self._save()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_source.clear()
+            if self.path is not None and self.path.exists():
+                self.path.unlink()
+
+    # ---- diske kalıcılık ----
+
+    def _save(self) -> None:
+        entries = list(self._entries.values())
+        dim = entries[0].vector.shape[0] if entries else 0
+        vectors = np.stack([e.vector for e in entries]) if entries else np.zeros((0, dim), dtype=np.float32)
+        records = [{"source": e.source, "answer": e.answer, "created": e.created} for e in entries]
+        meta = json.dumps({"namespace": self.namespace, "entries": records}, ensure_ascii=False)
+        tmp = self.path.with_name(self.path.name + ".tmp.npz")
+        np.savez(tmp, vectors=vectors, meta=np.array(meta))
+        os.replace(tmp, self.path)
+
+    def _load(self) -> None:
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                vectors = data["vectors"]
+                meta = json.loads(str(data["meta"]))
+        except Exception as e:
+            print(f"[AnswerCache] {self.path} okunamadı, boş önbellekle başlanıyor: {e}")
+            return
+        if meta.get("namespace") != self.namespace:
+            return
+        now = time.time()
+        for vec, rec in zip(vectors, meta.get("entries", [])):
+            entry = _Entry(vec.astype(np.float32), rec["source"], rec["answer"], float(rec["created"]))
+            if not self._expired(entry, now):
+                self._insert(entry)
+        print(f"[AnswerCache] Loaded {len(self._entries)} cached answers from: {self.path}")
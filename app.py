@@ -3,10 +3,17 @@
 # Amaç: Kullanıcıdan kısa bir durum alıp, RAG (Chroma + MMR) bağlamıyla
 #       HuggingFace LLM'e vererek 3 öneri + 1 mini egzersiz üretmek.
 
+import hmac
 import os
+import uuid
+from concurrent.futures import CancelledError, TimeoutError as FutureTimeout
 import streamlit as st
-from data_loader import build_or_load_chroma   # Chroma DB kurulum/yükleme
-from rag_pipeline import make_retrieval_chain  # LLM + retriever + prompt zinciri
+import metrics                                  # Prometheus uç noktası / dosyası (isteğe bağlı)
+from admission import AdmissionError, listen   # HF çağrıları için kabul kuyruğu + sıra bilgisi
+from warmup import Warmup                       # arka planda ısınma + açılış raporu
+from shards import shard_names                  # FOCUSIA_SHARDS parça adları (hafif; indeks açmaz)
+# data_loader / index_snapshot / rag_pipeline (langchain, chromadb, torch) burada import
+# edilmez: _build_chain içinde, arka plan thread'inde yüklenir; form beklemeden çizilir.
 
 # ====== MARKA ======
 # Ortam değişkenlerinden okunur; yoksa varsayılanları kullan.
@@ -16,6 +23,26 @@ LOGO_PATH = os.getenv("LOGO_PATH", "logo.png")
 FAVICON_PATH = os.getenv("FAVICON_PATH", "assets/favicon.png")
 # ====================
 
+# ====== ARAMA ======
+# Vektör arka ucu: "chroma" (varsayılan) ya da "numpy" (süreç içi matris + vektörize MMR)
+VECTOR_BACKEND = os.getenv("FOCUSIA_VECTOR_BACKEND", "chroma").lower()
+# Snapshot dosyası varsa indeks kurulmaz/açılmaz; dosya mmap ile eşlenir (index_snapshot.py)
+INDEX_SNAPSHOT = os.getenv("FOCUSIA_INDEX_SNAPSHOT", "")
+# MMR (Maximal Marginal Relevance): tekrar eden benzer sonuçları azaltır.
+MMR_SEARCH_KWARGS = {"k": 5, "fetch_k": 20, "lambda_mult": 0.7}
+# Parçalı korpus (FOCUSIA_SHARDS="study=...,work=..."): kullanıcı formda hangi parçalarda aranacağını seçer
+SHARD_NAMES = shard_names()
+# Yanıtı token token göster (0: eski davranış, tüm yanıtı bekle)
+STREAMING = os.getenv("FOCUSIA_STREAM", "1") != "0"
+# Yanıtın altında aşama sürelerini gösteren hata ayıklama paneli (ya da URL'de ?debug=1)
+DEBUG_TIMINGS = os.getenv("FOCUSIA_DEBUG", "0") == "1"
+# URL'de ?profile=<değer> bu isteği profiller; değer bu ayarla eşleşmeli (boş = URL'den profil kapalı).
+# Herkese açık Space'te tahmin edilemez bir değer verin: profil tüm süreci yavaşlatır ve diske yazar.
+PROFILE_URL_TOKEN = os.getenv("FOCUSIA_PROFILE_URL", "")
+# Isınmada çalıştırılan sahte sorgu: embedding modelini yükler, indeksi ilk kez tarar (LLM çağrılmaz)
+WARMUP_QUERY = "Odaklanmakta zorlanıyorum."
+# ====================
+
 # Sayfa başlığı ve favicon ayarı
 page_icon = FAVICON_PATH if os.path.exists(FAVICON_PATH) else "🧠"
 st.set_page_config(page_title=PRODUCT_NAME, page_icon=page_icon, layout="centered")
@@ -143,23 +170,61 @@ st.markdown("</div>", unsafe_allow_html=True)
 st.divider()
 # ====== /BAŞLIK ======
 
-@st.cache_resource(show_spinner=False)
-def _get_chain():
+def _build_chain(warm: Warmup):
     """
     Chroma veritabanını hazırla ve MMR tabanlı bir retriever ile
     LLM zincirini (prompt+LLM) kur. Dönen obje, .invoke({'query': ...})
-    arayüzünü destekler.
+    arayüzünü destekler. Arka plan thread'inde çalışır; her adımın süresi açılış raporuna girer.
     """
-    db = build_or_load_chroma()
-    # MMR (Maximal Marginal Relevance): tekrar eden benzer sonuçları azaltır.
-    retriever = db.as_retriever(
-        search_type="mmr",
-        search_kwargs={"k": 5, "fetch_k": 20, "lambda_mult": 0.7}
-    )
-    return make_retrieval_chain(retriever)
+    with warm.stage("import"):
+        from data_loader import build_or_load_chroma, build_numpy_index, load_lexical_index  # vektör + BM25 indeksi
+        from index_snapshot import load_snapshot       # mmap snapshot (Chroma'sız hızlı açılış)
+        from lexical_index import make_retriever       # BM25 + vektör (RRF) → MMR retriever
+        from rag_pipeline import make_retrieval_chain  # LLM + retriever + prompt zinciri
+        from shards import ShardedRetriever, load_shards  # parçalara dağıtılan arama
+    with warm.stage("index"):
+        if SHARD_NAMES:
+            db, lexical = load_shards(VECTOR_BACKEND), None  # parçalar paralel açılır/eşitlenir
+        elif INDEX_SNAPSHOT and os.path.exists(INDEX_SNAPSHOT):
+            db, lexical = load_snapshot(INDEX_SNAPSHOT), None  # snapshot yalnızca vektörleri taşır
+        elif VECTOR_BACKEND == "numpy":
+            db = build_numpy_index()
+            lexical = db.lexical
+        else:
+            db = build_or_load_chroma()
+            lexical = load_lexical_index()
+    with warm.stage("chain"):
+        if SHARD_NAMES:
+            retriever = ShardedRetriever(db, "mmr", MMR_SEARCH_KWARGS)
+        else:
+            retriever = make_retriever(db, lexical, "mmr", MMR_SEARCH_KWARGS)
+        qa = make_retrieval_chain(retriever)
+    with warm.stage("query"):
+        # Embedding modeli ilk sorguda yüklenir (önbellek); ilk kullanıcı bunu beklemesin
+        retriever.invoke(WARMUP_QUERY)
+        qa.packer.warm()  # hedef modelin tokenizer'ı (bağlam bütçesi için)
+    return qa
+
 
-# Zinciri bir kez oluştur (cache_resource sayfada tekrar çalıştırmayı önler)
-qa = _get_chain()
+@st.cache_resource(show_spinner=False)
+def _get_warmup() -> Warmup:
+    """Isınmayı süreç başına bir kez başlatır (cache_resource sayfada tekrar çalıştırmayı önler)."""
+    metrics.start_exporters()  # FOCUSIA_METRICS_PORT / FOCUSIA_METRICS_FILE
+    return Warmup(_build_chain).start()
+
+warm = _get_warmup()
+
+
+@st.cache_resource(show_spinner=False)
+def _get_chain(shards: tuple = ()):
+    """
+    Isınmada kurulan zincir; shards verilirse yalnızca o parçalarda arayan kopyası
+    (LLM, prompt ve önbellekler paylaşılır). Seçim başına bir kez kurulur.
+    """
+    qa = warm.result()
+    if not shards or list(shards) == SHARD_NAMES:
+        return qa
+    return qa.with_retriever(qa.retriever.subset(shards))
 
 # ====== FORM ======
 # Kullanıcıdan kısa bir durum yazması istenir.
@@ -168,32 +233,106 @@ with st.form("focus_form"):
         "Bugün nasılsın? (odak durumunu kısaca anlat)",
         placeholder="Örn: Sürekli telefona bakıyorum, başladığım işi bitiremiyorum..."
     )
+    # Parçalı korpusta aranacak kaynak setleri (tek korpusta gösterilmez)
+    selected_shards = st.multiselect("Kaynak setleri", SHARD_NAMES, default=SHARD_NAMES) if SHARD_NAMES else []
     submitted = st.form_submit_button("Öneri al")
+warm.mark("form_rendered")  # yalnızca ilk çizim kaydedilir (soğuk açılış raporu)
 # ====== /FORM ======
 
 # ====== SORGULAMA & YANIT ======
+def _render_card(slot, text: str) -> None:
+    """💡 Öneri Kartı (temaya uygun şık kart); akış sırasında aynı slot yeniden çizilir."""
+    slot.markdown(
+        f"<div class='focusia-card'><h3>Senin İçin Öneriler</h3>\n\n{text}\n\n</div>",
+        unsafe_allow_html=True,
+    )
+
+
+def _waiting_text(position: int) -> str:
+    """Kabul kuyruğundaki yere göre bekleme metni (0 = sıra geldi)."""
+    if position > 0:
+        return f"_Şu an yoğunluk var; sıradaki yerin: **{position}**. Önerin birazdan hazırlanacak..._"
+    return "_Önerin hazırlanıyor..._"
+
+
 if submitted:
     if not user_input.strip():
         # Boş girişe uyarı göster
         st.warning("Lütfen kısa bir durum cümlesi yaz.")
+    elif SHARD_NAMES and not selected_shards:
+        st.warning("Lütfen en az bir kaynak seti seç.")
     else:
-        # LLM cevabını beklerken spinner göster
-        with st.spinner("Önerin hazırlanıyor..."):
-            try:
-                # RAG zincirini çağır: {'result': ..., 'source_documents': ...}
-                result = qa.invoke({"query": user_input})
-            except Exception as e:
-                # Herhangi bir hata kullanıcıya görünür olsun
-                st.error(f"Hata: {e}")
-                st.stop()
+        if not warm.ready:
+            # Yalnızca ısınma bitmeden gelen ilk gönderim bekler
+            with st.spinner("Focusia hazırlanıyor (ilk açılış)..."):
+                warm.wait()
+        try:
+            qa = _get_chain(tuple(selected_shards))
+        except Exception as e:
+            # Isınma başarısız: bir sonraki gönderimde yeniden denensin
+            _get_warmup.clear()
+            _get_chain.clear()
+            st.error(f"Hata: {e}")
+            st.stop()
+
+        card = st.empty()
+        # URL'de ?profile=<FOCUSIA_PROFILE_URL>: bu istek örnekleyici profilleyiciyle izlenir (profiler.py)
+        profile_param = st.query_params.get("profile", "")
+        profile = bool(PROFILE_URL_TOKEN) and hmac.compare_digest(profile_param.encode(), PROFILE_URL_TOKEN.encode())
+        payload = {"query": user_input, "profile": profile}
+        try:
+            if STREAMING and hasattr(qa, "stream"):
+                # Token'lar geldikçe kartı güncelle; ilk token'a kadar kısa bir bekleme metni göster
+                _render_card(card, _waiting_text(0))
+                result = {}
+                # Kuyrukta beklerken sıra bilgisi bu thread'de gelir; kart doğrudan güncellenir
+                with listen(lambda pos: _render_card(card, _waiting_text(pos))):
+                    for event in qa.stream(payload):
+                        if "partial" in event:
+                            _render_card(card, event["partial"])
+                        else:
+                            result = event
+            elif hasattr(qa, "submit") and not profile:
+                # Async yol: HTTP çağrısı paylaşılan event loop'ta bekler. Aynı oturumdan
+                # yeni gönderim gelirse önceki istek iptal edilir (bu çalıştırma sessizce biter).
+                # Sıra bilgisi loop thread'inde gelir; burada future beklenirken karta yansıtılır.
+                sid = st.session_state.setdefault("focusia_session_id", uuid.uuid4().hex)
+                queue_pos = {"now": 0}
+                with listen(lambda pos: queue_pos.update(now=pos)):
+                    future = qa.submit(payload, key=sid)
+                shown = None
+                while True:
+                    if queue_pos["now"] != shown:
+                        shown = queue_pos["now"]
+                        _render_card(card, _waiting_text(shown))
+                    try:
+                        result = future.result(timeout=0.25)
+                        break
+                    except FutureTimeout:
+                        continue
+            else:
+                # Senkron yol; ?profile= istekleri de buradan geçer (async yolda profil yok).
+                # LLM cevabını beklerken spinner göster
+                with st.spinner("Önerin hazırlanıyor..."), listen(lambda pos: _render_card(card, _waiting_text(pos))):
+                    # RAG zincirini çağır: {'result': ..., 'source_documents': ...}
+                    result = qa.invoke(payload)
+        except CancelledError:
+            # Kullanıcı formu yeniden gönderdi; yeni çalıştırma kartı çizecek
+            st.stop()
+        except AdmissionError as e:
+            # Kuyruk dolu / bekleme süresi doldu: hata değil, yoğunluk bildirimi
+            card.empty()
+            st.warning(str(e))
+            st.stop()
+        except Exception as e:
+            # Herhangi bir hata kullanıcıya görünür olsun
+            card.empty()
+            st.error(f"Hata: {e}")
+            st.stop()
 
         # Modelden dönen nihai öneri metni
         answer = result.get("result", result)
-
-        # 💡 Öneri Kartı (temaya uygun şık kart)
-        st.markdown("<div class='focusia-card'><h3>Senin İçin Öneriler</h3>", unsafe_allow_html=True)
-        st.markdown(answer, unsafe_allow_html=True)
-        st.markdown("</div>", unsafe_allow_html=True)
+        _render_card(card, answer)
 
         # Kaynaklar (RAG dayanakları): kullanıcı isterse açıp görebilsin
         srcs = result.get("source_documents", [])
@@ -225,5 +364,13 @@ if submitted:
                         st.code(snippet, language="markdown")
 
                 st.markdown("</div>", unsafe_allow_html=True)
+
+        # Aşama süreleri (embed / retrieve / llm / postprocess ...), token ve önbellek bayrakları
+        timings = result.get("timings")
+        if timings and (DEBUG_TIMINGS or st.query_params.get("debug") == "1"):
+            with st.expander("⏱️ Zamanlamalar (debug)"):
+                st.json(timings)
+                st.caption("Açılış (ısınma aşamaları ms, süreç başlangıcından itibaren anlar sn)")
+                st.json(warm.report())
 # ====== /SORGULAMA & YANIT ======
 
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+batch_run.py
+------------
+Çok sayıda sorguyu RAG zincirinden toplu geçirir (kalite regresyon kontrolleri,
+önceden yanıt üretimi). _SimpleRAGAdapter.batch kullanır: sorgular tek batch'te gömülür,
+arama vektörize yapılır, LLM çağrıları sınırlı bir thread havuzundan gider.
+
+Giriş JSONL: her satır {"query": "..."} (ya da {"input": "..."} / düz JSON string).
+Diğer alanlar (örn. "id", "expected") çıktıya aynen kopyalanır.
+Çıktı JSONL: giriş alanları + {"result", "sources", "error"}; sıra girişle aynı.
+Çıktı stdout'a yazılırken (--out -) log satırları stderr'e gider.
+
+Kullanım:
+    python batch_run.py --in prompts.jsonl --out answers.jsonl --concurrency 16
+    python batch_run.py --in prompts.jsonl --backend numpy      # Chroma yerine NumPy indeksi
+    python batch_run.py --in prompts.jsonl --shards work,adhd   # FOCUSIA_SHARDS'tan yalnızca bu parçalar
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, Iterator, List, TextIO
+
+from rag_pipeline import BATCH_CONCURRENCY
+
+MMR_SEARCH_KWARGS = {"k": 5, "fetch_k": 20, "lambda_mult": 0.7}  # app.py ile aynı
+
+
+def _read_jsonl(f: TextIO) -> Iterator[Dict[str, Any]]:
+    for lineno, line in enumerate(f, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            obj = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"{lineno}. satır geçerli JSON değil: {e}") from e
+        yield obj if isinstance(obj, dict) else {"query": str(obj)}
+
+
+def _chunks(items: Iterator[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    chunk: List[Dict[str, Any]] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _build_chain(backend: str, snapshot: str, shards: List[str]) -> Any:
+    """app._get_chain ile aynı seçim: parçalar (FOCUSIA_SHARDS) → snapshot → numpy → chroma."""
+    from data_loader import build_numpy_index, build_or_load_chroma, load_lexical_index
+    from index_snapshot import load_snapshot
+    from lexical_index import make_retriever
+    from rag_pipeline import make_retrieval_chain
+    from shards import SHARDS_SPEC, ShardedRetriever, load_shards
+
+    if SHARDS_SPEC:
+        retriever = ShardedRetriever(load_shards(backend), "mmr", MMR_SEARCH_KWARGS)
+        return make_retrieval_chain(retriever.subset(shards) if shards else retriever)
+    if snapshot and os.path.exists(snapshot):
+        db, lexical = load_snapshot(snapshot), None
+    elif backend == "numpy":
+        db = build_numpy_index()
+        lexical = db.lexical
+    else:
+        db = build_or_load_chroma()
+        lexical = load_lexical_index()
+    return make_retrieval_chain(make_retriever(db, lexical, "mmr", MMR_SEARCH_KWARGS))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="JSONL sorguları RAG zincirinden toplu geçirir.")
+    ap.add_argument("--in", dest="inp", required=True, help="giriş JSONL ('-' = stdin)")
+    ap.add_argument("--out", default="-", help="çıktı JSONL ('-' = stdout)")
+    ap.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="eşzamanlı LLM çağrısı")
+    ap.add_argument("--chunk", type=int, default=256, help="bir batch() çağrısındaki sorgu sayısı")
+    ap.add_argument("--backend", default=os.getenv("FOCUSIA_VECTOR_BACKEND", "chroma").lower(), choices=("chroma", "numpy"))
+    ap.add_argument("--snapshot", default=os.getenv("FOCUSIA_INDEX_SNAPSHOT", ""))
+    ap.add_argument("--shards", default="", help="virgülle ayrılmış parça adları (boş = FOCUSIA_SHARDS'taki hepsi)")
+    args = ap.parse_args()
+
+    shards = [n.strip() for n in args.shards.split(",") if n.strip()]
+    # --out - iken kurulum ve zincir log'ları (print) JSONL çıktısına karışmasın diye stderr'e gider
+    quiet = contextlib.redirect_stdout(sys.stderr) if args.out == "-" else contextlib.nullcontext()
+    with quiet:
+        qa = _build_chain(args.backend, args.snapshot, shards)
+
+    fin = sys.stdin if args.inp == "-" else open(args.inp, "r", encoding="utf-8")
+    fout = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8")
+    total = errors = saved = 0
+    t0 = time.perf_counter()
+    try:
+        for chunk in _chunks(_read_jsonl(fin), max(1, args.chunk)):
+            with quiet:
+                results = qa.batch(chunk, max_concurrency=args.concurrency)
+            for item, res in zip(chunk, results):
+                err = res.get("error")
+                errors += err is not None
+                saved += (res.get("timings") or {}).get("context_tokens_saved", 0)
+                row = dict(item)
+                row["result"] = res.get("result")
+                row["sources"] = [d.metadata.get("topic", "") for d in res.get("source_documents", [])]
+                row["error"] = f"{type(err).__name__}: {err}" if err is not None else None
+                fout.write(json.dumps(row, ensure_ascii=False) + "\n")
+            fout.flush()
+            total += len(chunk)
+    finally:
+        if fin is not sys.stdin:
+            fin.close()
+        if fout is not sys.stdout:
+            fout.close()
+
+    secs = time.perf_counter() - t0
+    cache = getattr(qa, "answer_cache", None)
+    cache_info = f", answer cache {cache.hits} hit / {cache.misses} miss" if cache is not None else ""
+    cache_info += f", context -{saved} tokens" if saved else ""
+    print(
+        f"[Batch] {total} queries ({total - errors} ok / {errors} error) in {secs:.1f}s "
+        f"({total / secs if secs else 0.0:.2f} q/s, concurrency={args.concurrency}{cache_info})",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
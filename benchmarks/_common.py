@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+benchmarks/_common.py
+---------------------
+Benchmark betiklerinin ortak yardımcıları:
+- Proje kökünü sys.path'e ekler (betikler benchmarks/ altından çalıştırılabilsin)
+- focus_tips.json'dan istenen boyutta sentetik ipucu korpusu (JSONL) üretir
+- Gecikme listelerinden p50/p95/p99 özetleri çıkarır
+- HashEmbeddings: model indirmeden çalışan, deterministik embedding (ağsız benchmark'lar için)
+"""
+
+import json
+import math
+import random
+import re
+import statistics
+import sys
+import zlib
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+# Kullanıcıların sık yazdığı türden örnek durum cümleleri (sorgu seti)
+SAMPLE_QUERIES = [
+    "Sürekli telefona bakıyorum, başladığım işi bitiremiyorum.",
+    "telefona bakıyorum, odaklanamıyorum",
+    "Ders çalışırken aklım hep başka yerlere gidiyor.",
+    "Bildirimler yüzünden işime konsantre olamıyorum.",
+    "Sabahları güne başlamakta zorlanıyorum, erteliyorum.",
+    "Çok fazla işim var, hangisinden başlayacağımı bilmiyorum.",
+    "Toplantılardan sonra tekrar odaklanmam uzun sürüyor.",
+    "Akşamları yorgun oluyorum ve hiçbir şey yapamıyorum.",
+    "Pomodoro denedim ama molalarda sosyal medyada kayboluyorum.",
+    "Evden çalışırken dikkatim çok dağılıyor.",
+]
+
+_FILLERS = [
+    "Bunu her gün aynı saatte dene.",
+    "Küçük adımlarla başla.",
+    "İlerlemeni bir deftere not et.",
+    "Gerekirse bir arkadaşından destek iste.",
+    "Ortamını sade tut.",
+    "Kendine karşı nazik ol.",
+    "Hafta sonunda kısa bir değerlendirme yap.",
+    "Su içmeyi ve kısa yürüyüşleri unutma.",
+]
+
+
+def load_seed_tips(path: Path = ROOT / "focus_tips.json") -> List[Dict[str, str]]:
+    with path.open("r", encoding="utf-8") as f:
+        return [r for r in json.load(f) if isinstance(r, dict) and r.get("content")]
+
+
+def synth_corpus(n: int, out_path: Path, seed: int = 42) -> Path:
+    """
+    focus_tips.json kayıtlarından türetilmiş, n benzersiz kayıtlı JSONL korpusu yazar.
+    Her kayıt bir tohum ipucu + rastgele tamamlayıcı cümleler + sıra numarasıdır.
+    """
+    rng = random.Random(seed)
+    seeds = load_seed_tips()
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    with out_path.open("w", encoding="utf-8") as f:
+        for i in range(n):
+            base = seeds[i % len(seeds)]
+            extra = " ".join(rng.sample(_FILLERS, k=rng.randint(1, 3)))
+            row = {
+                "topic": f"{base.get('topic', '')} #{i // len(seeds)}",
+                "content": f"{base['content']} {extra} (ipucu {i})",
+            }
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    return out_path
+
+
+class HashEmbeddings(Embeddings):
+    """
+    Kelime hash'lerinden oluşan torba (hashing trick) embedding'i: model/ağ gerektirmez,
+    her çalıştırmada aynı vektörü üretir ve ortak kelimeli metinleri birbirine yakın tutar.
+    Gerçek modelin kalitesini değil, indeks/arama/boru hattı maliyetini ölçmek içindir.
+    """
+    _WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _vector(self, text: str) -> List[float]:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for word in self._WORD_RE.findall(text.casefold()):
+            h = zlib.crc32(word.encode("utf-8"))
+            vec[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norm = float(np.linalg.norm(vec))
+        return (vec / norm if norm else vec).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._vector(text)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Basit en yakın sıra yüzdeliği (values boşsa 0)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[idx]
+
+
+def summarize_ms(samples_s: List[float]) -> Dict[str, float]:
+    """Saniye cinsinden örnekleri ms cinsinden özetler."""
+    ms = [x * 1000.0 for x in samples_s]
+    return {
+        "n": len(ms),
+        "mean_ms": round(statistics.fmean(ms), 3) if ms else 0.0,
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p95_ms": round(percentile(ms, 95), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+        "max_ms": round(max(ms), 3) if ms else 0.0,
+    }
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+benchmarks/bench_embedding_server.py
+------------------------------------
+N eşzamanlı istemcinin tek sorgu embedding'i istediği durumda (Streamlit oturumları gibi)
+süreç içi modeli, embedding_server.py'nin micro-batch yapan sunucusuyla karşılaştırır:
+işlem hızı (sorgu/sn), istek gecikmesi p50/p95 ve sunucudaki ortalama batch boyu.
+
+Varsayılan olarak model yüklenmez: SimulatedEmbeddings her çağrıda sabit bir maliyet
+(`--call-ms`, model ileri geçişinin batch'ten bağımsız kısmı) + metin başına maliyet
+(`--text-ms`) harcar; süreç içi modeli tek kilitle çağırır (tek model kopyası, GIL).
+`--real` ile data_loader'daki gerçek model (FOCUSIA_EMB_BACKEND) kullanılır.
+
+Kullanım:
+    python benchmarks/bench_embedding_server.py --clients 1,8,32
+    python benchmarks/bench_embedding_server.py --real --clients 16 --max-wait-ms 2,5,10 --out server.json
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from _common import SAMPLE_QUERIES, HashEmbeddings, summarize_ms
+
+from embedding_server import RemoteEmbeddings, serve
+
+
+class SimulatedEmbeddings(HashEmbeddings):
+    """HashEmbeddings + yapay model maliyeti; aynı anda tek çağrı (tek model kopyası)."""
+    def __init__(self, call_ms: float, text_ms: float):
+        super().__init__()
+        self.call_s, self.text_s = call_ms / 1000.0, text_ms / 1000.0
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with self._lock:
+            time.sleep(self.call_s + self.text_s * len(texts))
+            return super().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def run_clients(embed: Callable[[str], Any], clients: int, requests: int) -> Dict[str, Any]:
+    barrier = threading.Barrier(clients)
+    lock = threading.Lock()
+    samples: List[float] = []
+
+    def client(c: int) -> None:
+        barrier.wait()
+        for r in range(requests):
+            q = f"{SAMPLE_QUERIES[(c + r) % len(SAMPLE_QUERIES)]} ({c}/{r})"  # farklı metinler
+            t0 = time.perf_counter()
+            embed(q)
+            with lock:
+                samples.append(time.perf_counter() - t0)
+
+    threads = [threading.Thread(target=client, args=(c,)) for c in range(clients)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    return {"wall_s": round(wall, 3), "qps": round(len(samples) / wall, 1), "latency": summarize_ms(samples)}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--clients", default="1,8,32", help="eşzamanlı istemci sayıları")
+    ap.add_argument("--requests", type=int, default=20, help="istemci başına sorgu")
+    ap.add_argument("--max-wait-ms", default="5", help="denenecek batch toplama pencereleri")
+    ap.add_argument("--max-batch", type=int, default=64)
+    ap.add_argument("--call-ms", type=float, default=8.0, help="simülasyon: çağrı başına sabit maliyet")
+    ap.add_argument("--text-ms", type=float, default=0.3, help="simülasyon: metin başına maliyet")
+    ap.add_argument("--real", action="store_true", help="gerçek embedding modelini yükle")
+    ap.add_argument("--socket", default="", help="TCP yerine Unix soketi (örn. /tmp/focusia-emb-bench.sock)")
+    ap.add_argument("--out", default="", help="sonuçların yazılacağı JSON dosyası")
+    args = ap.parse_args()
+
+    if args.real:
+        from data_loader import _model_embeddings, embedding_id
+        model_id = embedding_id()
+        model = _model_embeddings(model_id)
+        model.embed_query("ısınma")
+    else:
+        model_id = "simulated"
+        model = SimulatedEmbeddings(args.call_ms, args.text_ms)
+
+    clients = [int(x) for x in args.clients.split(",") if x.strip()]
+    waits = [float(x) for x in args.max_wait_ms.split(",") if x.strip()]
+    runs: List[Dict[str, Any]] = []
+
+    for n in clients:
+        res = run_clients(model.embed_query, n, args.requests)
+        runs.append({"mode": "in-process", "clients": n, **res})
+        print(f"[in-process] clients={n:<3} {res['qps']:>8.1f} q/s  p50={res['latency']['p50_ms']:.1f}ms p95={res['latency']['p95_ms']:.1f}ms")
+
+    for wait in waits:
+        address = f"unix:{args.socket}" if args.socket else "http://127.0.0.1:0"
+        server = serve(model, address, model_id, args.max_batch, wait)
+        try:
+            client = RemoteEmbeddings(server.url, model=model_id)  # type: ignore[attr-defined]
+            client.embed_query("ısınma")
+            for n in clients:
+                before = client.health()
+                res = run_clients(client.embed_query, n, args.requests)
+                after = client.health()
+                batches = after["batches"] - before["batches"]
+                res["mean_batch"] = round((after["texts"] - before["texts"]) / batches, 2) if batches else 0.0
+                runs.append({"mode": "server", "max_wait_ms": wait, "clients": n, **res})
+                print(
+                    f"[server w={wait:g}ms] clients={n:<3} {res['qps']:>8.1f} q/s  p50={res['latency']['p50_ms']:.1f}ms "
+                    f"p95={res['latency']['p95_ms']:.1f}ms  mean_batch={res['mean_batch']}"
+                )
+        finally:
+            server.shutdown()
+            server.server_close()
+            server.batcher.close()  # type: ignore[attr-defined]
+            if args.socket and os.path.exists(args.socket):
+                os.unlink(args.socket)
+
+    if args.out:
+        meta = {k: v for k, v in vars(args).items() if k != "out"}
+        Path(args.out).write_text(json.dumps({"args": meta, "runs": runs}, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"→ {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+benchmarks/bench_embeddings.py
+------------------------------
+PyTorch (HuggingFaceEmbeddings) ile ONNX int8 (onnx_embeddings.OnnxEmbeddings) embedding
+arka uçlarını focus_tips.json üzerinde karşılaştırır:
+
+- kalite:  recall@k — her sorgu için torch vektörleriyle bulunan ilk k ipucundan kaçının
+           onnx vektörleriyle de ilk k'da çıktığı; ayrıca aynı metnin iki vektörü arasındaki kosinüs
+- bellek:  model yüklendikten sonraki RSS artışı ve tepe RSS (MB)
+- gecikme: model yükleme, tüm ipuçlarını gömme (belge/sn), tek sorgu p50/p95
+           (onnx'te ikinci tur tokenizasyon önbelleğinden gelir: query_warm)
+
+Her arka uç ayrı bir süreçte ölçülür (bellek rakamları birbirini etkilemesin). Embedding
+önbelleği kullanılmaz; model doğrudan çağrılır. Sorgular: örnek durum cümleleri + ipucu başlıkları.
+
+Kullanım:
+    python onnx_embeddings.py                       # bir kez: ONNX int8 modeli dışa aktar
+    python benchmarks/bench_embeddings.py --k 5 --out embeddings.json
+"""
+
+import argparse
+import json
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+from _common import ROOT, SAMPLE_QUERIES, load_seed_tips, summarize_ms
+
+BACKENDS = ("torch", "onnx")
+
+
+def _rss_mb() -> float:
+    """Anlık RSS (MB); /proc yoksa tepe değer."""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return _peak_rss_mb()
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0  # macOS bayt, Linux KB
+
+
+def _queries() -> List[str]:
+    topics = [t.get("topic", "") for t in load_seed_tips() if t.get("topic")]
+    return SAMPLE_QUERIES + topics
+
+
+def measure(backend: str, vectors_path: str, repeat: int) -> Dict[str, Any]:
+    """Tek arka ucu bu süreçte ölçer; doküman ve sorgu vektörlerini vectors_path'e yazar."""
+    from data_loader import EMB_MODEL, _model_embeddings, embedding_id
+
+    docs = [f"{t.get('topic', '')}: {t['content']}" for t in load_seed_tips()]
+    queries = _queries()
+
+    rss0 = _rss_mb()
+    t0 = time.perf_counter()
+    emb = _model_embeddings(embedding_id(EMB_MODEL, backend))
+    emb.embed_query("ısınma")  # tembel yüklenen parçalar (oturum, ağırlıklar) ölçüme dahil
+    load_s = time.perf_counter() - t0
+    rss_model = _rss_mb() - rss0
+
+    t0 = time.perf_counter()
+    doc_vecs = np.asarray(emb.embed_documents(docs), dtype=np.float32)
+    docs_s = time.perf_counter() - t0
+
+    def timed_queries() -> List[float]:
+        out = []
+        for q in queries:
+            t = time.perf_counter()
+            emb.embed_query(q)
+            out.append(time.perf_counter() - t)
+        return out
+
+    cold = timed_queries()
+    warm = [s for _ in range(repeat) for s in timed_queries()]
+    query_vecs = np.asarray([emb.embed_query(q) for q in queries], dtype=np.float32)
+    np.savez(vectors_path, docs=doc_vecs, queries=query_vecs)
+
+    return {
+        "backend": backend,
+        "load_s": round(load_s, 3),
+        "rss_model_mb": round(rss_model, 1),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "embed_docs": {"n": len(docs), "s": round(docs_s, 3), "docs_per_s": round(len(docs) / max(docs_s, 1e-9), 1)},
+        "query_cold": summarize_ms(cold),
+        "query_warm": summarize_ms(warm),
+    }
+
+
+def _top_k(queries: np.ndarray, docs: np.ndarray, k: int) -> np.ndarray:
+    qn = queries / np.clip(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12, None)
+    dn = docs / np.clip(np.linalg.norm(docs, axis=1, keepdims=True), 1e-12, None)
+    return np.argsort(-(qn @ dn.T), axis=1, kind="stable")[:, :k]
+
+
+def compare(ref: Dict[str, np.ndarray], cand: Dict[str, np.ndarray], k: int) -> Dict[str, float]:
+    """recall@k (torch ilk k'sı referans) ve aynı metnin iki vektörü arasındaki kosinüs."""
+    ref_top, cand_top = _top_k(ref["queries"], ref["docs"], k), _top_k(cand["queries"], cand["docs"], k)
+    recall = float(np.mean([len(set(a) & set(b)) / k for a, b in zip(ref_top, cand_top)]))
+    top1 = float(np.mean(ref_top[:, 0] == cand_top[:, 0]))
+
+    def cos(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        return (a * b).sum(1) / np.clip(np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1), 1e-12, None)
+
+    sims = np.concatenate([cos(ref["docs"], cand["docs"]), cos(ref["queries"], cand["queries"])])
+    return {f"recall@{k}": round(recall, 4), "top1_agreement": round(top1, 4),
+            "cosine_mean": round(float(sims.mean()), 5), "cosine_min": round(float(sims.min()), 5)}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--repeat", type=int, default=5, help="sıcak sorgu ölçümünde sorgu setinin tekrar sayısı")
+    ap.add_argument("--out", default="", help="sonuçların yazılacağı JSON dosyası")
+    ap.add_argument("--worker", default="", help=argparse.SUPPRESS)     # iç kullanım: tek arka uç
+    ap.add_argument("--vectors", default="", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.worker:
+        print(json.dumps(measure(args.worker, args.vectors, args.repeat)))
+        return
+
+    work = Path(tempfile.mkdtemp(prefix="focusia-emb-bench-"))
+    results: Dict[str, Any] = {"k": args.k, "queries": len(_queries()), "backends": {}}
+    vectors: Dict[str, Dict[str, np.ndarray]] = {}
+    try:
+        for backend in BACKENDS:
+            path = work / f"{backend}.npz"
+            proc = subprocess.run(
+                [sys.executable, __file__, "--worker", backend, "--vectors", str(path), "--repeat", str(args.repeat)],
+                capture_output=True, text=True, cwd=ROOT,
+            )
+            if proc.returncode != 0:
+                print(f"[{backend}] başarısız:\n{proc.stderr.strip()[-2000:]}", file=sys.stderr)
+                continue
+            results["backends"][backend] = json.loads(proc.stdout.strip().splitlines()[-1])
+            with np.load(path) as data:
+                vectors[backend] = {"docs": data["docs"], "queries": data["queries"]}
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    if len(vectors) == len(BACKENDS):
+        results["quality"] = compare(vectors["torch"], vectors["onnx"], args.k)
+
+    print(f"{'backend':<7} {'load s':>7} {'model MB':>9} {'peak MB':>8} {'docs/s':>8} {'q p50 ms':>9} {'q p95 ms':>9} {'warm p50':>9}")
+    for name, r in results["backends"].items():
+        print(
+            f"{name:<7} {r['load_s']:>7.2f} {r['rss_model_mb']:>9.1f} {r['peak_rss_mb']:>8.1f} "
+            f"{r['embed_docs']['docs_per_s']:>8.1f} {r['query_cold']['p50_ms']:>9.2f} "
+            f"{r['query_cold']['p95_ms']:>9.2f} {r['query_warm']['p50_ms']:>9.2f}"
+        )
+    if "quality" in results:
+        q = results["quality"]
+        print(
+            f"\nonnx vs torch: recall@{args.k}={q[f'recall@{args.k}']:.3f}, top-1 aynı={q['top1_agreement']:.3f}, "
+            f"kosinüs ort={q['cosine_mean']:.4f} (min {q['cosine_min']:.4f}) — {results['queries']} sorgu"
+        )
+    if args.out:
+        Path(args.out).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"→ {args.out}")
+
+
+if __name__ == "__main__":
+    main()
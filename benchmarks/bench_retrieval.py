@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+benchmarks/bench_retrieval.py
+-----------------------------
+Chroma ile NumPy vektör indeksini, app._get_chain'deki MMR ayarlarıyla
+(k=5, fetch_k=20, lambda_mult=0.7) p50/p99 arama gecikmesi üzerinden karşılaştırır.
+
+Üç ölçüm yapılır:
+- invoke:    retriever.invoke(q) (sorgu embedding'i dahil; uygulamanın gördüğü gecikme)
+- by_vector: önceden gömülmüş sorguyla yalnızca arama + MMR (arka ucun kendi maliyeti)
+- hybrid:    aynı vektörle BM25 + vektör (RRF) → MMR (lexical_index.HybridRetriever;
+             uygulamada isteğe bağlı, burada varsayılan açık; FOCUSIA_HYBRID=0 ise atlanır)
+
+Kullanım:
+    python benchmarks/bench_retrieval.py                 # focus_tips.json
+    python benchmarks/bench_retrieval.py --size 20000    # sentetik 20k ipucu
+    python benchmarks/bench_retrieval.py --size 20000 --dtype float16 --out retrieval.json
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from _common import ROOT, SAMPLE_QUERIES, summarize_ms, synth_corpus
+
+# Yakın kopya eleme indekslenen belge sayısını değiştirir; koşular arası karşılaştırma için sabit (kapalı)
+os.environ.setdefault("FOCUSIA_NEAR_DEDUP", "0")
+# Hibrit arama uygulamada isteğe bağlı; vektör aramasına eklediği maliyet ölçülebilsin diye açık
+os.environ.setdefault("FOCUSIA_HYBRID", "1")
+
+from data_loader import build_numpy_index, build_or_load_chroma, load_lexical_index, make_embeddings, EMB_MODEL
+from lexical_index import HybridRetriever
+from near_dedup import near_dedup_id
+
+MMR_SEARCH_KWARGS = {"k": 5, "fetch_k": 20, "lambda_mult": 0.7}  # app.py ile aynı
+
+
+def _time_calls(fn, inputs, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        for x in inputs:
+            t0 = time.perf_counter()
+            fn(x)
+            samples.append(time.perf_counter() - t0)
+    return samples
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--size", type=int, default=0, help="sentetik korpus boyutu (0: focus_tips.json)")
+    ap.add_argument("--dtype", default="float32", choices=["float32", "float16"])
+    ap.add_argument("--repeat", type=int, default=20, help="sorgu setinin kaç kez tekrarlanacağı")
+    ap.add_argument("--warmup", type=int, default=3)
+    ap.add_argument("--out", default="", help="sonuçların yazılacağı JSON dosyası")
+    args = ap.parse_args()
+
+    work = Path(tempfile.mkdtemp(prefix="focusia-bench-"))
+    json_path = synth_corpus(args.size, work / "tips.jsonl") if args.size else ROOT / "focus_tips.json"
+
+    db = build_or_load_chroma(str(json_path), str(work / "chroma"))
+    index = build_numpy_index(str(json_path), dtype=args.dtype)
+    backends = {
+        "chroma": (db, load_lexical_index(str(work / "chroma"))),
+        "numpy": (index, index.lexical),
+    }
+
+    emb = make_embeddings(EMB_MODEL)
+    qvecs = emb.embed_documents(SAMPLE_QUERIES)
+
+    results = {
+        "corpus_docs": len(index),
+        "indexed_docs": {"chroma": db._collection.count(), "numpy": len(index)},
+        "near_dedup": near_dedup_id(),
+        "dtype": args.dtype,
+        "search_kwargs": MMR_SEARCH_KWARGS,
+        "backends": {},
+    }
+    for name, (store, lexical) in backends.items():
+        retriever = store.as_retriever(search_type="mmr", search_kwargs=MMR_SEARCH_KWARGS)
+        by_vector = lambda v, s=store: s.max_marginal_relevance_search_by_vector(v, **MMR_SEARCH_KWARGS)
+        _time_calls(retriever.invoke, SAMPLE_QUERIES[: args.warmup], 1)
+        results["backends"][name] = {
+            "invoke": summarize_ms(_time_calls(retriever.invoke, SAMPLE_QUERIES, args.repeat)),
+            "by_vector": summarize_ms(_time_calls(by_vector, qvecs, args.repeat)),
+        }
+        if lexical is not None:
+            hybrid = HybridRetriever(store, lexical, "mmr", MMR_SEARCH_KWARGS)
+            pairs = list(zip(SAMPLE_QUERIES, qvecs))
+            results["backends"][name]["hybrid"] = summarize_ms(_time_calls(lambda p: hybrid.search_hybrid(*p), pairs, args.repeat))
+
+    print(f"\nCorpus: {results['corpus_docs']} docs (near_dedup={results['near_dedup']}), MMR {MMR_SEARCH_KWARGS}")
+    print(f"{'backend':<8} {'mode':<10} {'p50 ms':>9} {'p99 ms':>9}")
+    for name, modes in results["backends"].items():
+        for mode, stats in modes.items():
+            print(f"{name:<8} {mode:<10} {stats['p50_ms']:>9.3f} {stats['p99_ms']:>9.3f}")
+
+    if args.out:
+        Path(args.out).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"\n→ {args.out}")
+
+
+if __name__ == "__main__":
+    main()
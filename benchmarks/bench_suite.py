@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+"""
+benchmarks/bench_suite.py
+-------------------------
+Ağ erişimi gerektirmeyen, tekrarlanabilir uçtan uca benchmark paketi.
+
+Her korpus boyutu için (sentetik ipuçları, _common.synth_corpus):
+- build:     build_or_load_chroma ilk kurulum ve ikinci açılış (hızlı yol) süreleri,
+             build_numpy_index kurulum süresi
+- retrieval: app._get_chain'deki MMR ayarlarıyla retriever.invoke gecikmesi (p50/p95/p99)
+- e2e:       make_retrieval_chain(...).invoke ve .stream (ilk kısmi metin / toplam), yerel
+             sahte HF sunucusuna karşı (stub_hf_server.py); aşama süreleri result["timings"]'ten
+Boyuttan bağımsız olarak bir kez:
+- postprocess: _postprocess ve akışlı _StreamPostprocessor işlem hızı
+
+Embedding varsayılan olarak HashEmbeddings'tir (model indirmez; kalite değil maliyet ölçülür).
+--embeddings model ile gerçek sentence-transformers modeli kullanılabilir (önbellek kapalı).
+Sonuçlar JSON olarak yazılır; --compare ile önceki bir sonuç dosyasına göre gerilemeler
+(varsayılan: %20'den fazla yavaşlama) listelenir.
+
+Kullanım:
+    python benchmarks/bench_suite.py                                  # 1k ipucu
+    python benchmarks/bench_suite.py --sizes 1000,100000,1000000 --backends numpy
+    python benchmarks/bench_suite.py --latency-ms 300 --tokens-per-sec 40 --text-only
+    python benchmarks/bench_suite.py --out after.json --compare before.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+# Benchmark'ta yanıt önbelleği her sorguyu ilk kez görür; ölçülen şey üretim yoludur.
+os.environ.setdefault("FOCUSIA_ANSWER_CACHE", "0")
+os.environ.setdefault("HF_TOKEN", "stub")  # yalnızca yerel sahte sunucuya gönderilir
+# Yakın kopya eleme indekslenen belge sayısını değiştirir; koşular arası karşılaştırma için sabit (kapalı)
+os.environ.setdefault("FOCUSIA_NEAR_DEDUP", "0")
+
+from _common import ROOT, SAMPLE_QUERIES, HashEmbeddings, summarize_ms, synth_corpus
+from stub_hf_server import DEFAULT_ANSWER, StubHFServer
+
+import numpy as np
+
+from data_loader import EMB_MODEL, build_numpy_index, build_or_load_chroma
+from near_dedup import near_dedup_id
+from rag_pipeline import _postprocess, _StreamPostprocessor, make_retrieval_chain
+
+MMR_SEARCH_KWARGS = {"k": 5, "fetch_k": 20, "lambda_mult": 0.7}  # app.py ile aynı
+REGRESSION_KEYS = ("p50_ms", "p95_ms", "build_s", "load_s", "ttfp_p50_ms")
+
+
+def _time_calls(fn: Callable[[Any], Any], inputs: List[Any], repeat: int) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        for x in inputs:
+            t0 = time.perf_counter()
+            fn(x)
+            samples.append(time.perf_counter() - t0)
+    return samples
+
+
+def _timed(fn: Callable[[], Any]) -> tuple:
+    t0 = time.perf_counter()
+    out = fn()
+    return out, round(time.perf_counter() - t0, 3)
+
+
+def _queries(n: int, seed: int = 7) -> List[str]:
+    """Birbirinden farklı n sorgu (tek uçuş / önbellek birleştirmesin diye numaralı)."""
+    rng = random.Random(seed)
+    return [f"{rng.choice(SAMPLE_QUERIES)} ({i})" for i in range(n)]
+
+
+def _make_embeddings(kind: str) -> Any:
+    if kind == "hash":
+        return HashEmbeddings()
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(model_name=EMB_MODEL)
+
+
+# ---- ölçümler ----
+
+def bench_postprocess(iters: int, seed: int = 11) -> Dict[str, Any]:
+    """_postprocess ve token token _StreamPostprocessor işlem hızı."""
+    rng = random.Random(seed)
+    lines = DEFAULT_ANSWER.splitlines()
+    raws = []
+    for _ in range(200):
+        body = lines[:-2]
+        rng.shuffle(body)
+        raws.append("\n".join(body + lines[-2:]) + "\n")
+    total_bytes = sum(len(raws[i % len(raws)].encode("utf-8")) for i in range(iters))
+
+    _, secs = _timed(lambda: [_postprocess(raws[i % len(raws)]) for i in range(iters)])
+    tokens = [[raw[j:j + 4] for j in range(0, len(raw), 4)] for raw in raws]
+
+    def run_stream() -> None:
+        for i in range(iters):
+            pp = _StreamPostprocessor()
+            for tok in tokens[i % len(tokens)]:
+                pp.feed(tok)
+                pp.render()
+            pp.finish()
+
+    _, stream_secs = _timed(run_stream)
+    return {
+        "iters": iters,
+        "batch_per_s": round(iters / max(secs, 1e-9), 1),
+        "batch_mb_per_s": round(total_bytes / 1e6 / max(secs, 1e-9), 2),
+        "stream_per_s": round(iters / max(stream_secs, 1e-9), 1),
+    }
+
+
+def bench_retrieval(store: Any, repeat: int, warmup: int) -> Dict[str, Any]:
+    retriever = store.as_retriever(search_type="mmr", search_kwargs=MMR_SEARCH_KWARGS)
+    _time_calls(retriever.invoke, SAMPLE_QUERIES[:warmup], 1)
+    return summarize_ms(_time_calls(retriever.invoke, SAMPLE_QUERIES, repeat))
+
+
+def bench_e2e(store: Any, model_url: str, n: int) -> Dict[str, Any]:
+    """Sahte HF sunucusuna karşı uçtan uca invoke ve stream."""
+    os.environ["HF_MODEL"] = model_url
+    qa = make_retrieval_chain(store.as_retriever(search_type="mmr", search_kwargs=MMR_SEARCH_KWARGS))
+    qa.invoke({"query": "ısınma"})  # bağlantı + yetenek keşfi ölçüme girmesin
+
+    stages: Dict[str, List[float]] = {}
+    invoke_s: List[float] = []
+    for q in _queries(n):
+        t0 = time.perf_counter()
+        res = qa.invoke({"query": q})
+        invoke_s.append(time.perf_counter() - t0)
+        for key, value in res.get("timings", {}).items():
+            if key.endswith("_ms") and isinstance(value, (int, float)):
+                stages.setdefault(key, []).append(float(value))
+
+    first_partial: List[float] = []
+    stream_s: List[float] = []
+    for q in _queries(n, seed=8):
+        t0 = time.perf_counter()
+        first = None
+        for event in qa.stream({"query": q}):
+            if first is None and "partial" in event:
+                first = time.perf_counter() - t0
+        stream_s.append(time.perf_counter() - t0)
+        first_partial.append(first if first is not None else stream_s[-1])
+
+    return {
+        "invoke": summarize_ms(invoke_s),
+        "stream": {**summarize_ms(stream_s), "ttfp_p50_ms": summarize_ms(first_partial)["p50_ms"]},
+        "stages_mean_ms": {k: round(float(np.mean(v)), 3) for k, v in sorted(stages.items())},
+    }
+
+
+def bench_size(size: int, args: argparse.Namespace, embeddings: Any, model_url: str) -> Dict[str, Any]:
+    work = Path(tempfile.mkdtemp(prefix=f"focusia-bench-{size}-"))
+    json_path, synth_s = _timed(lambda: synth_corpus(size, work / "tips.jsonl"))
+    result: Dict[str, Any] = {
+        "size": size, "synth_s": synth_s, "indexed_docs": {}, "build": {}, "retrieval": {}, "e2e": {}
+    }
+    stores: Dict[str, Any] = {}
+
+    if "chroma" in args.backends:
+        persist = str(work / "chroma")
+        build = lambda: build_or_load_chroma(str(json_path), persist, EMB_MODEL, embeddings=embeddings)
+        _, build_s = _timed(build)
+        stores["chroma"], load_s = _timed(build)  # manifest eşleşir → hızlı yol
+        result["build"]["chroma"] = {"build_s": build_s, "load_s": load_s}
+        result["indexed_docs"]["chroma"] = stores["chroma"]._collection.count()
+    if "numpy" in args.backends:
+        stores["numpy"], build_s = _timed(
+            lambda: build_numpy_index(str(json_path), EMB_MODEL, embeddings=embeddings)
+        )
+        result["build"]["numpy"] = {"build_s": build_s}
+        result["indexed_docs"]["numpy"] = len(stores["numpy"])
+
+    try:
+        for name, store in stores.items():
+            result["retrieval"][name] = bench_retrieval(store, args.repeat, args.warmup)
+            if args.e2e:
+                result["e2e"][name] = bench_e2e(store, model_url, args.e2e)
+    finally:
+        stores.clear()
+        shutil.rmtree(work, ignore_errors=True)
+    return result
+
+
+# ---- sonuç dosyası ----
+
+def _git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=10)
+        return out.stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def _flatten(obj: Any, prefix: str = "") -> Dict[str, float]:
+    flat: Dict[str, float] = {}
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            flat.update(_flatten(v, f"{prefix}.{k}" if prefix else str(k)))
+    elif isinstance(obj, (int, float)) and not isinstance(obj, bool):
+        flat[prefix] = float(obj)
+    return flat
+
+
+def _indexed_docs(doc: Dict[str, Any]) -> Dict[int, Any]:
+    return {run["size"]: run.get("indexed_docs") for run in doc.get("runs", [])}
+
+
+def comparability_notes(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """Koşular aynı belge kümesini mi indeksledi: farklı near_dedup ayarı / belge sayısı."""
+    notes = []
+    old_dedup = baseline.get("meta", {}).get("near_dedup")
+    new_dedup = current.get("meta", {}).get("near_dedup")
+    if old_dedup != new_dedup:
+        notes.append(f"near_dedup ayarı farklı: {old_dedup} → {new_dedup}")
+    cur_docs, base_docs = _indexed_docs(current), _indexed_docs(baseline)
+    for size in sorted(s for s in cur_docs if s in base_docs and cur_docs[s] != base_docs[s]):
+        notes.append(f"{size}: indekslenen belge {base_docs[size]} → {cur_docs[size]}; bu boyut karşılaştırılmadı")
+    return notes
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Baseline'a göre tolerance'tan fazla yavaşlayan metrikler (aynı boyut/arka uç eşleşmeleri).
+    İndekslenen belge sayısı farklı olan boyutlar karşılaştırılmaz (ör. yakın kopya eleme açık/kapalı).
+    """
+    cur_docs, base_docs = _indexed_docs(current), _indexed_docs(baseline)
+    skipped = {s for s in cur_docs if s in base_docs and cur_docs[s] != base_docs[s]}
+
+    def by_size(doc: Dict[str, Any]) -> Dict[str, float]:
+        flat: Dict[str, float] = {}
+        for run in doc.get("runs", []):
+            if run["size"] in skipped:
+                continue
+            flat.update(_flatten({k: v for k, v in run.items() if k not in ("size", "indexed_docs")}, f"{run['size']}"))
+        flat.update(_flatten(doc.get("postprocess", {}), "postprocess"))
+        return flat
+
+    cur, base = by_size(current), by_size(baseline)
+    lines = []
+    for key, old in sorted(base.items()):
+        new = cur.get(key)
+        if new is None or old <= 0:
+            continue
+        if key.endswith(REGRESSION_KEYS) and new > old * (1 + tolerance):
+            lines.append(f"{key}: {old:g} → {new:g} ({new / old:.2f}x)")
+        elif key.endswith("_per_s") and new < old / (1 + tolerance):  # işlem hızında düşüş
+            lines.append(f"{key}: {old:g} → {new:g} ({new / old:.2f}x)")
+    return lines
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", default="1000", help="virgülle ayrılmış korpus boyutları (örn. 1000,100000,1000000)")
+    ap.add_argument("--backends", default="chroma,numpy", help="chroma,numpy")
+    ap.add_argument("--embeddings", default="hash", choices=["hash", "model"])
+    ap.add_argument("--repeat", type=int, default=20, help="retrieval: sorgu setinin tekrar sayısı")
+    ap.add_argument("--warmup", type=int, default=3)
+    ap.add_argument("--e2e", type=int, default=20, help="uçtan uca ölçülecek sorgu sayısı (0 = atla)")
+    ap.add_argument("--postprocess-iters", type=int, default=20000)
+    ap.add_argument("--latency-ms", type=float, default=200.0, help="sahte sunucu: ilk token gecikmesi")
+    ap.add_argument("--tokens-per-sec", type=float, default=50.0, help="sahte sunucu: token hızı")
+    ap.add_argument("--text-only", action="store_true", help="sahte sunucuda chat_completion kapalı (geri düşme yolu)")
+    ap.add_argument("--out", default="", help="sonuç JSON'u (varsayılan: benchmarks/results/<zaman>.json)")
+    ap.add_argument("--compare", default="", help="gerileme kontrolü için önceki sonuç JSON'u")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="gerileme eşiği (0.2 = %%20 yavaşlama)")
+    args = ap.parse_args()
+    args.backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+
+    embeddings = _make_embeddings(args.embeddings)
+    results: Dict[str, Any] = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+            "embeddings": args.embeddings,
+            "near_dedup": near_dedup_id(),
+            "search_kwargs": MMR_SEARCH_KWARGS,
+            "stub": {"latency_ms": args.latency_ms, "tokens_per_sec": args.tokens_per_sec, "chat": not args.text_only},
+        },
+        "postprocess": bench_postprocess(args.postprocess_iters),
+        "runs": [],
+    }
+
+    with StubHFServer(args.latency_ms, args.tokens_per_sec, chat=not args.text_only) as url:
+        for size in (int(s) for s in args.sizes.split(",") if s.strip()):
+            print(f"\n=== {size} ipucu ===")
+            results["runs"].append(bench_size(size, args, embeddings, url))
+
+    pp = results["postprocess"]
+    print(f"\n_postprocess: {pp['batch_per_s']:.0f}/s ({pp['batch_mb_per_s']} MB/s), akışlı: {pp['stream_per_s']:.0f}/s")
+    print(f"{'size':>8} {'backend':<7} {'build s':>8} {'load s':>7} {'mmr p50':>8} {'mmr p99':>8} {'e2e p50':>8} {'ttfp p50':>9}")
+    for run in results["runs"]:
+        for name, build in run["build"].items():
+            r = run["retrieval"].get(name, {})
+            e = run["e2e"].get(name, {})
+            print(
+                f"{run['size']:>8} {name:<7} {build['build_s']:>8.2f} {build.get('load_s', 0):>7.2f} "
+                f"{r.get('p50_ms', 0):>8.2f} {r.get('p99_ms', 0):>8.2f} "
+                f"{e.get('invoke', {}).get('p50_ms', 0):>8.1f} {e.get('stream', {}).get('ttfp_p50_ms', 0):>9.1f}"
+            )
+
+    out = Path(args.out) if args.out else ROOT / "benchmarks" / "results" / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\n→ {out}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        regressions = compare(results, baseline, args.tolerance)
+        print(f"\nBaseline ({args.compare}) ile karşılaştırma: {len(regressions)} gerileme")
+        for note in comparability_notes(results, baseline):
+            print(f"  ~ {note}")
+        for line in regressions:
+            print(f"  ! {line}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+benchmarks/load_test.py
+-----------------------
+N eşzamanlı kullanıcıyı tek bir paylaşılan zincire (app'teki st.cache_resource `qa` gibi)
+karşı çalıştırır; kabul kuyruğu (admission.AdmissionQueue) açık ve kapalıyken işlem hızını
+ve kuyruk gecikmesini karşılaştırır.
+
+Varsayılan olarak ağ gerektirmez: LLM yerel sahte HF sunucusudur (stub_hf_server.py) ve
+`--rate-limit` ile aynı anda bundan fazla isteğe 429 döner (HF rate limit benzetimi);
+embedding HashEmbeddings, indeks focus_tips.json üzerinden NumPy indeksidir.
+Tüm kullanıcılar aynı anda başlar (ani yoğunluk); her biri `--requests` farklı sorgu gönderir.
+
+Her `--limits` değeri için (0 = kuyruk kapalı): duvar süresi, başarılı/başarısız istekler
+(hata türüne göre), başarılı istek/sn, gecikme p50/p95/p99, kuyruk bekleme süresi ve sahte
+sunucunun gördüğü 429 / en yüksek eşzamanlılık raporlanır.
+
+Kullanım:
+    python benchmarks/load_test.py                                   # 16 kullanıcı, limit 0 ve 4
+    python benchmarks/load_test.py --users 32 --limits 0,2,4,8 --rate-limit 4 --out load.json
+    python benchmarks/load_test.py --path stream --latency-ms 500 --tokens-per-sec 30
+    python benchmarks/load_test.py --real --users 4 --limits 0,2    # gerçek HF_MODEL (kota harcar!)
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+os.environ.setdefault("FOCUSIA_ANSWER_CACHE", "0")  # her isteğin gerçekten LLM'e gitmesi için
+# Yakın kopya eleme indekslenen belge sayısını değiştirir; koşular arası karşılaştırma için sabit (kapalı)
+os.environ.setdefault("FOCUSIA_NEAR_DEDUP", "0")
+
+from _common import ROOT, SAMPLE_QUERIES, HashEmbeddings, summarize_ms
+from stub_hf_server import StubHFServer
+
+from admission import AdmissionQueue
+from data_loader import build_numpy_index
+from near_dedup import near_dedup_id
+from rag_pipeline import make_retrieval_chain
+
+MMR_SEARCH_KWARGS = {"k": 5, "fetch_k": 20, "lambda_mult": 0.7}  # app.py ile aynı
+
+
+def _one(qa: Any, q: str, path: str) -> dict:
+    if path == "stream":
+        result: dict = {}
+        for event in qa.stream({"query": q}):
+            if "partial" not in event:
+                result = event
+        return result
+    return qa.invoke({"query": q})
+
+
+def run_load(qa: Any, users: int, requests: int, think_s: float, path: str) -> Dict[str, Any]:
+    """Tüm kullanıcıları aynı anda başlatır; istek başına süre, hata ve kuyruk bilgisini toplar."""
+    barrier = threading.Barrier(users)
+    lock = threading.Lock()
+    ok_s: List[float] = []
+    queue_ms: List[float] = []
+    errors: Counter = Counter()
+
+    def user(u: int) -> None:
+        barrier.wait()
+        for r in range(requests):
+            # Sorgular farklı: tek uçuş birleştirmesi yükü gizlemesin
+            q = f"{SAMPLE_QUERIES[(u + r) % len(SAMPLE_QUERIES)]} (kullanıcı {u}, istek {r})"
+            t0 = time.perf_counter()
+            try:
+                res = _one(qa, q, path)
+            except Exception as e:
+                with lock:
+                    errors[type(e).__name__] += 1
+            else:
+                with lock:
+                    ok_s.append(time.perf_counter() - t0)
+                    queue_ms.append(float(res.get("timings", {}).get("queue_ms", 0.0)))
+            if think_s:
+                time.sleep(think_s)
+
+    threads = [threading.Thread(target=user, args=(u,), name=f"user-{u}") for u in range(users)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+
+    total = users * requests
+    return {
+        "wall_s": round(wall, 3),
+        "requests": total,
+        "ok": len(ok_s),
+        "errors": dict(errors),
+        "ok_per_s": round(len(ok_s) / wall, 2) if wall else 0.0,
+        "latency": summarize_ms(ok_s),
+        "queue": summarize_ms([ms / 1000.0 for ms in queue_ms]),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--users", type=int, default=16, help="eşzamanlı kullanıcı sayısı")
+    ap.add_argument("--requests", type=int, default=3, help="kullanıcı başına istek")
+    ap.add_argument("--think-ms", type=float, default=0.0, help="kullanıcının istekler arası beklemesi")
+    ap.add_argument("--path", default="invoke", choices=["invoke", "stream"])
+    ap.add_argument("--limits", default="0,4", help="denenecek FOCUSIA_LLM_CONCURRENCY değerleri (0 = kuyruk kapalı)")
+    ap.add_argument("--queue-size", type=int, default=64, help="kuyrukta bekleyebilecek en fazla istek")
+    ap.add_argument("--queue-timeout", type=float, default=60.0, help="kuyrukta en fazla bekleme (sn)")
+    ap.add_argument("--latency-ms", type=float, default=300.0, help="sahte sunucu: ilk token gecikmesi")
+    ap.add_argument("--tokens-per-sec", type=float, default=50.0, help="sahte sunucu: token hızı")
+    ap.add_argument("--rate-limit", type=int, default=4, help="sahte sunucu: aynı anda en fazla istek, fazlası 429 (0 = sınırsız)")
+    ap.add_argument("--real", action="store_true", help="sahte sunucu yerine HF_MODEL / HF_TOKEN ile gerçek uç nokta")
+    ap.add_argument("--out", default="", help="sonuçların yazılacağı JSON dosyası")
+    args = ap.parse_args()
+
+    index = build_numpy_index(str(ROOT / "focus_tips.json"), embeddings=HashEmbeddings())
+    retriever = index.as_retriever(search_type="mmr", search_kwargs=MMR_SEARCH_KWARGS)
+
+    stub: Optional[StubHFServer] = None
+    if not args.real:
+        os.environ.setdefault("HF_TOKEN", "stub")
+        stub = StubHFServer(args.latency_ms, args.tokens_per_sec, max_concurrency=args.rate_limit)
+        os.environ["HF_MODEL"] = stub.start()
+    qa = make_retrieval_chain(retriever)
+
+    runs = []
+    try:
+        for limit in (int(x) for x in args.limits.split(",") if x.strip()):
+            qa.llm.admission = AdmissionQueue(limit, args.queue_size, args.queue_timeout) if limit > 0 else None
+            if stub is not None:
+                stub.reset_stats()
+            res = run_load(qa, args.users, args.requests, args.think_ms / 1000.0, args.path)
+            res["limit"] = limit
+            if stub is not None:
+                res["server"] = stub.stats()
+            runs.append(res)
+            errs = ", ".join(f"{k}={v}" for k, v in res["errors"].items()) or "-"
+            server = res.get("server", {})
+            print(
+                f"[Load] limit={limit or 'kapalı'}: {res['ok']}/{res['requests']} ok in {res['wall_s']:.1f}s "
+                f"({res['ok_per_s']} ok/s) | p50={res['latency']['p50_ms']:.0f}ms p95={res['latency']['p95_ms']:.0f}ms "
+                f"p99={res['latency']['p99_ms']:.0f}ms | queue p95={res['queue']['p95_ms']:.0f}ms | errors: {errs}"
+                + (f" | 429={server['rejected_429']} peak={server['peak_in_flight']}" if server else "")
+            )
+    finally:
+        if stub is not None:
+            stub.stop()
+
+    if args.out:
+        meta = {k: v for k, v in vars(args).items() if k != "out"}
+        meta.update(near_dedup=near_dedup_id(), indexed_docs=len(index))
+        Path(args.out).write_text(json.dumps({"args": meta, "runs": runs}, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"→ {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+benchmarks/stub_hf_server.py
+----------------------------
+Ağ erişimi olmadan benchmark için, HF Inference API'nin kullandığımız iki ucunu taklit
+eden yerel HTTP sunucusu. InferenceClient(model="http://127.0.0.1:<port>") ile çalışır:
+
+- POST /v1/chat/completions : chat_completion (stream=True ise SSE, OpenAI biçimi)
+- POST /                    : text_generation ({"inputs", "parameters", "stream"})
+
+Gecikme modeli: ilk token'dan önce `latency_ms`, sonra saniyede `tokens_per_sec` token.
+`chat=False` ile sohbet ucu 404 döner (text_generation'a geri düşme yolunu ölçmek için).
+`max_concurrency` verilirse aynı anda bundan fazla istek 429 alır (HF rate limit benzetimi).
+Yanıt metni, _postprocess'in temizlediği türden numaralı öneriler + açıklamalar içerir.
+
+Kullanım:
+    with StubHFServer(latency_ms=200, tokens_per_sec=50) as url:
+        client = InferenceClient(model=url, token="stub")
+
+    python benchmarks/stub_hf_server.py --port 8089 --latency-ms 200 --tokens-per-sec 50
+"""
+
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+DEFAULT_ANSWER = (
+    "1. Telefonu başka bir odaya koy\n"
+    "Böylece elini uzattığında ulaşamazsın.\n"
+    "2. Pomodoro tekniğini uygula\n"
+    "Kısa molalar odağını tazeler.\n"
+    "3. Bildirimleri kapat\n"
+    "Sadece önemli kişilere izin ver.\n"
+    "Kaynak: focus_tips.json\n"
+    "Mini egzersiz: 2 dakika nefesine odaklan; her nefeste 4'e kadar say.\n"
+)
+
+_TOKEN_RE = re.compile(r"\S+\s*|\s+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Kaba token bölme: kelime + ardından gelen boşluk (gerçek tokenizer'dan bağımsız, tekrarlanabilir)."""
+    return _TOKEN_RE.findall(text)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "_Server"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    # ---- yardımcılar ----
+
+    def _body(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _json(self, status: int, obj: Any) -> None:
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _tokens(self, limit: Optional[int]) -> List[str]:
+        tokens = tokenize(self.server.answer)
+        return tokens[:limit] if limit else tokens
+
+    def _sse(self, events: List[Dict[str, Any]], tail: Optional[str] = None) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        time.sleep(self.server.latency_s)
+        for i, ev in enumerate(events):
+            if i:
+                time.sleep(self.server.token_s)
+            self.wfile.write(b"data: " + json.dumps(ev, ensure_ascii=False).encode("utf-8") + b"\n\n")
+            self.wfile.flush()
+        if tail:
+            self.wfile.write(f"data: {tail}\n\n".encode("utf-8"))
+        self.close_connection = True
+
+    def _wait_full(self, n_tokens: int) -> None:
+        time.sleep(self.server.latency_s + self.server.token_s * max(0, n_tokens - 1))
+
+    # ---- uçlar ----
+
+    def do_POST(self) -> None:  # noqa: N802 (http.server API)
+        payload = self._body()
+        if not self.server.enter():
+            self._json(429, {"error": "Rate limit reached. Please retry later."})
+            return
+        try:
+            self._route(payload)
+        finally:
+            self.server.leave()
+
+    def _route(self, payload: Dict[str, Any]) -> None:
+        path = self.path.split("?")[0].rstrip("/")
+        if path == "/v1/chat/completions":
+            if not self.server.chat:
+                self._json(404, {"error": "Model does not support chat_completion"})
+                return
+            self._chat(payload)
+        elif path == "":
+            self._text_generation(payload)
+        else:
+            self._json(404, {"error": f"Unknown route {self.path}"})
+
+    def _chat(self, payload: Dict[str, Any]) -> None:
+        tokens = self._tokens(payload.get("max_tokens"))
+        base = {"id": "stub", "created": int(time.time()), "model": payload.get("model", "stub"), "system_fingerprint": "stub"}
+        if payload.get("stream"):
+            events = [
+                {**base, "object": "chat.completion.chunk",
+                 "choices": [{"index": 0, "delta": {"role": "assistant", "content": tok}, "finish_reason": None}]}
+                for tok in tokens
+            ]
+            if events:
+                events[-1]["choices"][0]["finish_reason"] = "stop"
+            self._sse(events, tail="[DONE]")
+            return
+        self._wait_full(len(tokens))
+        prompt_tokens = sum(len(tokenize(m.get("content", ""))) for m in payload.get("messages", []))
+        self._json(200, {
+            **base,
+            "object": "chat.completion",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens), "total_tokens": prompt_tokens + len(tokens)},
+        })
+
+    def _text_generation(self, payload: Dict[str, Any]) -> None:
+        params = payload.get("parameters") or {}
+        tokens = self._tokens(params.get("max_new_tokens"))
+        text = "".join(tokens)
+        if payload.get("stream"):
+            events = [
+                {"index": i, "token": {"id": i, "text": tok, "logprob": 0.0, "special": False},
+                 "generated_text": text if i == len(tokens) - 1 else None, "details": None}
+                for i, tok in enumerate(tokens)
+            ]
+            self._sse(events)
+            return
+        self._wait_full(len(tokens))
+        self._json(200, [{"generated_text": text}])
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr, latency_ms: float, tokens_per_sec: float, chat: bool, answer: str, max_concurrency: int):
+        super().__init__(addr, _Handler)
+        self.latency_s = latency_ms / 1000.0
+        self.token_s = 1.0 / tokens_per_sec if tokens_per_sec > 0 else 0.0
+        self.chat = chat
+        self.answer = answer
+        self.max_concurrency = max_concurrency
+        self.requests = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def enter(self) -> bool:
+        with self._lock:
+            self.requests += 1
+            if self.max_concurrency and self.in_flight >= self.max_concurrency:
+                self.rejected += 1
+                return False
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            return True
+
+    def leave(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+
+class StubHFServer:
+    """
+    Arka plan thread'inde çalışan sahte HF Inference sunucusu (context manager; URL döner).
+    - latency_ms: ilk token'a kadar gecikme
+    - tokens_per_sec: sonraki token'ların üretim hızı (0 = anında)
+    - chat: False ise /v1/chat/completions 404 döner
+    - max_concurrency: aynı anda işlenen en fazla istek; fazlası 429 alır (0 = sınırsız)
+    """
+    def __init__(
+        self,
+        latency_ms: float = 200.0,
+        tokens_per_sec: float = 50.0,
+        chat: bool = True,
+        answer: str = DEFAULT_ANSWER,
+        port: int = 0,
+        max_concurrency: int = 0,
+    ):
+        self._server = _Server(("127.0.0.1", port), latency_ms, tokens_per_sec, chat, answer, max_concurrency)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    @property
+    def requests(self) -> int:
+        return self._server.requests
+
+    def stats(self) -> Dict[str, int]:
+        """Toplam istek, 429 ile reddedilen ve aynı anda işlenen en yüksek istek sayısı."""
+        s = self._server
+        return {"requests": s.requests, "rejected_429": s.rejected, "peak_in_flight": s.peak}
+
+    def reset_stats(self) -> None:
+        s = self._server
+        with s._lock:
+            s.requests = s.rejected = s.peak = 0
+
+    def start(self) -> str:
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-hf", daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> str:
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="HF Inference API'yi taklit eden yerel sunucu.")
+    ap.add_argument("--port", type=int, default=8089)
+    ap.add_argument("--latency-ms", type=float, default=200.0)
+    ap.add_argument("--tokens-per-sec", type=float, default=50.0)
+    ap.add_argument("--text-only", action="store_true", help="chat_completion ucunu kapat (404)")
+    ap.add_argument("--max-concurrency", type=int, default=0, help="aynı anda en fazla istek; fazlası 429 (0 = sınırsız)")
+    args = ap.parse_args()
+
+    server = StubHFServer(
+        args.latency_ms, args.tokens_per_sec, chat=not args.text_only, port=args.port,
+        max_concurrency=args.max_concurrency,
+    )
+    print(f"[Stub] Serving fake HF Inference API on {server.url} (Ctrl+C ile durdur)")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+context_packer.py
+-----------------
+Prompt'a girecek bağlamı token bütçesine sığdırır (_format_docs'un bütçeli karşılığı).
+Bağlam büyüdükçe HF'teki prefill süresi ve maliyet de büyür; paketleyici:
+
+1. Pasajları retrieval skoruna göre sıralar (metadata["score"]; yoksa retriever sırası)
+2. Neredeyse aynı pasajları atar (kelime 3'lü shingle Jaccard benzerliği ≥ eşik)
+3. Bütçe dolana kadar ekler; sığmayan ilk pasajı cümle/kelime sınırında kırpar,
+   gerisini atar
+4. Kaç token kazanıldığını raporlar (timings: context_tokens / context_tokens_saved,
+   metrics: focusia_context_tokens_total{kind=kept|saved})
+
+Token'lar hedef modelin tokenizer'ıyla sayılır (HF Hub'daki tokenizer.json, bir kez indirilir;
+FOCUSIA_CONTEXT_TOKENIZER ile başka bir model/dosya verilebilir). Tokenizer alınamazsa
+(çevrimdışı, model yerine uç nokta URL'si) kelime/noktalama sayımına dayalı yaklaşık sayaç kullanılır.
+
+Kullanım:
+    packer = make_context_packer("Qwen/Qwen2.5-7B-Instruct")
+    packed = packer.pack(docs)
+    prompt.format(context=packed.text, ...)
+    packed.tokens_saved
+"""
+
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional, Sequence, Set, Tuple
+
+import metrics
+
+CONTEXT_TOKENS = int(os.getenv("FOCUSIA_CONTEXT_TOKENS", "512"))          # bağlam bütçesi; 0 = sınırsız
+CONTEXT_DEDUP = float(os.getenv("FOCUSIA_CONTEXT_DEDUP", "0.8"))         # Jaccard eşiği; 0 = kapalı
+CONTEXT_TOKENIZER = os.getenv("FOCUSIA_CONTEXT_TOKENIZER", "")           # boş = hedef model
+MIN_PASSAGE_TOKENS = 24  # kalan bütçe bundan azsa kırpılmış kısa parça eklenmez
+SEPARATOR = "\n\n"
+
+_CONTEXT_TOKENS = metrics.counter(
+    "focusia_context_tokens_total", "Bağlam paketleyicide token sayıları (kind=kept|saved)"
+)
+
+_PIECE_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_SENTENCE_END_RE = re.compile(r"[.!?…](?=\s|$)")
+
+
+# ---- Token sayımı ----
+
+class TokenCounter:
+    """
+    Metnin token sayısı ve en fazla n token'lık öneki.
+    - tokenizer verilmişse (tokenizers.Tokenizer) gerçek sayım, ofsetlerle kırpma
+    - verilmemişse kelime + noktalama parçaları (yaklaşık; Türkçe'de BPE genelde biraz daha fazla sayar)
+    """
+    def __init__(self, tokenizer: Any = None, name: str = "approx"):
+        self._tokenizer = tokenizer
+        self.name = name
+        self._ellipsis = self.count("…")  # kırpılan metne eklenen üç noktanın token bedeli
+
+    @property
+    def exact(self) -> bool:
+        return self._tokenizer is not None
+
+    def _ends(self, text: str) -> List[int]:
+        """Her token'ın metindeki bitiş ofseti."""
+        if self._tokenizer is None:
+            return [m.end() for m in _PIECE_RE.finditer(text)]
+        enc = self._tokenizer.encode(text, add_special_tokens=False)
+        return [end for _, end in enc.offsets]
+
+    def count(self, text: str) -> int:
+        if self._tokenizer is None:
+            return len(_PIECE_RE.findall(text))
+        return len(self._tokenizer.encode(text, add_special_tokens=False).ids)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """
+        En fazla max_tokens token'lık önek; mümkünse cümle, değilse kelime sınırında.
+        Kelime sınırında kesilince eklenen "…" de bütçeden düşülür (sığmıyorsa eklenmez).
+        """
+        ends = self._ends(text)
+        if len(ends) <= max_tokens:
+            return text
+        if max_tokens <= 0:
+            return ""
+        keep = max_tokens - self._ellipsis if max_tokens > self._ellipsis else max_tokens
+        cut = text[:ends[keep - 1]]
+        sentences = [m.end() for m in _SENTENCE_END_RE.finditer(cut)]
+        if sentences and sentences[-1] >= len(cut) // 2:
+            return cut[:sentences[-1]]
+        space = cut.rfind(" ")
+        if space > len(cut) // 2:
+            cut = cut[:space]
+        return cut.rstrip(" ,;:-") + ("…" if keep < max_tokens else "")
+
+
+_COUNTERS: dict = {}
+_COUNTERS_LOCK = threading.Lock()
+
+
+def _load_tokenizer(source: str) -> Any:
+    """tokenizer.json yolu ya da HF Hub model kimliği → tokenizers.Tokenizer."""
+    from tokenizers import Tokenizer
+
+    if os.path.isfile(source):
+        return Tokenizer.from_file(source)
+    if os.path.isdir(source):
+        return Tokenizer.from_file(os.path.join(source, "tokenizer.json"))
+    from huggingface_hub import hf_hub_download
+
+    token = os.getenv("HF_TOKEN") or os.getenv("HUGGINGFACEHUB_API_TOKEN") or os.getenv("HF_API_TOKEN") or None
+    return Tokenizer.from_file(hf_hub_download(source, "tokenizer.json", token=token))
+
+
+def token_counter(model_id: str) -> TokenCounter:
+    """Model başına bir kez yüklenen sayaç; tokenizer alınamazsa yaklaşık sayaç."""
+    source = CONTEXT_TOKENIZER or model_id
+    with _COUNTERS_LOCK:
+        if source in _COUNTERS:
+            return _COUNTERS[source]
+        counter = TokenCounter()
+        if source and "://" not in source and source != "default":
+            try:
+                counter = TokenCounter(_load_tokenizer(source), name=source)
+            except Exception as e:  # çevrimdışı, yetkisiz model, tokenizers yok...
+                print(f"[Context] {source} tokenizer'ı yüklenemedi ({type(e).__name__}: {e}); yaklaşık sayım kullanılıyor.")
+        _COUNTERS[source] = counter
+        return counter
+
+
+# ---- Paketleme ----
+
+def _shingles(text: str, n: int = 3) -> Set[Tuple[str, ...]]:
+    words = _WORD_RE.findall(text.casefold())
+    if len(words) < n:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+
+def _jaccard(a: Set[Any], b: Set[Any]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _score(doc: Any) -> Optional[float]:
+    score = (getattr(doc, "metadata", None) or {}).get("score")
+    return float(score) if isinstance(score, (int, float)) else None
+
+
+@dataclass
+class PackedContext:
+    """Paketleme sonucu: prompt'a girecek metin, kullanılan belgeler ve token sayıları."""
+    text: str
+    docs: List[Any]
+    tokens_in: int                    # tüm pasajlar olduğu gibi birleştirilseydi
+    tokens_out: int                   # paketlenmiş bağlam
+    dropped_duplicates: int = 0
+    dropped_budget: int = 0
+    truncated: int = 0
+    counter: str = "approx"
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.tokens_in - self.tokens_out)
+
+    def timings(self) -> dict:
+        """rag_pipeline._note'a verilecek alanlar."""
+        return {
+            "context_tokens": self.tokens_out,
+            "context_tokens_saved": self.tokens_saved,
+            "context_docs": len(self.docs),
+            "context_dropped": self.dropped_duplicates + self.dropped_budget,
+            "context_truncated": self.truncated,
+        }
+
+
+class ContextPacker:
+    """
+    Retriever çıktısını bütçeli bağlama çevirir.
+    - budget: en fazla bağlam token'ı (ayraçlar dahil; 0 = sınırsız, yalnızca sıralama + tekrar eleme)
+    - dedup_threshold: bu Jaccard benzerliğinin üstündeki pasaj, daha yüksek skorlu bir
+      pasajın tekrarı sayılıp atılır (0 = kapalı)
+    - counter: TokenCounter ya da onu üreten fonksiyon (tokenizer ilk pakette yüklenir)
+    """
+    def __init__(
+        self,
+        counter: "TokenCounter | Callable[[], TokenCounter]",
+        budget: int = CONTEXT_TOKENS,
+        dedup_threshold: float = CONTEXT_DEDUP,
+        min_passage_tokens: int = MIN_PASSAGE_TOKENS,
+    ):
+        self._counter = counter if isinstance(counter, TokenCounter) else None
+        self._factory = None if isinstance(counter, TokenCounter) else counter
+        self.budget = max(0, budget)
+        self.dedup_threshold = dedup_threshold
+        self.min_passage_tokens = max(1, min_passage_tokens)
+
+    @property
+    def counter(self) -> TokenCounter:
+        if self._counter is None:
+            self._counter = self._factory()
+        return self._counter
+
+    def warm(self) -> None:
+        """Tokenizer'ı şimdi yükler (ilk istek indirmeyi beklemesin)."""
+        _ = self.counter
+
+    def _ranked(self, docs: Sequence[Any]) -> List[Any]:
+        # Skor varsa büyükten küçüğe; eşitlikte ve skorsuz belgelerde retriever sırası korunur
+        scores = [_score(d) for d in docs]
+        order = sorted(range(len(docs)), key=lambda i: (-(scores[i] if scores[i] is not None else float("-inf")), i))
+        return [docs[i] for i in order]
+
+    def pack(self, docs: Sequence[Any]) -> PackedContext:
+        counter = self.counter
+        sep_tokens = counter.count(SEPARATOR)
+        texts = [getattr(d, "page_content", str(d)) for d in docs]
+        lengths = {id(d): counter.count(t) for d, t in zip(docs, texts)}
+        tokens_in = sum(lengths.values()) + sep_tokens * max(0, len(docs) - 1)
+
+        kept_docs: List[Any] = []
+        kept_texts: List[str] = []
+        kept_shingles: List[Set[Tuple[str, ...]]] = []
+        used = dupes = over = truncated = 0
+        for doc in self._ranked(docs):
+            text = getattr(doc, "page_content", str(doc))
+            if self.dedup_threshold > 0:
+                sh = _shingles(text)
+                if any(_jaccard(sh, other) >= self.dedup_threshold for other in kept_shingles):
+                    dupes += 1
+                    continue
+            else:
+                sh = set()
+            cost = lengths[id(doc)] + (sep_tokens if kept_texts else 0)
+            if self.budget and used + cost > self.budget:
+                room = self.budget - used - (sep_tokens if kept_texts else 0)
+                if room < self.min_passage_tokens:
+                    over += 1
+                    continue
+                text = counter.truncate(text, room)
+                cost = counter.count(text) + (sep_tokens if kept_texts else 0)
+                truncated += 1
+            kept_docs.append(doc)
+            kept_texts.append(text)
+            kept_shingles.append(sh)
+            used += cost
+
+        packed = PackedContext(
+            text=SEPARATOR.join(kept_texts),
+            docs=kept_docs,
+            tokens_in=tokens_in,
+            tokens_out=used,
+            dropped_duplicates=dupes,
+            dropped_budget=over,
+            truncated=truncated,
+            counter=counter.name,
+        )
+        _CONTEXT_TOKENS.inc(packed.tokens_out, kind="kept")
+        if packed.tokens_saved:
+            _CONTEXT_TOKENS.inc(packed.tokens_saved, kind="saved")
+        return packed
+
+
+def make_context_packer(model_id: str) -> ContextPacker:
+    """Hedef modelin tokenizer'ıyla (tembel yüklenir) ve ENV ayarlarıyla paketleyici."""
+    return ContextPacker(lambda: token_counter(model_id))
@@ -3,33 +3,83 @@
 data_loader.py
 --------------
 - focus_tips.json içeriğini Chroma vektör veritabanına gömer.
-- Eğer indeks daha önce oluşturulmuşsa (persist_dir doluysa) aynı indeksi yükler.
-- Embedding: sentence-transformers/all-MiniLM-L6-v2
-- Vektör DB: Chroma
+- Eğer indeks daha önce oluşturulmuşsa (persist_dir doluysa) aynı indeksi yükler;
+  JSON değiştiyse yalnızca yeni/değişen kayıtları gömer, silinenleri indeksten çıkarır
+  (persist_dir içindeki focusia_manifest.json'daki içerik hash'lerine göre).
+- Kaynak JSON (kök seviye liste) ya da JSONL olabilir; dosya akış halinde okunur ve
+  sabit boyutlu parçalar halinde indekslenir (bellek kullanımı korpus boyutundan bağımsız).
+- Embedding: sentence-transformers/all-MiniLM-L6-v2, PyTorch (varsayılan) ya da
+  FOCUSIA_EMB_BACKEND=onnx ile ONNX + int8 (onnx_embeddings.py; torch yüklenmez)
+  (büyük korpuslarda batch'lere bölünüp süreç havuzunda paralel gömülebilir;
+   FOCUSIA_BUILD_WORKERS / FOCUSIA_BUILD_BATCH)
+- FOCUSIA_EMB_SERVER verilmişse model süreçte yüklenmez; vektörler paylaşılan embedding
+  sunucusundan (embedding_server.py, micro-batch) gelir.
+- Vektörler (model, metin hash'i) anahtarıyla diskteki embedding önbelleğinde tutulur
+  (embedding_cache.py); indeks silinse bile yeniden kurulum modeli çağırmadan biter.
+- Başka kelimelerle yazılmış yakın kopyalar kurulumda MinHash/LSH ile kümelenir, her kümeden
+  tek kayıt (tüm başlıklarıyla) indekslenir (near_dedup.py; FOCUSIA_NEAR_DEDUP=1, varsayılan kapalı).
+- Vektör DB: Chroma. Yanında aynı belgelerin BM25 ters indeksi (lexical_index.py,
+  persist_dir/focusia_bm25.npz) kurulur; hibrit arama için load_lexical_index ile açılır.
+- langchain_community (Chroma + chromadb, HuggingFaceEmbeddings + sentence-transformers/torch)
+  ilk kullanımda import edilir; modülü import etmek ucuzdur (app.py arka planda ısıtır).
 
 Kullanım:
     from data_loader import build_or_load_chroma
     db = build_or_load_chroma()
 
+    # Alternatif: Chroma'sız, süreç içi NumPy indeksi (vector_index.py)
+    from data_loader import build_numpy_index
+    index = build_numpy_index()
+
 Notlar:
 - HF Spaces'te 50GB kotayı doldurmamak için indeksleri kalıcı dizin yerine
   /tmp altında tutmak gerekebilir. Bunu yapmak için ENV değişkeni tanımlayıp
   PERSIST_DIR yerine CHROMA_PERSIST_DIR kullanabilir (aşağıdaki yorumlara bakılabilir).
 """
 
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
 from pathlib import Path
+import hashlib
 import json
-from typing import List, Dict, Any
+import multiprocessing
+import os
+import time
+from typing import TYPE_CHECKING, List, Dict, Any, Iterator, Optional, Set, TextIO, Tuple
 
 # LangChain v0.2+ import yolları
 from langchain_core.documents import Document
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import Chroma
+from langchain_core.embeddings import Embeddings
+
+import numpy as np
+
+import profiler
+from embedding_cache import EMB_CACHE_DIR, CachedEmbeddings, EmbeddingCache
+from embedding_server import EMB_SERVER, RemoteEmbeddings
+from lexical_index import HYBRID_ENABLED, BM25Builder, BM25Index
+from near_dedup import NEAR_DEDUP_ENABLED, DedupPlan, near_dedup_id, plan_near_duplicates
+from retrieval_cache import invalidate_index
+from vector_index import NumpyVectorIndex
+
+if TYPE_CHECKING:  # yalnızca tip ipuçları için; çalışma anında ilk kullanımda import edilir
+    from langchain_community.vectorstores import Chroma
 
 # ---- Varsayılan ayarlar (ENV ile özelleştirilebilir) ----
 EMB_MODEL = "sentence-transformers/all-MiniLM-L6-v2"  # hızlı ve küçük, demo için ideal
 PERSIST_DIR = "chroma_db"                              # kalıcı indeks klasörü (varsayılan)
 JSON_PATH = "focus_tips.json"                          # veri kaynağı dosyası
+MANIFEST_FILE = "focusia_manifest.json"                # indeksteki kayıtların hash manifestosu
+MANIFEST_VERSION = 1
+LEXICAL_FILE = "focusia_bm25.npz"                      # BM25 ters indeksi (hibrit arama)
+WRITE_BATCH = 1000                                     # Chroma'ya tek seferde yazılan belge sayısı
+BUILD_WORKERS = int(os.getenv("FOCUSIA_BUILD_WORKERS", "0"))   # 0/1: tek süreç, >1: süreç havuzu
+BUILD_BATCH = int(os.getenv("FOCUSIA_BUILD_BATCH", "256"))     # embedding batch boyutu
+INGEST_CHUNK = int(os.getenv("FOCUSIA_INGEST_CHUNK", "2048"))  # bellekte tutulan en fazla belge sayısı
+JSONL_SUFFIXES = (".jsonl", ".ndjson")
+EMB_CACHE_ENABLED = os.getenv("FOCUSIA_EMB_CACHE", "1") != "0"  # 0: embedding önbelleğini kapat
+EMB_BACKENDS = ("torch", "onnx")
+EMB_BACKEND = os.getenv("FOCUSIA_EMB_BACKEND", "torch").lower()  # torch | onnx (int8, onnxruntime)
+ONNX_TAG = "onnx-int8"                                          # embedding kimliğindeki arka uç etiketi
 
 
 def _normalize_record(row: Dict[str, Any]) -> Document | None:
@@ -55,21 +105,412 @@ def _normalize_record(row: Dict[str, Any]) -> Document | None:
     return Document(page_content=text, metadata={"topic": topic})
 
 
+def _doc_key(doc: Document) -> bytes:
+    """
+    Normalize edilmiş kaydın 16 baytlık içerik hash'i (topic + page_content).
+    Tekilleştirmede (topic, içerik) string ikilileri yerine bu kompakt özet tutulur.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(doc.metadata.get("topic", "").encode("utf-8"))
+    h.update(b"\x1f")
+    h.update(doc.page_content.strip().encode("utf-8"))
+    return h.digest()
+
+
+def _doc_id(doc: Document) -> str:
+    """
+    Kaydın içerik hash'inin hex hali.
+    Chroma'da belge id'si olarak da kullanılır; böylece manifest ile indeks birebir eşleşir.
+    """
+    return _doc_key(doc).hex()
+
+
+def _file_sha256(path: Path) -> str:
+    """Kaynak dosyanın hash'i; değişmediyse JSON'u hiç ayrıştırmadan indeksi yükleriz."""
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _read_manifest(persist_dir: str) -> Optional[Dict[str, Any]]:
+    """Manifest yoksa ya da okunamıyorsa None döner (indeks 'bilinmeyen durumda' sayılır)."""
+    path = Path(persist_dir) / MANIFEST_FILE
+    try:
+        with path.open("r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(manifest, dict) or manifest.get("version") != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def _write_manifest(persist_dir: str, manifest: Dict[str, Any]) -> None:
+    """Manifesti atomik yazar (yarım kalmış bir yazım eski manifesti bozmasın)."""
+    path = Path(persist_dir) / MANIFEST_FILE
+    tmp = path.with_suffix(".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+# ---- Akış halinde okuma (büyük korpuslar) ----
+
+def _iter_jsonl(f: TextIO, source: str) -> Iterator[Any]:
+    """JSONL: her satır bir kayıt; boş satırlar atlanır."""
+    for lineno, line in enumerate(f, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"{source}:{lineno} geçersiz JSON satırı: {e}") from e
+
+
+def _iter_json_array(f: TextIO, source: str, chunk_size: int = 1 << 16) -> Iterator[Any]:
+    """
+    Kök seviye JSON listesini tamamını belleğe almadan, eleman eleman ayrıştırır.
+    Tampon yalnızca o an çözülen elemanı (ve bir okuma parçasını) tutar.
+    """
+    decoder = json.JSONDecoder()
+    buf, pos, eof = "", 0, False
+
+    def fill() -> bool:
+        nonlocal buf, pos, eof
+        if eof:
+            return False
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        buf, pos = buf[pos:] + chunk, 0
+        return True
+
+    def peek() -> str:
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n\ufeff":
+                pos += 1
+            if pos < len(buf):
+                return buf[pos]
+            if not fill():
+                return ""
+
+    if peek() != "[":
+        # Beklenen format: [{"topic": "...", "content": "..."}, ...]
+        raise ValueError(f"{source} formatı geçersiz: kök seviye bir liste bekleniyor.")
+    pos += 1
+    if peek() == "]":
+        return
+
+    while True:
+        if not peek():
+            raise ValueError(f"{source} geçersiz JSON: beklenmeyen dosya sonu.")
+        while True:
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError as e:
+                if fill():
+                    continue
+                raise ValueError(f"{source} geçersiz JSON: {e}") from e
+            # Tampon sonunda biten bir değer (örn. sayı) kesilmiş olabilir → bir parça daha oku
+            if end >= len(buf) and fill():
+                continue
+            break
+        pos = end
+        yield obj
+
+        c = peek()
+        if c == ",":
+            pos += 1
+        elif c == "]":
+            return
+        else:
+            raise ValueError(f"{source} geçersiz JSON: liste elemanları arasında ',' bekleniyor.")
+
+
+def iter_records(json_path: str) -> Iterator[Any]:
+    """Kaynak dosyadaki ham kayıtları sırayla üretir (.jsonl/.ndjson ya da JSON liste)."""
+    json_file = Path(json_path)
+    with json_file.open("r", encoding="utf-8") as f:
+        if json_file.suffix.lower() in JSONL_SUFFIXES:
+            yield from _iter_jsonl(f, str(json_path))
+        else:
+            yield from _iter_json_array(f, str(json_path))
+
+
+def iter_documents(json_path: str, seen: Optional[Set[bytes]] = None) -> Iterator[Tuple[bytes, Document]]:
+    """
+    Kayıtları normalize edip tekilleştirerek (içerik hash'i, Document) çiftleri üretir.
+    seen: dışarıdan verilirse, görülen tüm kayıtların hash'leri buraya eklenir.
+    """
+    seen = set() if seen is None else seen
+    for row in iter_records(json_path):
+        doc = _normalize_record(row)
+        if not doc:
+            continue
+        key = _doc_key(doc)
+        if key in seen:
+            continue
+        seen.add(key)
+        yield key, doc
+
+
+def near_dedup_plan(json_path: str) -> Optional[DedupPlan]:
+    """Kaynağı bir kez okuyup neredeyse aynı kayıtları kümeler (FOCUSIA_NEAR_DEDUP=0 ise None)."""
+    if not NEAR_DEDUP_ENABLED:
+        return None
+    t0 = time.perf_counter()
+    plan = plan_near_duplicates((k, d.page_content, d.metadata.get("topic", "")) for k, d in iter_documents(json_path))
+    print(f"[Dedup] {plan.report()} in {time.perf_counter() - t0:.1f}s")
+    return plan
+
+
+def iter_index_documents(
+    json_path: str, seen: Optional[Set[bytes]] = None, plan: Optional[DedupPlan] = None
+) -> Iterator[Tuple[bytes, Document]]:
+    """
+    İndekse girecek (anahtar, Document) çiftleri: iter_documents + plan varsa yakın kopyalar
+    atılır, temsilcilere kümedeki başlıklar yazılır. seen: iter_documents'taki gibi (tüm kayıtlar).
+    """
+    for key, doc in iter_documents(json_path, seen):
+        item = (key, doc) if plan is None else plan.apply(key, doc)
+        if item is not None:
+            yield item
+
+
+def _hf_embeddings(model_name: str) -> Embeddings:
+    """sentence-transformers modelini yükler (torch dahil import burada, ilk ihtiyaçta olur)."""
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(model_name=model_name)
+
+
+def _split_embedding_id(eid: str) -> Tuple[str, Optional[str]]:
+    """"<model>#onnx-int8" → (model, "onnx"); etiketsiz ad → (model, None)."""
+    model, _, tag = eid.partition("#")
+    return model, ("onnx" if tag == ONNX_TAG else None)
+
+
+def embedding_id(embedding_model: str = EMB_MODEL, backend: Optional[str] = None) -> str:
+    """
+    Vektörlerin kimliği: model + arka uç. Embedding önbelleği ad alanı, Chroma manifesti ve
+    snapshot başlığı bunu kullanır; farklı arka uçların vektörleri birbirine karışmaz.
+    - torch: yalın model adı (eski önbellek ve manifestler geçerli kalır)
+    - onnx:  "<model>#onnx-int8"
+    embedding_model zaten etiketliyse etiket geçerlidir; değilse backend, o da yoksa FOCUSIA_EMB_BACKEND.
+    """
+    model, tagged = _split_embedding_id(embedding_model)
+    backend = (tagged or backend or EMB_BACKEND).lower()
+    if backend not in EMB_BACKENDS:
+        raise ValueError(f"Bilinmeyen embedding arka ucu: {backend} (seçenekler: {', '.join(EMB_BACKENDS)})")
+    return model if backend == "torch" else f"{model}#{ONNX_TAG}"
+
+
+def _model_embeddings(eid: str, threads: int = 0) -> Embeddings:
+    """embedding_id ile üretilmiş kimlikten modeli yükler (etiketsiz = torch)."""
+    model, backend = _split_embedding_id(eid)
+    if backend == "onnx":
+        from onnx_embeddings import ONNX_THREADS, load_onnx_embeddings
+        return load_onnx_embeddings(model, threads=threads or ONNX_THREADS)
+    return _hf_embeddings(model)
+
+
+def _open_chroma(persist_dir: str, embeddings: Embeddings) -> "Chroma":
+    """Chroma koleksiyonunu açar (langchain_community + chromadb importu ~1 sn; ilk çağrıda)."""
+    from langchain_community.vectorstores import Chroma
+    return Chroma(persist_directory=persist_dir, embedding_function=embeddings)
+
+
+def make_embeddings(embedding_model: str = EMB_MODEL, backend: Optional[str] = None):
+    """
+    Embedding nesnesini hazırlar.
+    - backend: "torch" (HuggingFaceEmbeddings) ya da "onnx" (OnnxEmbeddings, int8);
+      verilmezse embedding_model'deki etiket, o da yoksa FOCUSIA_EMB_BACKEND
+    - FOCUSIA_EMB_SERVER verilmişse model yerine RemoteEmbeddings (sunucu aynı embedding_id'yi
+      sunmalı; farklıysa ilk istekte hata)
+    - Önbellek açıksa (FOCUSIA_EMB_CACHE != 0) CachedEmbeddings döner; model ancak
+      önbellekte olmayan bir metin geldiğinde yüklenir. Ad alanı embedding_id'dir.
+    - Kapalıysa doğrudan model nesnesi.
+    """
+    eid = embedding_id(embedding_model, backend)
+    load = (lambda: RemoteEmbeddings(EMB_SERVER, model=eid)) if EMB_SERVER else (lambda: _model_embeddings(eid))
+    if not EMB_CACHE_ENABLED:
+        return load()
+    return CachedEmbeddings(load, EmbeddingCache(EMB_CACHE_DIR, eid))
+
+
+# ---- Toplu / çok süreçli embedding (indeks kurulumu için) ----
+
+# Her işçi süreç kendi model kopyasını tutar (spawn ile başlatılır, torch fork'a güvenli değil).
+_WORKER_EMBEDDINGS = None
+
+
+def _init_embed_worker(model_name: str, threads: int) -> None:
+    """Süreç havuzu başlatıcısı: işçinin modelini bir kez yükler, CPU iş parçacıklarını sınırlar."""
+    global _WORKER_EMBEDDINGS
+    if _split_embedding_id(model_name)[1] is None:
+        try:
+            import torch
+            torch.set_num_threads(max(1, threads))
+        except ImportError:
+            pass
+    _WORKER_EMBEDDINGS = _model_embeddings(model_name, threads=max(1, threads))
+
+
+def _embed_batch(texts: List[str]) -> List[List[float]]:
+    """İşçi süreçte tek bir batch'i gömer."""
+    return _WORKER_EMBEDDINGS.embed_documents(texts)
+
+
+class _EmbedPool:
+    """
+    Metinleri sabit boyutlu batch'lere bölerek gömer.
+    - workers <= 1: aynı süreçte, verilen embeddings nesnesiyle
+    - workers > 1: her biri kendi modelini tutan bir süreç havuzunda (sıra korunur)
+    - embeddings bir CachedEmbeddings ise önbellekte olanlar modele hiç gönderilmez
+    """
+    def __init__(self, embeddings, model_name: str, workers: int = 0, batch_size: int = BUILD_BATCH):
+        self.embeddings = embeddings
+        self.batch_size = max(1, batch_size)
+        self.workers = workers if workers > 1 else 0
+        self._pool: Optional[ProcessPoolExecutor] = None
+        if self.workers:
+            threads = max(1, (os.cpu_count() or 1) // self.workers)
+            if _split_embedding_id(model_name)[1] == "onnx":
+                from onnx_embeddings import ensure_exported
+                ensure_exported(_split_embedding_id(model_name)[0])  # işçiler aynı anda dışa aktarmasın
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_embed_worker,
+                initargs=(model_name, threads),
+            )
+
+    def __enter__(self) -> "_EmbedPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        if isinstance(self.embeddings, CachedEmbeddings):
+            return self.embeddings.embed_with(texts, self._compute)
+        return self._compute(texts)
+
+    def _compute(self, texts: List[str]) -> List[List[float]]:
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if self._pool is None:
+            inner = self.embeddings.inner if isinstance(self.embeddings, CachedEmbeddings) else self.embeddings
+            results = (inner.embed_documents(b) for b in batches)
+        else:
+            results = self._pool.map(_embed_batch, batches)
+        return [vec for vecs in results for vec in vecs]
+
+
+def _write_vectors(db: "Chroma", ids: List[str], docs: List[Document], vectors: List[List[float]]) -> None:
+    """Önceden hesaplanmış vektörleri Chroma koleksiyonuna toplu yazar (yeniden gömmeden)."""
+    for start in range(0, len(ids), WRITE_BATCH):
+        end = start + WRITE_BATCH
+        db._collection.upsert(
+            ids=ids[start:end],
+            embeddings=vectors[start:end],
+            documents=[d.page_content for d in docs[start:end]],
+            metadatas=[d.metadata for d in docs[start:end]],
+        )
+
+
+def _index_documents(
+    db: "Chroma",
+    items: List[Tuple[str, Document]],
+    pool: _EmbedPool,
+) -> float:
+    """(id, Document) çiftlerini gömüp indekse yazar; geçen süreyi (sn) döner."""
+    if not items:
+        return 0.0
+    t0 = time.perf_counter()
+    ids = [i for i, _ in items]
+    docs = [d for _, d in items]
+    vectors = pool.embed([d.page_content for d in docs])
+    _write_vectors(db, ids, docs, vectors)
+    return time.perf_counter() - t0
+
+
+# ---- BM25 ters indeksi (hibrit arama) ----
+
+def _lexical_current(persist_dir: str, source_sha: str) -> bool:
+    return BM25Index.source_of(str(Path(persist_dir) / LEXICAL_FILE)) == source_sha
+
+
+def _save_lexical(index: BM25Index, persist_dir: str) -> None:
+    t0 = time.perf_counter()
+    path = Path(persist_dir) / LEXICAL_FILE
+    index.save(str(path))
+    print(f"[BM25] Indexed {len(index)} docs ({len(index.terms)} terms) → {path} ({time.perf_counter() - t0:.1f}s)")
+
+
+def load_lexical_index(persist_dir: str = PERSIST_DIR) -> Optional[BM25Index]:
+    """
+    build_or_load_chroma'nın yanına yazdığı BM25 indeksi. Yoksa, hibrit arama kapalıysa ya da
+    manifestteki kaynakla eşleşmiyorsa (yarım kalmış eşitleme) None: arama yalnızca vektörle yapılır.
+    """
+    if not HYBRID_ENABLED:
+        return None
+    index = BM25Index.load(str(Path(persist_dir) / LEXICAL_FILE))
+    manifest = _read_manifest(persist_dir)
+    if index is None or manifest is None or index.source_sha256 != manifest.get("source_sha256"):
+        if index is not None:
+            print(f"[BM25] {persist_dir} içindeki BM25 indeksi güncel değil; yalnızca vektör araması kullanılacak.")
+        return None
+    return index
+
+
+@profiler.profiled("build_or_load_chroma")
 def build_or_load_chroma(
     json_path: str = JSON_PATH,
     persist_dir: str = PERSIST_DIR,
     embedding_model: str = EMB_MODEL,
-) -> Chroma:
+    workers: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+    embeddings: Optional[Embeddings] = None,
+) -> "Chroma":
     """
-    focus_tips.json'dan Chroma DB'yi kurar ya da var olanı yükler.
+    focus_tips.json'dan Chroma DB'yi kurar, var olanı yükler ya da JSON'daki
+    değişikliklere göre artımlı olarak günceller.
+
+    Senkronizasyon mantığı (persist_dir/focusia_manifest.json):
+    - Kaynak dosyanın hash'i ve embedding modeli manifestle aynıysa: doğrudan yükle.
+    - Aksi halde kayıtlar normalize edilir, her biri için içerik hash'i hesaplanır;
+      yalnızca yeni/değişen kayıtlar gömülür, JSON'dan çıkarılanlar indeksten silinir.
+    - Manifest yoksa (eski sürümle kurulmuş indeks) ya da model değiştiyse indeks
+      baştan kurulur; eski indeks sessizce servis edilmez.
+    - FOCUSIA_HYBRID açıksa BM25 indeksi (focusia_bm25.npz) aynı geçişte tüm kayıtlardan
+      yeniden yazılır; kaynak değişmemiş ve dosya güncelse dokunulmaz (load_lexical_index).
+    - İndeks değiştiğinde retrieval_cache.invalidate_index ile bu dizine ait önbellekli
+      arama sonuçları geçersizleşir.
+    - FOCUSIA_NEAR_DEDUP açıksa yakın kopyalar (MinHash/LSH, near_dedup.py) kümelenir; her
+      kümeden yalnızca ilk kayıt, kümedeki tüm başlıklarla ("topics") indekslenir. Ayar
+      değişirse kaynak aynı olsa da indeks yeniden eşitlenir.
 
     Parametreler:
-        json_path: JSON veri dosyası yolu (varsayılan: focus_tips.json)
+        json_path: JSON/JSONL veri dosyası yolu (varsayılan: focus_tips.json)
         persist_dir: Chroma indeksinin saklanacağı klasör (varsayılan: chroma_db)
                      # NOTE: HF Spaces kota sorunu yaşanıyorsa, (örn. 50GB limit)
                      # persist_dir'i ENV ile /tmp/chroma_db gibi geçici bir dizine
                      # yönlendirebilir: CHROMA_PERSIST_DIR=/tmp/chroma_db
-        embedding_model: sentence-transformers model adı
+        embedding_model: sentence-transformers model adı (arka uç FOCUSIA_EMB_BACKEND'den;
+                         "<model>#onnx-int8" biçiminde de verilebilir, bkz. embedding_id)
+        workers: embedding için süreç sayısı (varsayılan: FOCUSIA_BUILD_WORKERS, embedding sunucusu
+                 kullanılıyorsa 0; 0/1 = tek süreç)
+        batch_size: embedding batch boyutu (varsayılan: FOCUSIA_BUILD_BATCH)
+        chunk_size: akış halinde okurken bellekte biriktirilen en fazla belge
+                    (varsayılan: FOCUSIA_INGEST_CHUNK)
+        embeddings: hazır bir Embeddings nesnesi (örn. ağsız benchmark'lar); verilirse model
+                    yüklenmez, embedding_model yalnızca manifestteki ad olur ve gömme tek süreçte yapılır
 
     Döndürür:
         Chroma: Vektör veritabanı nesnesi (LangChain uyumlu)
@@ -77,49 +518,189 @@ def build_or_load_chroma(
     # Kalıcı dizini hazırla (yoksa oluştur)
     Path(persist_dir).mkdir(parents=True, exist_ok=True)
 
-    # Embedding modeli yükleniyor
-    embeddings = HuggingFaceEmbeddings(model_name=embedding_model)
+    # Embedding modeli (önbellek açıksa model ilk ihtiyaçta yüklenir); manifestte arka uç da yazılır
+    if embeddings is None:
+        embedding_model = embedding_id(embedding_model)
+        embeddings = make_embeddings(embedding_model)
+        if EMB_SERVER and workers is None:
+            workers = 0  # sunucu zaten batch'liyor; işçi süreçler kendi modelini yüklerdi
+    elif workers is None:
+        workers = 0  # işçi süreçler embedding_model'i yükler; dışarıdan verilen nesneyi kullanamaz
 
-    # Eğer indeks klasörü doluysa (daha önce oluşturulmuşsa), doğrudan yükle
-    has_index = any(Path(persist_dir).glob("*"))
-    if has_index:
-        print(f"[Chroma] Loaded existing index from: {persist_dir}")
-        return Chroma(persist_directory=persist_dir, embedding_function=embeddings)
+    manifest = _read_manifest(persist_dir)
+    if manifest is not None and manifest.get("embedding_model") != embedding_model:
+        print(
+            f"[Chroma] Embedding modeli değişmiş ({manifest.get('embedding_model')} → "
+            f"{embedding_model}); indeks yeniden kurulacak."
+        )
+        manifest = None
+    has_index = any(not p.name.startswith("focusia_") for p in Path(persist_dir).glob("*"))
+    if not has_index:
+        manifest = None  # manifest var ama indeks dosyaları silinmiş → baştan kur
 
-    # İlk kurulum: JSON'dan dokümanları oku
     json_file = Path(json_path)
     if not json_file.exists():
+        if has_index and manifest is not None:
+            # Kaynak yoksa eşitleme yapılamaz; son bilinen indeksi açıkça uyararak yükle.
+            print(f"[Chroma] UYARI: {json_path} bulunamadı; son eşitlenen indeks yükleniyor: {persist_dir}")
+            return _open_chroma(persist_dir, embeddings)
         raise FileNotFoundError(f"{json_path} bulunamadı.")
 
-    with json_file.open("r", encoding="utf-8") as f:
-        data = json.load(f)
+    # Kaynak değişmediyse JSON'u ayrıştırmaya bile gerek yok
+    source_sha = _file_sha256(json_file)
+    unchanged = manifest is not None and (
+        manifest.get("source_sha256") == source_sha and manifest.get("near_dedup", "off") == near_dedup_id()
+    )
+    if has_index and unchanged:
+        print(f"[Chroma] Loaded existing index from: {persist_dir}")
+        if HYBRID_ENABLED and not _lexical_current(persist_dir, source_sha):
+            items = iter_index_documents(json_path, plan=near_dedup_plan(json_path))
+            lexical = BM25Index.build(((k.hex(), d.page_content) for k, d in items), source_sha)
+            _save_lexical(lexical, persist_dir)
+            invalidate_index(persist_dir)
+        return _open_chroma(persist_dir, embeddings)
 
-    if not isinstance(data, list):
-        # Beklenen format: [{"topic": "...", "content": "..."}, ...]
-        raise ValueError(f"{json_path} formatı geçersiz: kök seviye bir liste bekleniyor.")
+    if has_index and manifest is None:
+        # Manifestsiz (eski) indeksin içeriğini doğrulayamayız → baştan kur.
+        print(f"[Chroma] Manifest bulunamadı; indeks yeniden kuruluyor: {persist_dir}")
+        _open_chroma(persist_dir, embeddings).delete_collection()
 
-    # Kayıtları normalize et + yinelenenleri ayıkla (aynı topic + içerik kombinasyonunu tekilleştir)
-    docs: List[Document] = []
-    seen = set()
-    for row in data:
-        doc = _normalize_record(row)
-        if not doc:
-            continue
-        key = (doc.metadata.get("topic", ""), doc.page_content.strip())
-        if key in seen:
-            continue
-        seen.add(key)
-        docs.append(doc)
+    # Eşitleme bitene kadar indeks "doğrulanmamış" sayılır: yarıda kesilirse bir
+    # sonraki açılışta manifest bulunamaz ve indeks sessizce servis edilmez.
+    old_keys = {bytes.fromhex(i) for i in manifest.get("ids", [])} if manifest is not None else set()
+    (Path(persist_dir) / MANIFEST_FILE).unlink(missing_ok=True)
 
-    if not docs:
+    plan = near_dedup_plan(json_path)
+    db = _open_chroma(persist_dir, embeddings)
+    seen: Set[bytes] = set()
+    kept: Set[bytes] = set()
+    added, embed_secs = 0, 0.0
+    pending: List[Tuple[str, Document]] = []
+    chunk = max(1, chunk_size or INGEST_CHUNK)
+    lexical = BM25Builder() if HYBRID_ENABLED else None
+    with _EmbedPool(
+        embeddings,
+        embedding_model,
+        workers=BUILD_WORKERS if workers is None else workers,
+        batch_size=batch_size or BUILD_BATCH,
+    ) as pool:
+        # Yalnızca yeni/değişen kayıtlar gömülür; bellekte en fazla `chunk` belge tutulur.
+        # BM25 indeksi aynı geçişte tüm kayıtlarla (değişmeyenler dahil) beslenir.
+        for key, doc in iter_index_documents(json_path, seen, plan):
+            kept.add(key)
+            if lexical is not None:
+                lexical.add(key.hex(), doc.page_content)
+            if key in old_keys:
+                continue
+            pending.append((key.hex(), doc))
+            if len(pending) >= chunk:
+                embed_secs += _index_documents(db, pending, pool)
+                added += len(pending)
+                pending = []
+        embed_secs += _index_documents(db, pending, pool)
+        added += len(pending)
+
+    if not seen:
         raise ValueError(f"{json_path} içinde geçerli kayıt bulunamadı.")
 
-    # Belge listesinden kalıcı Chroma indeksi oluştur
-    db = Chroma.from_documents(
-        documents=docs,
-        embedding=embeddings,
-        persist_directory=persist_dir,
+    to_delete = [k.hex() for k in old_keys - kept]
+    for start in range(0, len(to_delete), WRITE_BATCH):
+        db.delete(ids=to_delete[start:start + WRITE_BATCH])
+
+    if lexical is not None:
+        _save_lexical(lexical.build(source_sha), persist_dir)
+    _write_manifest(persist_dir, {
+        "version": MANIFEST_VERSION,
+        "embedding_model": embedding_model,
+        "source": str(json_path),
+        "source_sha256": source_sha,
+        "near_dedup": near_dedup_id(),
+        "near_duplicates": len(seen) - len(kept),
+        "updated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "ids": [k.hex() for k in kept],
+    })
+    invalidate_index(persist_dir)  # bu süreçteki önbellekli arama sonuçları eski indekse ait
+    if added:
+        print(
+            f"[Chroma] Embedded {added} docs in {embed_secs:.1f}s "
+            f"({added / max(embed_secs, 1e-9):.1f} docs/s, workers={pool.workers or 1}, batch={pool.batch_size})"
+        )
+    if isinstance(embeddings, CachedEmbeddings) and (embeddings.hits or embeddings.misses):
+        print(
+            f"[EmbCache] {embeddings.hits} hit / {embeddings.misses} miss "
+            f"({len(embeddings.cache)} vectors in {embeddings.cache.dir})"
+        )
+    print(
+        f"[Chroma] Synced index with {len(kept)} docs "
+        f"(+{added} / -{len(to_delete)} / ={len(kept) - added}) → {persist_dir}"
     )
-    print(f"[Chroma] Built new index with {len(docs)} docs → {persist_dir}")
     return db
 
+
+def build_numpy_index(
+    json_path: str = JSON_PATH,
+    embedding_model: str = EMB_MODEL,
+    dtype: str = "float32",
+    workers: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+    embeddings: Optional[Embeddings] = None,
+) -> NumpyVectorIndex:
+    """
+    JSON/JSONL kaynağından Chroma kullanmadan bellek içi bir NumpyVectorIndex kurar.
+    Vektörler embedding önbelleğinden gelir; önbellek sıcaksa kurulum modeli çağırmaz.
+    FOCUSIA_HYBRID açıksa index.lexical aynı satır sırasıyla kurulmuş BM25 indeksidir.
+
+    Parametreler:
+        dtype: matris tipi ("float32" ya da yarı bellek için "float16")
+        workers / batch_size / chunk_size / embeddings: build_or_load_chroma ile aynı anlamda
+    """
+    if not Path(json_path).exists():
+        raise FileNotFoundError(f"{json_path} bulunamadı.")
+
+    if embeddings is None:
+        embedding_model = embedding_id(embedding_model)
+        embeddings = make_embeddings(embedding_model)
+        if EMB_SERVER and workers is None:
+            workers = 0  # sunucu zaten batch'liyor; işçi süreçler kendi modelini yüklerdi
+    elif workers is None:
+        workers = 0
+    texts: List[str] = []
+    metadatas: List[Dict[str, Any]] = []
+    ids: List[str] = []
+    blocks: List[np.ndarray] = []
+    pending: List[Tuple[str, Document]] = []
+    chunk = max(1, chunk_size or INGEST_CHUNK)
+    t0 = time.perf_counter()
+
+    with _EmbedPool(
+        embeddings,
+        embedding_model,
+        workers=BUILD_WORKERS if workers is None else workers,
+        batch_size=batch_size or BUILD_BATCH,
+    ) as pool:
+        def flush() -> None:
+            if not pending:
+                return
+            vecs = pool.embed([d.page_content for _, d in pending])
+            blocks.append(np.asarray(vecs, dtype=np.float32).astype(dtype))
+            for doc_id, doc in pending:
+                ids.append(doc_id)
+                texts.append(doc.page_content)
+                metadatas.append(doc.metadata)
+            pending.clear()
+
+        for key, doc in iter_index_documents(json_path, plan=near_dedup_plan(json_path)):
+            pending.append((key.hex(), doc))
+            if len(pending) >= chunk:
+                flush()
+        flush()
+
+    if not texts:
+        raise ValueError(f"{json_path} içinde geçerli kayıt bulunamadı.")
+
+    index = NumpyVectorIndex(np.concatenate(blocks), texts, metadatas, ids, embedding=embeddings, dtype=dtype)
+    if HYBRID_ENABLED:
+        index.lexical = BM25Index.build(zip(ids, texts))
+    print(f"[NumPy] Built in-memory index with {len(index)} docs ({dtype}) in {time.perf_counter() - t0:.1f}s")
+    return index
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""
+embedding_cache.py
+------------------
+Kalıcı embedding önbelleği: (embedding model adı, metnin sha256'sı) → vektör.
+
+- Her model için ayrı bir klasör: emb_cache/<model>/
+    vectors.f32 : art arda eklenen float32 vektörler (np.memmap ile sıfır kopya okunur)
+    keys.idx    : her satır için metnin 16 baytlık sha256 özeti (vectors.f32 ile aynı sırada)
+    meta.json   : model adı ve vektör boyutu
+- Dosyalar yalnızca sona eklenir; aynı makinedeki süreçler (Streamlit işçileri, indeks
+  kurulumu) dosya kilidiyle birbirinin eklediği vektörleri görür.
+- CachedEmbeddings, LangChain Embeddings arayüzünü sarmalar: önce önbelleğe bakar,
+  yalnızca eksik metinler için modeli çağırır. Model ilk eksikte yüklenir; önbellek
+  sıcaksa (örn. konteyner yeniden başladıktan sonra) indeks kurulumu modeli hiç yüklemez.
+
+Kullanım:
+    from embedding_cache import CachedEmbeddings, EmbeddingCache
+    emb = CachedEmbeddings(lambda: HuggingFaceEmbeddings(model_name=m), EmbeddingCache("emb_cache", m))
+
+Not: HF Spaces'te /tmp konteyner yeniden başlayınca silinir; önbelleği kalıcı bir dizine
+(örn. /data/emb_cache) yönlendirmek için FOCUSIA_EMB_CACHE_DIR kullanılabilir.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:  # POSIX dosya kilidi (Windows'ta süreçler arası kilit yok, süreç içi kilit yeterli)
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+EMB_CACHE_DIR = os.getenv("FOCUSIA_EMB_CACHE_DIR", "emb_cache")  # önbellek kök klasörü
+KEY_BYTES = 16
+
+
+def text_key(text: str) -> bytes:
+    """Metnin önbellek anahtarı: sha256 özetinin ilk 16 baytı."""
+    return hashlib.sha256(text.encode("utf-8")).digest()[:KEY_BYTES]
+
+
+def _safe_dirname(model_name: str) -> str:
+    """Model adını dosya sistemine uygun, çakışmasız bir klasör adına çevirir."""
+    slug = re.sub(r"[^A-Za-z0-9._-]+", "_", model_name).strip("_")[:80]
+    return f"{slug}-{hashlib.sha1(model_name.encode('utf-8')).hexdigest()[:8]}"
+
+
+class EmbeddingCache:
+    """
+    Tek bir embedding modeline ait, diske kalıcı vektör önbelleği.
+    - get_many: anahtar listesi → vektör (yoksa None)
+    - put_many: yeni vektörleri dosyaların sonuna ekler
+    """
+    def __init__(self, cache_dir: str, model_name: str):
+        self.model_name = model_name
+        self.dir = Path(cache_dir) / _safe_dirname(model_name)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._vec_path = self.dir / "vectors.f32"
+        self._key_path = self.dir / "keys.idx"
+        self._meta_path = self.dir / "meta.json"
+        self._lock = threading.Lock()
+        self._rows: Dict[bytes, int] = {}
+        self._nrows = 0  # diskteki geçerli satır sayısı
+        self._dim: Optional[int] = None
+        self._mm: Optional[np.memmap] = None
+        with self._lock, self._file_lock():
+            self._refresh()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    # ---- dosya erişimi ----
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """Süreçler arası kilit (ekleme ve ilk okuma için)."""
+        with (self.dir / ".lock").open("a") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _refresh(self) -> None:
+        """Diskte bizden sonra (başka süreçlerce) eklenen satırları indeks sözlüğüne alır."""
+        if self._dim is None and self._meta_path.exists():
+            with self._meta_path.open("r", encoding="utf-8") as f:
+                self._dim = int(json.load(f)["dim"])
+        if self._dim is None or not self._key_path.exists():
+            return
+
+        # Yalnızca tam yazılmış satırlar geçerli (anahtar ve vektörü birlikte diskte olanlar)
+        vec_rows = self._vec_path.stat().st_size // (self._dim * 4) if self._vec_path.exists() else 0
+        key_rows = self._key_path.stat().st_size // KEY_BYTES
+        total = min(vec_rows, key_rows)
+        start = self._nrows
+        if total <= start:
+            return
+        with self._key_path.open("rb") as f:
+            f.seek(start * KEY_BYTES)
+            blob = f.read((total - start) * KEY_BYTES)
+        for i in range(total - start):
+            self._rows.setdefault(blob[i * KEY_BYTES:(i + 1) * KEY_BYTES], start + i)
+        self._nrows = total
+        self._mm = None  # yeni satırlar için bir sonraki okumada yeniden eşle
+
+    def _matrix(self) -> np.memmap:
+        """vectors.f32'nin salt-okunur bellek eşlemesi (gerekirse yeniden açılır)."""
+        if self._mm is None or self._mm.shape[0] < self._nrows:
+            self._mm = np.memmap(self._vec_path, dtype=np.float32, mode="r", shape=(self._nrows, self._dim))
+        return self._mm
+
+    # ---- genel arayüz ----
+
+    def get_many(self, keys: Sequence[bytes]) -> List[Optional[List[float]]]:
+        with self._lock:
+            if any(k not in self._rows for k in keys):
+                self._refresh()  # başka bir süreç eklemiş olabilir
+            if not self._rows:
+                return [None] * len(keys)
+            mm = self._matrix()
+            out: List[Optional[List[float]]] = []
+            for k in keys:
+                row = self._rows.get(k)
+                out.append(mm[row].tolist() if row is not None else None)
+            return out
+
+    def put_many(self, keys: Sequence[bytes], vectors: Sequence[Sequence[float]]) -> None:
+        if not keys:
+            return
+        arr = np.asarray(vectors, dtype=np.float32)
+        if arr.ndim != 2 or arr.shape[0] != len(keys):
+            raise ValueError("Önbelleğe yazılacak vektörlerin şekli anahtar sayısıyla uyuşmuyor.")
+        with self._lock, self._file_lock():
+            self._refresh()
+            if self._dim is None:
+                self._dim = int(arr.shape[1])
+                with self._meta_path.open("w", encoding="utf-8") as f:
+                    json.dump({"model": self.model_name, "dim": self._dim}, f)
+            elif arr.shape[1] != self._dim:
+                raise ValueError(
+                    f"Embedding boyutu önbellekle uyuşmuyor ({arr.shape[1]} != {self._dim}): {self.dir}"
+                )
+
+            # Aynı çağrıdaki tekrarları ve zaten var olanları ele
+            fresh: Dict[bytes, int] = {}
+            for i, k in enumerate(keys):
+                if k not in self._rows and k not in fresh:
+                    fresh[k] = i
+            if not fresh:
+                return
+
+            # Önce vektörler, sonra anahtarlar: yarım kalan yazımda anahtarsız vektör
+            # zararsızdır (okurken min(satır) alınır), vektörsüz anahtar oluşmaz.
+            start = self._nrows
+            with self._vec_path.open("r+b" if self._vec_path.exists() else "wb") as f:
+                f.truncate(start * self._dim * 4)  # önceki yarım yazımları temizle
+                f.seek(0, os.SEEK_END)
+                f.write(np.ascontiguousarray(arr[list(fresh.values())]).tobytes())
+            with self._key_path.open("r+b" if self._key_path.exists() else "wb") as f:
+                f.truncate(start * KEY_BYTES)
+                f.seek(0, os.SEEK_END)
+                f.write(b"".join(fresh.keys()))
+            for offset, k in enumerate(fresh):
+                self._rows[k] = start + offset
+            self._nrows = start + len(fresh)
+            self._mm = None
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    LangChain Embeddings sarmalayıcısı: vektörleri önce EmbeddingCache'te arar.
+    - inner: Embeddings nesnesi ya da onu üreten parametresiz fonksiyon (ilk eksikte çağrılır)
+    - symmetric: sorgu ve belge vektörleri aynıysa (all-MiniLM gibi) sorgular da önbellekte
+      aranır. Kullanıcı sorguları diske yazılmaz (sınırsız büyüme ve gizlilik için).
+    """
+    def __init__(
+        self,
+        inner: Union[Embeddings, Callable[[], Embeddings]],
+        cache: EmbeddingCache,
+        symmetric: bool = True,
+    ):
+        self._inner = inner if isinstance(inner, Embeddings) else None
+        self._factory = None if isinstance(inner, Embeddings) else inner
+        self._inner_lock = threading.Lock()
+        self.cache = cache
+        self.symmetric = symmetric
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def inner(self) -> Embeddings:
+        """Asıl embedding modeli (gerektiğinde yüklenir)."""
+        if self._inner is None:
+            with self._inner_lock:
+                if self._inner is None:
+                    self._inner = self._factory()
+        return self._inner
+
+    def embed_with(
+        self,
+        texts: List[str],
+        compute: Callable[[List[str]], List[List[float]]],
+    ) -> List[List[float]]:
+        """Önbellekte olmayan metinleri `compute` ile gömer, sonuçları önbelleğe ekler."""
+        keys = [text_key(t) for t in texts]
+        found = self.cache.get_many(keys)
+        missing = [i for i, v in enumerate(found) if v is None]
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            computed = compute([texts[i] for i in missing])
+            self.cache.put_many([keys[i] for i in missing], computed)
+            for i, vec in zip(missing, computed):
+                found[i] = list(vec)
+        return found
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_with(texts, self.inner.embed_documents)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Birçok sorguyu tek batch'te gömer (toplu değerlendirme için). Önbellekte olanlar
+        okunur; eksikler modelden tek çağrıyla alınır ve embed_query gibi diske yazılmaz.
+        """
+        if not self.symmetric:
+            return [self.inner.embed_query(t) for t in texts]
+        found = self.cache.get_many([text_key(t) for t in texts])
+        missing = [i for i, v in enumerate(found) if v is None]
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            for i, vec in zip(missing, self.inner.embed_documents([texts[i] for i in missing])):
+                found[i] = list(vec)
+        return found
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.symmetric:
+            vec = self.cache.get_many([text_key(text)])[0]
+            if vec is not None:
+                self.hits += 1
+                return vec
+            self.misses += 1
+        return self.inner.embed_query(text)
@@ -0,0 +1,413 @@
+# -*- coding: utf-8 -*-
+"""
+embedding_server.py
+-------------------
+Tek bir embedding modelini tutan yerel sunucu + ona bağlanan LangChain Embeddings istemcisi.
+Her Streamlit/işçi süreci kendi model kopyasını yüklemek yerine bu sunucuya sorar:
+
+- Sunucu: localhost HTTP ya da Unix soketi. Eşzamanlı gelen istekler en fazla
+  FOCUSIA_EMB_SERVER_MAX_WAIT_MS bekletilip tek bir model çağrısında toplanır
+  (micro-batch, en fazla FOCUSIA_EMB_SERVER_MAX_BATCH metin); aynı metin bir kez gömülür.
+- İstemci (RemoteEmbeddings): FOCUSIA_EMB_SERVER verilmişse data_loader.make_embeddings
+  modeli yüklemek yerine bunu kullanır; build_or_load_chroma / build_numpy_index ve sorgu
+  yolu değişmeden çalışır. Disk önbelleği (CachedEmbeddings) istemci tarafında kalır.
+- Sunucunun modeli embedding_id ile kimliklendirilir (örn. "<model>#onnx-int8"); istemci
+  farklı bir kimlik beklerse istek reddedilir (önbellek/indeks vektörleri karışmasın).
+
+Uç noktalar:
+    POST /embed   {"texts": [...], "model": "<embedding_id>"} → {"model", "dim", "vectors": base64 float32}
+    GET  /health  → model kimliği ve batch istatistikleri
+
+Kullanım:
+    python embedding_server.py --port 8765                      # FOCUSIA_EMB_SERVER=http://127.0.0.1:8765
+    python embedding_server.py --socket /tmp/focusia-emb.sock   # FOCUSIA_EMB_SERVER=unix:/tmp/focusia-emb.sock
+    emb = RemoteEmbeddings("http://127.0.0.1:8765")
+"""
+
+import argparse
+import base64
+import http.client
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+import metrics
+
+EMB_SERVER = os.getenv("FOCUSIA_EMB_SERVER", "")                                   # boş = süreç içi model
+EMB_SERVER_MAX_WAIT_MS = float(os.getenv("FOCUSIA_EMB_SERVER_MAX_WAIT_MS", "5"))   # batch toplama penceresi
+EMB_SERVER_MAX_BATCH = int(os.getenv("FOCUSIA_EMB_SERVER_MAX_BATCH", "64"))        # tek model çağrısında en fazla metin
+EMB_SERVER_TIMEOUT = float(os.getenv("FOCUSIA_EMB_SERVER_TIMEOUT", "60"))          # istemci istek zaman aşımı (sn)
+CLIENT_CHUNK = 256  # istemcinin tek istekte gönderdiği en fazla metin (kurulumdaki büyük listeler bölünür)
+
+_BATCH_TEXTS = metrics.histogram(
+    "focusia_emb_server_batch_texts",
+    "Embedding sunucusunda tek model çağrısına giren metin sayısı",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512),
+)
+_QUEUE_SECONDS = metrics.histogram(
+    "focusia_emb_server_queue_seconds",
+    "Embedding sunucusunda isteğin batch'e alınana kadar beklediği süre",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+
+class EmbeddingServerError(RuntimeError):
+    """Embedding sunucusuna ulaşılamadı ya da sunucu isteği reddetti."""
+
+
+# Sunucunun kapattığı kalıcı bağlantı (http.client.RemoteDisconnected da ConnectionResetError'dır)
+_STALE_CONNECTION_ERRORS = (ConnectionResetError, ConnectionRefusedError, BrokenPipeError)
+
+
+# ---- Micro-batch ----
+
+class _Job:
+    __slots__ = ("texts", "future", "t0")
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.future: "Future[np.ndarray]" = Future()
+        self.t0 = time.perf_counter()
+
+
+class MicroBatcher:
+    """
+    Eşzamanlı embed isteklerini tek bir arka plan thread'inde birleştirir.
+    İlk istek geldikten sonra en fazla max_wait_ms daha beklenir ya da max_batch metne
+    ulaşılınca hemen çalıştırılır; her istek kendi satırlarını geri alır.
+    """
+    def __init__(self, embeddings: Embeddings, max_batch: int = EMB_SERVER_MAX_BATCH,
+                 max_wait_ms: float = EMB_SERVER_MAX_WAIT_MS):
+        self.embeddings = embeddings
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: "queue.Queue[Optional[_Job]]" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.texts = 0
+        self.largest_batch = 0
+        self._thread = threading.Thread(target=self._loop, name="focusia-emb-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, texts: List[str]) -> "Future[np.ndarray]":
+        job = _Job(list(texts))
+        self._queue.put(job)
+        return job.future
+
+    def embed(self, texts: List[str], timeout: Optional[float] = None) -> np.ndarray:
+        return self.submit(texts).result(timeout)
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "requests": self.requests,
+                "batches": self.batches,
+                "texts": self.texts,
+                "mean_batch": round(self.texts / self.batches, 2) if self.batches else 0.0,
+                "largest_batch": self.largest_batch,
+            }
+
+    def _collect(self, first: _Job) -> Tuple[List[_Job], bool]:
+        """İlk işin ardından pencere dolana ya da batch büyüyene kadar gelenleri toplar."""
+        jobs, size = [first], len(first.texts)
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                job = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is None:
+                return jobs, True
+            jobs.append(job)
+            size += len(job.texts)
+        return jobs, False
+
+    def _loop(self) -> None:
+        stop = False
+        while not stop:
+            first = self._queue.get()
+            if first is None:
+                break
+            jobs, stop = self._collect(first)
+            self._run(jobs)
+
+    def _run(self, jobs: List[_Job]) -> None:
+        unique = list(dict.fromkeys(t for job in jobs for t in job.texts))  # aynı metin bir kez
+        now = time.perf_counter()
+        for job in jobs:
+            _QUEUE_SECONDS.observe(now - job.t0)
+        try:
+            vectors = np.asarray(self.embeddings.embed_documents(unique), dtype=np.float32) if unique else None
+        except BaseException as e:  # hata bu batch'teki her isteğe iletilir
+            for job in jobs:
+                job.future.set_exception(e)
+            return
+        _BATCH_TEXTS.observe(len(unique))
+        with self._stats_lock:
+            self.requests += len(jobs)
+            self.batches += 1
+            self.texts += len(unique)
+            self.largest_batch = max(self.largest_batch, len(unique))
+        row = {t: i for i, t in enumerate(unique)}
+        for job in jobs:
+            if vectors is None:
+                job.future.set_result(np.zeros((0, 0), dtype=np.float32))
+            else:
+                job.future.set_result(vectors[[row[t] for t in job.texts]])
+
+
+# ---- Sunucu ----
+
+def _encode(vectors: np.ndarray) -> str:
+    return base64.b64encode(np.ascontiguousarray(vectors, dtype="<f4").tobytes()).decode("ascii")
+
+
+def _decode(data: str, dim: int) -> np.ndarray:
+    flat = np.frombuffer(base64.b64decode(data), dtype="<f4")
+    return flat.reshape(-1, dim) if dim else flat.reshape(0, 0)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # istemci bağlantıyı yeniden kullanır
+
+    def setup(self) -> None:
+        # Başlık ve gövde ayrı yazılır; TCP'de Nagle küçük yanıtları ~40 ms geciktirir (Unix soketinde yok)
+        self.disable_nagle_algorithm = self.request.family != socket.AF_UNIX
+        super().setup()
+
+    def log_message(self, format: str, *args: Any) -> None:  # her isteği loglama
+        pass
+
+    def _json(self, status: int, obj: Any) -> None:
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:  # noqa: N802 (http.server API)
+        if self.path.split("?")[0] != "/health":
+            self._json(404, {"error": "not found"})
+            return
+        batcher: MicroBatcher = self.server.batcher  # type: ignore[attr-defined]
+        self._json(200, {"model": self.server.model_id, **batcher.stats()})  # type: ignore[attr-defined]
+
+    def do_POST(self) -> None:  # noqa: N802
+        if self.path.split("?")[0] != "/embed":
+            self._json(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            texts = payload["texts"]
+            if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+                raise ValueError("texts bir metin listesi olmalı")
+        except (ValueError, KeyError, TypeError) as e:
+            self._json(400, {"error": f"geçersiz istek: {e}"})
+            return
+        model_id = self.server.model_id  # type: ignore[attr-defined]
+        wanted = payload.get("model")
+        if wanted and wanted != model_id:
+            self._json(409, {"error": f"sunucu modeli {model_id}, istenen {wanted}", "model": model_id})
+            return
+        try:
+            vectors = self.server.batcher.embed(texts, timeout=EMB_SERVER_TIMEOUT)  # type: ignore[attr-defined]
+        except Exception as e:
+            self._json(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+        dim = int(vectors.shape[1]) if vectors.size else 0
+        self._json(200, {"model": model_id, "dim": dim, "vectors": _encode(vectors)})
+
+
+class _TCPServer(ThreadingHTTPServer):
+    request_queue_size = 128  # çok sayıda oturum aynı anda bağlandığında bağlantı reddedilmesin
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def serve(
+    embeddings: Embeddings,
+    address: str,
+    model_id: str = "",
+    max_batch: int = EMB_SERVER_MAX_BATCH,
+    max_wait_ms: float = EMB_SERVER_MAX_WAIT_MS,
+) -> socketserver.BaseServer:
+    """
+    Sunucuyu arka plan thread'inde başlatır ve döner (durdurmak için shutdown() + server_close()).
+    address: "http://127.0.0.1:<port>" (port 0 = boş bir port) ya da "unix:/yol/soket"
+    """
+    kind, target = _parse_address(address)
+    if kind == "unix":
+        if os.path.exists(target):
+            os.unlink(target)  # önceki çalışmadan kalan soket dosyası
+        server: socketserver.BaseServer = _UnixServer(target, _Handler)
+        where = f"unix:{target}"
+    else:
+        server = _TCPServer(target, _Handler)
+        where = f"http://{target[0]}:{server.server_address[1]}"
+    server.batcher = MicroBatcher(embeddings, max_batch, max_wait_ms)  # type: ignore[attr-defined]
+    server.model_id = model_id  # type: ignore[attr-defined]
+    server.url = where  # type: ignore[attr-defined]
+    threading.Thread(target=server.serve_forever, name="focusia-emb-server", daemon=True).start()
+    print(f"[EmbServer] Serving {model_id or 'embeddings'} on {where} (max_batch={max_batch}, max_wait={max_wait_ms:g}ms)")
+    return server
+
+
+# ---- İstemci ----
+
+def _parse_address(address: str) -> Tuple[str, Any]:
+    """"unix:/yol" → ("unix", "/yol"); "http://host:port" ya da "host:port" → ("tcp", (host, port))."""
+    if address.startswith("unix:"):
+        path = address[len("unix:"):]
+        return "unix", "/" + path.lstrip("/") if path.startswith("//") else path  # unix:///yol da olur
+    hostport = address.split("://", 1)[-1].rstrip("/")
+    host, _, port = hostport.rpartition(":")
+    if not host or not port.isdigit():
+        raise ValueError(f"Geçersiz embedding sunucu adresi: {address} (örn. http://127.0.0.1:8765 ya da unix:/tmp/focusia-emb.sock)")
+    return "tcp", (host, int(port))
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self._path = path
+
+    def connect(self) -> None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self._path)
+        self.sock = sock
+
+
+class RemoteEmbeddings(Embeddings):
+    """
+    embedding_server'a bağlanan Embeddings. Thread başına kalıcı bağlantı kullanır;
+    kopan bağlantı bir kez yeniden kurulur, zaman aşımı yeniden denenmez.
+    - model: beklenen embedding_id; sunucunun modeli farklıysa EmbeddingServerError
+    """
+    def __init__(self, address: str = EMB_SERVER, model: str = "", timeout: float = EMB_SERVER_TIMEOUT,
+                 chunk: int = CLIENT_CHUNK):
+        if not address:
+            raise ValueError("Embedding sunucu adresi boş (FOCUSIA_EMB_SERVER).")
+        self.address = address
+        self.model = model
+        self.timeout = timeout
+        self.chunk = max(1, chunk)
+        self._kind, self._target = _parse_address(address)
+        self._local = threading.local()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self._kind == "unix":
+                conn = _UnixHTTPConnection(self._target, self.timeout)
+            else:
+                conn = http.client.HTTPConnection(*self._target, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def _request(self, method: str, path: str, payload: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        for attempt in (0, 1):
+            conn = self._connection()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                resp = conn.getresponse()
+                data = json.loads(resp.read() or b"{}")
+                break
+            except TimeoutError as e:
+                # Sunucu işi hâlâ yürütüyor olabilir: yeniden göndermek beklemeyi ikiye katlar
+                conn.close()
+                self._local.conn = None
+                raise EmbeddingServerError(
+                    f"Embedding sunucusu {self.timeout:g} sn içinde yanıt vermedi ({self.address})."
+                ) from e
+            except (http.client.HTTPException, OSError) as e:
+                conn.close()
+                self._local.conn = None
+                # Yalnızca bayat keep-alive bağlantısı (sıfırlandı/reddedildi) bir kez yeniden denenir
+                if attempt or not isinstance(e, _STALE_CONNECTION_ERRORS):
+                    raise EmbeddingServerError(
+                        f"Embedding sunucusuna ulaşılamadı ({self.address}): {e}. "
+                        f"Sunucuyu başlatın: python embedding_server.py"
+                    ) from e
+        if resp.status != 200:
+            raise EmbeddingServerError(f"Embedding sunucusu {resp.status} döndü: {data.get('error', data)}")
+        return data
+
+    def health(self) -> Dict[str, Any]:
+        return self._request("GET", "/health")
+
+    def embed_array(self, texts: List[str]) -> np.ndarray:
+        blocks = []
+        for start in range(0, len(texts), self.chunk):
+            data = self._request("POST", "/embed", {"texts": texts[start:start + self.chunk], "model": self.model})
+            blocks.append(_decode(data["vectors"], int(data["dim"])))
+        return np.concatenate(blocks) if blocks else np.zeros((0, 0), dtype=np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_array(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        # all-MiniLM gibi simetrik modellerde sorgu ve belge vektörü aynıdır
+        return self.embed_array([text])[0].tolist()
+
+
+def main() -> None:
+    from data_loader import EMB_BACKENDS, EMB_MODEL, _model_embeddings, embedding_id
+
+    ap = argparse.ArgumentParser(description="Paylaşılan, micro-batch yapan yerel embedding sunucusu.")
+    ap.add_argument("--model", default=EMB_MODEL)
+    ap.add_argument("--backend", default=None, choices=EMB_BACKENDS, help="varsayılan: FOCUSIA_EMB_BACKEND")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--socket", default="", help="TCP yerine bu Unix soketini dinle")
+    ap.add_argument("--max-batch", type=int, default=EMB_SERVER_MAX_BATCH)
+    ap.add_argument("--max-wait-ms", type=float, default=EMB_SERVER_MAX_WAIT_MS)
+    args = ap.parse_args()
+
+    eid = embedding_id(args.model, args.backend)
+    t0 = time.perf_counter()
+    embeddings = _model_embeddings(eid)
+    embeddings.embed_documents(["ısınma"])  # tembel yüklenen parçalar ilk istekten önce
+    print(f"[EmbServer] Loaded {eid} in {time.perf_counter() - t0:.1f}s")
+
+    metrics.start_exporters()
+    address = f"unix:{args.socket}" if args.socket else f"http://{args.host}:{args.port}"
+    server = serve(embeddings, address, eid, args.max_batch, args.max_wait_ms)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
+        server.batcher.close()  # type: ignore[attr-defined]
+        if args.socket and os.path.exists(args.socket):
+            os.unlink(args.socket)
+
+
+if __name__ == "__main__":
+    main()
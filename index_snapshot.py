@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+index_snapshot.py
+-----------------
+Kurulmuş vektör indeksini tek, kompakt bir anlık görüntü (snapshot) dosyasına yazar ve
+uygulamanın bu dosyayı Chroma olmadan, sıfır kopya mmap ile açmasını sağlar.
+
+Dosya düzeni (little-endian, bölümler 64 bayta hizalı):
+    b"FOCUSIA\\x01" | uint32 başlık uzunluğu | başlık JSON'u | bölümler...
+    vectors      : (n, d) int8 (satır başı ölçekli) / float16 / float32
+    scales       : (n,) float32 — yalnızca int8'de; satır = vectors[i] * scales[i]
+    text_offsets : (n + 1,) uint64 — texts içindeki UTF-8 sınırları
+    texts        : page_content'lerin art arda UTF-8 baytları
+    id_offsets / ids : belge id'leri (aynı düzen)
+    meta_ids     : (n,) uint32 — başlıktaki "metadata" tablosuna (topic vb.) indeks
+
+Aynı makinedeki birden çok Streamlit işçisi aynı dosyayı mmap'lediğinde vektörler
+sayfa önbelleğinde tek kopya olarak paylaşılır. Dosya atomik olarak (os.replace) değiştirilir;
+açık olan eski görüntüler eski inode'u okumaya devam eder.
+
+Kullanım:
+    python index_snapshot.py --out focusia.snapshot                 # focus_tips.json → int8 snapshot
+    python index_snapshot.py --from-chroma chroma_db --out focusia.snapshot --quant float16
+
+    from index_snapshot import load_snapshot
+    index = load_snapshot("focusia.snapshot")   # NumpyVectorIndex ile aynı arayüz
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from vector_index import NumpyVectorIndex, SCORE_BLOCK
+
+MAGIC = b"FOCUSIA\x01"
+SNAPSHOT_VERSION = 1
+ALIGN = 64
+QUANT_TYPES = ("int8", "float16", "float32")
+
+
+def _align(n: int) -> int:
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def _blob(strings: List[str]) -> Tuple[np.ndarray, bytes]:
+    """String listesini (uint64 sınırlar, UTF-8 blob) ikilisine çevirir."""
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return offsets, b"".join(encoded)
+
+
+def _quantize(mat: np.ndarray, quant: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Normalize float32 matrisi istenen tipe çevirir (int8'de satır başı simetrik ölçek)."""
+    if quant == "float32":
+        return mat.astype(np.float32), None
+    if quant == "float16":
+        return mat.astype(np.float16), None
+    scales = np.abs(mat).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    q = np.clip(np.rint(mat / scales[:, None]), -127, 127).astype(np.int8)
+    return q, scales.astype(np.float32)
+
+
+def export_snapshot(
+    index: NumpyVectorIndex,
+    path: str,
+    quant: str = "int8",
+    embedding_model: str = "",
+) -> Path:
+    """
+    NumpyVectorIndex'i tek dosyaya yazar.
+    quant: "int8" (varsayılan, ~4x küçük), "float16" ya da "float32"
+    embedding_model: sorguları gömecek model kimliği (data_loader.embedding_id; yükleyici başlıktan okur)
+    """
+    if quant not in QUANT_TYPES:
+        raise ValueError(f"Desteklenmeyen quant: {quant} ({', '.join(QUANT_TYPES)})")
+
+    vectors, scales = _quantize(index._matrix.astype(np.float32), quant)
+    text_offsets, texts = _blob(index._texts)
+    id_offsets, ids = _blob([str(i) for i in index._ids])
+
+    # Metadata (topic vb.) tekrar ettiği için tablo + indeks olarak saklanır
+    table: Dict[str, int] = {}
+    meta_ids = np.empty(len(index), dtype=np.uint32)
+    for i, meta in enumerate(index._metadatas):
+        key = json.dumps(meta or {}, ensure_ascii=False, sort_keys=True)
+        meta_ids[i] = table.setdefault(key, len(table))
+
+    payloads: List[Tuple[str, bytes]] = [("vectors", vectors.tobytes())]
+    if scales is not None:
+        payloads.append(("scales", scales.tobytes()))
+    payloads += [
+        ("text_offsets", text_offsets.tobytes()),
+        ("texts", texts),
+        ("id_offsets", id_offsets.tobytes()),
+        ("ids", ids),
+        ("meta_ids", meta_ids.tobytes()),
+    ]
+
+    header: Dict[str, Any] = {
+        "version": SNAPSHOT_VERSION,
+        "n": len(index),
+        "dim": int(vectors.shape[1]),
+        "quant": quant,
+        "embedding_model": embedding_model,
+        "metadata": [json.loads(k) for k in table],
+        "sections": {},
+    }
+    # Başlık uzunluğu bölüm ofsetlerine bağlı; sabitlenene kadar yeniden hesapla
+    header_len = 0
+    while True:
+        offset = _align(len(MAGIC) + 4 + header_len)
+        for name, data in payloads:
+            header["sections"][name] = [offset, len(data)]
+            offset = _align(offset + len(data))
+        raw = json.dumps(header, ensure_ascii=False).encode("utf-8")
+        if len(raw) == header_len:
+            break
+        header_len = len(raw)
+
+    out = Path(path)
+    tmp = out.with_name(out.name + ".tmp")
+    with tmp.open("wb") as f:
+        f.write(MAGIC + struct.pack("<I", len(raw)) + raw)
+        for name, data in payloads:
+            f.seek(header["sections"][name][0])
+            f.write(data)
+        f.truncate(_align(f.tell()))
+    os.replace(tmp, out)
+    print(f"[Snapshot] Wrote {len(index)} docs ({quant}, {out.stat().st_size / 1e6:.1f} MB) → {out}")
+    return out
+
+
+class SnapshotIndex(NumpyVectorIndex):
+    """
+    mmap ile açılmış snapshot üzerinde NumpyVectorIndex arayüzü.
+    Vektörler, metinler ve id'ler dosyadan sıfır kopya okunur; Document'ler istek anında kurulur.
+    """
+    def __init__(self, path: str, embedding: Any = None):
+        self.path = str(path)
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} bir Focusia snapshot dosyası değil.")
+        (header_len,) = struct.unpack_from("<I", self._mm, len(MAGIC))
+        start = len(MAGIC) + 4
+        self.header: Dict[str, Any] = json.loads(self._mm[start:start + header_len].decode("utf-8"))
+        if self.header.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"{path}: desteklenmeyen snapshot sürümü {self.header.get('version')}")
+
+        n, dim, quant = self.header["n"], self.header["dim"], self.header["quant"]
+        self._matrix = self._section("vectors", np.dtype(quant), n * dim).reshape(n, dim)
+        self._scales = self._section("scales", np.float32, n) if quant == "int8" else None
+        self._text_offsets = self._section("text_offsets", np.uint64, n + 1)
+        self._id_offsets = self._section("id_offsets", np.uint64, n + 1)
+        self._meta_ids = self._section("meta_ids", np.uint32, n)
+        self._meta_table: List[Dict[str, Any]] = self.header.get("metadata", [])
+        self._embedding = embedding
+
+    def _section(self, name: str, dtype: Any, count: int) -> np.ndarray:
+        offset, _ = self.header["sections"][name]
+        return np.frombuffer(self._mm, dtype=dtype, count=count, offset=offset)
+
+    def _string(self, section: str, offsets: np.ndarray, i: int) -> str:
+        base = self.header["sections"][section][0]
+        return self._mm[base + int(offsets[i]):base + int(offsets[i + 1])].decode("utf-8")
+
+    @property
+    def embedding_model(self) -> str:
+        return self.header.get("embedding_model", "")
+
+    @property
+    def _texts(self) -> List[str]:  # export_snapshot/yeniden dışa aktarım için
+        return [self._string("texts", self._text_offsets, i) for i in range(len(self))]
+
+    @property
+    def _ids(self) -> List[str]:
+        return [self._string("ids", self._id_offsets, i) for i in range(len(self))]
+
+    @property
+    def _metadatas(self) -> List[Dict[str, Any]]:
+        return [self._meta_table[m] for m in self._meta_ids]
+
+    def _scores(self, query: np.ndarray) -> np.ndarray:
+        if self._scales is None:
+            return super()._scores(query)
+        out = np.empty(self._matrix.shape[0], dtype=np.float32)
+        for start in range(0, self._matrix.shape[0], SCORE_BLOCK):
+            end = start + SCORE_BLOCK
+            out[start:end] = (self._matrix[start:end].astype(np.float32) @ query) * self._scales[start:end]
+        return out
+
+    def _rows(self, idx: np.ndarray) -> np.ndarray:
+        rows = self._matrix[idx].astype(np.float32)
+        if self._scales is not None:
+            rows *= self._scales[idx][:, None]
+        return rows
+
+    def _doc(self, i: int) -> Document:
+        meta = dict(self._meta_table[int(self._meta_ids[i])])
+        return Document(page_content=self._string("texts", self._text_offsets, i), metadata=meta)
+
+
+def load_snapshot(path: str, embedding: Any = None) -> SnapshotIndex:
+    """
+    Snapshot'ı açar. embedding verilmezse başlıktaki model kimliğiyle data_loader.make_embeddings
+    kullanılır (embedding önbelleği dahil; Chroma'ya dokunulmaz). Etiketsiz eski başlıklar
+    torch vektörleridir; sorgular da aynı arka uçla gömülür.
+    """
+    index = SnapshotIndex(path)
+    if embedding is None:
+        from data_loader import make_embeddings
+        embedding = make_embeddings(index.embedding_model, backend="torch") if index.embedding_model else make_embeddings()
+    index._embedding = embedding
+    print(f"[Snapshot] Mapped {len(index)} docs ({index.header['quant']}) from: {path}")
+    return index
+
+
+def main() -> None:
+    from data_loader import EMB_MODEL, JSON_PATH, build_numpy_index, build_or_load_chroma, embedding_id
+
+    ap = argparse.ArgumentParser(description="Vektör indeksini tek dosyalık mmap snapshot'a aktarır.")
+    ap.add_argument("--json", default=JSON_PATH, help="kaynak JSON/JSONL (varsayılan: focus_tips.json)")
+    ap.add_argument("--from-chroma", default="", help="vektörleri bu Chroma dizininden al (yeniden gömme yok)")
+    ap.add_argument("--embedding-model", default=EMB_MODEL)
+    ap.add_argument("--quant", default="int8", choices=QUANT_TYPES)
+    ap.add_argument("--out", default=os.getenv("FOCUSIA_INDEX_SNAPSHOT", "focusia.snapshot"))
+    args = ap.parse_args()
+
+    if args.from_chroma:
+        db = build_or_load_chroma(args.json, args.from_chroma, args.embedding_model)
+        index = NumpyVectorIndex.from_chroma(db)
+    else:
+        index = build_numpy_index(args.json, args.embedding_model)
+    export_snapshot(index, args.out, quant=args.quant, embedding_model=embedding_id(args.embedding_model))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+"""
+lexical_index.py
+----------------
+Türkçe'ye duyarlı BM25 ters indeksi ve vektör aramayla birleştiren hibrit retriever.
+"Pomodoro", "bildirim", "telefon" gibi güçlü kelime ipuçları olan sorgularda kelime
+indeksi, yoğun (dense) aramanın kaçırabileceği belgeleri aday kümesine sokar.
+
+- Tokenizasyon: Türkçe büyük/küçük harf (İ→i, I→ı), küçük durak kelime listesi ve hafif
+  ek atma (çoğul, hal, iyelik, şimdiki zaman ve mastar ekleri; kök en az 3 harf kalır):
+  "Bildirimleri" → "bildirim", "telefona" → "telefon", "ISINMA" → "ısınma",
+  "moladan" → "mola" (aynı kurallar hem belgeye hem sorguya uygulanır)
+- BM25Index: CSR biçiminde posting listeleri (terim → belge satırları + önceden hesaplanmış
+  BM25 ağırlıkları). Sorgu maliyeti korpus boyutuna değil, sorgu terimlerinin posting
+  uzunluğuna bağlıdır; milyonlarca belgede de tüm korpusu taramaz. .npz olarak saklanır.
+- HybridRetriever: BM25 ilk fetch_k + vektör ilk fetch_k → Reciprocal Rank Fusion
+  (1/(rrf_k + sıra)) → birleşik ilk fetch_k aday → MMR (alaka terimi RRF skoru, çeşitlilik
+  terimi vektör benzerliği). Seçilen belgelerin metadata["score"] alanı RRF skorudur
+  (context_packer sıralamada kullanır). Chroma ve NumpyVectorIndex ile çalışır.
+- lexical_first=True: BM25 en az fetch_k aday bulduysa vektör araması tüm korpusta değil,
+  yalnızca bu adaylar üzerinde yapılır (çok büyük korpuslarda gecikmeyi sabit tutar).
+
+Hibrit arama isteğe bağlıdır (FOCUSIA_HYBRID=1): tam hibrit, vektör aramasının üstüne BM25 + RRF
+maliyeti ekler (20k belgede p50 ~+0.5 ms). lexical_first bunu geri kazanır ama anlamca yakın,
+kelime ortağı olmayan belgeleri aday dışı bırakabilir; bu yüzden o da ayrıca açılır.
+
+Kullanım:
+    from data_loader import build_or_load_chroma, load_lexical_index
+    db = build_or_load_chroma()
+    retriever = make_retriever(db, load_lexical_index(), "mmr", {"k": 5, "fetch_k": 20, "lambda_mult": 0.7})
+"""
+
+import os
+import re
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from vector_index import _normalize, mmr_select
+
+HYBRID_ENABLED = os.getenv("FOCUSIA_HYBRID", "0") == "1"                        # 1: BM25 + vektör (varsayılan: yalnızca vektör)
+HYBRID_RRF_K = int(os.getenv("FOCUSIA_HYBRID_RRF_K", "60"))                      # RRF sabiti
+HYBRID_LEXICAL_FIRST = os.getenv("FOCUSIA_HYBRID_LEXICAL_FIRST", "0") == "1"     # 1: yeterli BM25 adayı varsa tüm korpusta vektör araması yapma
+BM25_K1 = 1.2
+BM25_B = 0.75
+LEXICAL_VERSION = 1
+
+# ---- Türkçe tokenizasyon ----
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+STOPWORDS = frozenset(
+    "ve ile veya ya da de ki bir bu şu o ben sen biz siz onlar için gibi kadar daha çok en "
+    "ama fakat ancak ise mi mı mu mü ne neden nasıl her hiç şey sonra önce diye olarak olan "
+    "var yok bile hem değil sadece yani çünkü eğer zaten".split()
+)
+
+# Uzundan kısaya denenir; ek atıldıktan sonra kök en az MIN_STEM harf kalmalı. Kökle karışan
+# kısa ekler (-la, -ma, -ım...) bilinçli olarak yok: "uygula", "ısınma", "bildirim" bozulmasın.
+SUFFIXES = sorted(
+    (
+        # fiil: şimdiki zaman + kişi, mastar
+        "ıyorum iyorum uyorum üyorum ıyorsun iyorsun uyorsun üyorsun ıyoruz iyoruz uyoruz üyoruz "
+        "ıyor iyor uyor üyor makta mekte mak mek "
+        # çoğul, iyelik, hal
+        "ların lerin ları leri lar ler "
+        "ımız imiz umuz ümüz ınız iniz unuz ünüz "
+        "nın nin nun nün ın in un ün "
+        "dan den tan ten da de ta te "
+        "yla yle sı si su sü yı yi yu yü ya ye "
+        "ı i u ü a e"
+    ).split(),
+    key=len,
+    reverse=True,
+)
+SUFFIX_SET = frozenset(SUFFIXES)
+SUFFIX_LENGTHS = sorted({len(s) for s in SUFFIXES}, reverse=True)
+MIN_STEM = 3
+MIN_STEM_VOWEL = 6   # tek ünlü ekler (-a, -ı...) yalnızca uzun köklerden atılır: "telefona" → "telefon", "dakika" kalır
+MAX_STRIPS = 3
+
+
+def turkish_lower(text: str) -> str:
+    """Türkçe küçük harf: İ→i, I→ı (str.lower() I'yı i'ye, İ'yi 'i̇'ye çevirir)."""
+    return text.replace("İ", "i").replace("I", "ı").lower().replace("i̇", "i")
+
+
+@lru_cache(maxsize=1 << 16)
+def stem(word: str) -> str:
+    """Hafif ek atma: en fazla MAX_STRIPS ek (en uzun eşleşen önce), kök en az MIN_STEM harf."""
+    for _ in range(MAX_STRIPS):
+        for n in SUFFIX_LENGTHS:
+            if word[-n:] in SUFFIX_SET and len(word) - n >= (MIN_STEM_VOWEL if n == 1 else MIN_STEM):
+                word = word[:-n]
+                break
+        else:
+            break
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Metin → kök listesi (durak kelimeler ve tek harfler atılır, rakamlar korunur)."""
+    out = []
+    for w in _WORD_RE.findall(turkish_lower(text)):
+        if w in STOPWORDS or (len(w) < 2 and not w.isdigit()):
+            continue
+        out.append(stem(w) if not w.isdigit() else w)
+    return out
+
+
+# ---- BM25 ----
+
+class BM25Builder:
+    """
+    Belgeleri akış halinde ekleyip BM25Index üretir; metinler tutulmaz, yalnızca belge başına
+    terim sayıları (indeks kurulumundaki tek geçişte Chroma'ya yazılan belgelerle birlikte beslenir).
+    """
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1, self.b = k1, b
+        self._vocab: Dict[str, int] = {}
+        self._term_ids: List[np.ndarray] = []
+        self._tfs: List[np.ndarray] = []
+        self._lengths: List[int] = []
+        self._ids: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, doc_id: str, text: str) -> None:
+        counts = Counter(tokenize(text))
+        vocab = self._vocab
+        self._term_ids.append(np.fromiter((vocab.setdefault(t, len(vocab)) for t in counts), dtype=np.int32, count=len(counts)))
+        self._tfs.append(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+        self._lengths.append(sum(counts.values()))
+        self._ids.append(doc_id)
+
+    def build(self, source_sha256: str = "") -> "BM25Index":
+        k1, b, vocab = self.k1, self.b, self._vocab
+        n = len(self._ids)
+        doc_len = np.asarray(self._lengths, dtype=np.float32)
+        avgdl = float(doc_len.mean()) if n and doc_len.mean() > 0 else 1.0
+        tid = np.concatenate(self._term_ids) if self._term_ids else np.zeros(0, dtype=np.int32)
+        tf = np.concatenate(self._tfs) if self._tfs else np.zeros(0, dtype=np.float32)
+        row = np.repeat(np.arange(n, dtype=np.int32), [len(t) for t in self._term_ids]) if n else np.zeros(0, dtype=np.int32)
+
+        # Terimleri alfabetik sıraya koy, posting'leri terime göre grupla
+        terms = np.array(sorted(vocab), dtype=str) if vocab else np.zeros(0, dtype=str)
+        remap = np.empty(len(vocab), dtype=np.int32)
+        for new, t in enumerate(terms.tolist()):
+            remap[vocab[t]] = new
+        tid = remap[tid] if len(tid) else tid
+        order = np.argsort(tid, kind="stable")
+        tid, tf, row = tid[order], tf[order], row[order]
+        counts = np.bincount(tid, minlength=len(terms))
+        ptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        ptr[1:] = np.cumsum(counts)
+        df = counts.astype(np.float32)
+
+        idf = np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        norm = k1 * (1.0 - b + b * doc_len[row] / avgdl)
+        weights = (idf[tid] * tf * (k1 + 1.0) / (tf + norm)).astype(np.float32)
+        return BM25Index(terms, ptr, row, weights, np.array(self._ids, dtype=str), source_sha256)
+
+
+class BM25Index:
+    """
+    Okuma amaçlı BM25 indeksi.
+    - terms:   sıralı terim dizisi; ptr[t]:ptr[t+1] aralığı terimin posting'leri
+    - docs:    posting'lerin belge satırları (int32)
+    - weights: posting başına BM25 ağırlığı idf · tf(k1+1) / (tf + k1(1 − b + b·|d|/avgdl))
+    - ids:     satır → belge kimliği (Chroma id'si; NumPy indeksinde satır sırası aynıdır)
+    """
+    def __init__(self, terms: np.ndarray, ptr: np.ndarray, docs: np.ndarray, weights: np.ndarray,
+                 ids: np.ndarray, source_sha256: str = ""):
+        self.terms = terms
+        self.ptr = ptr
+        self.docs = docs
+        self.weights = weights
+        self.ids = ids
+        self.source_sha256 = source_sha256
+        self._vocab: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, items: Iterable[Tuple[str, str]], source_sha256: str = "") -> "BM25Index":
+        """(belge kimliği, metin) çiftlerinden kurar."""
+        builder = BM25Builder()
+        for doc_id, text in items:
+            builder.add(doc_id, text)
+        return builder.build(source_sha256)
+
+    @property
+    def vocab(self) -> Dict[str, int]:
+        if self._vocab is None:
+            self._vocab = {t: i for i, t in enumerate(self.terms.tolist())}
+        return self._vocab
+
+    def search(self, query: str, k: int = 20) -> List[Tuple[int, float]]:
+        """(satır, BM25 skoru) çiftleri, skora göre azalan; eşleşme yoksa boş liste."""
+        tids = [self.vocab[t] for t in dict.fromkeys(tokenize(query)) if t in self.vocab]
+        if not tids or k <= 0:
+            return []
+        docs = np.concatenate([self.docs[self.ptr[t]:self.ptr[t + 1]] for t in tids])
+        weights = np.concatenate([self.weights[self.ptr[t]:self.ptr[t + 1]] for t in tids])
+        if len(docs) * 8 > len(self):  # posting'ler korpusa göre büyükse düz dizi daha ucuz
+            scores = np.bincount(docs, weights=weights, minlength=len(self)).astype(np.float32)
+            rows = np.flatnonzero(scores)
+            scores = scores[rows]
+        else:
+            rows, inverse = np.unique(docs, return_inverse=True)
+            scores = np.bincount(inverse, weights=weights).astype(np.float32)
+        if len(rows) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return [(int(rows[i]), float(scores[i])) for i in order]
+
+    # ---- kalıcılık ----
+
+    def save(self, path: str) -> None:
+        """Atomik yazar (yarım dosya okunmaz)."""
+        tmp = f"{path}.tmp.npz"
+        np.savez(
+            tmp,
+            version=np.int64(LEXICAL_VERSION),
+            terms=self.terms, ptr=self.ptr, docs=self.docs, weights=self.weights, ids=self.ids,
+            source_sha256=np.array(self.source_sha256),
+        )
+        os.replace(tmp, path)
+
+    @staticmethod
+    def source_of(path: str) -> Optional[str]:
+        """Dosyadaki kaynak hash'i (diziler okunmadan); dosya yoksa ya da sürüm farklıysa None."""
+        if not Path(path).exists():
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            return str(data["source_sha256"]) if int(data["version"]) == LEXICAL_VERSION else None
+
+    @classmethod
+    def load(cls, path: str) -> Optional["BM25Index"]:
+        """Dosya yoksa ya da sürüm farklıysa None."""
+        if not Path(path).exists():
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["version"]) != LEXICAL_VERSION:
+                return None
+            return cls(data["terms"], data["ptr"], data["docs"], data["weights"], data["ids"], str(data["source_sha256"]))
+
+
+# ---- Hibrit arama ----
+
+def rrf(rankings: Sequence[Sequence[Any]], k: int = HYBRID_RRF_K) -> List[Tuple[Any, float]]:
+    """Reciprocal Rank Fusion: her listede sırası r olan anahtara 1/(k + r) (r 1'den başlar)."""
+    fused: Dict[Any, float] = {}
+    for ranking in rankings:
+        for r, key in enumerate(ranking, start=1):
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + r)
+    return sorted(fused.items(), key=lambda kv: -kv[1])
+
+
+class _NumpyStore:
+    """NumpyVectorIndex: anahtar = satır (BM25 satırlarıyla aynı sıra)."""
+    def __init__(self, index: Any):
+        self.index = index
+
+    def lexical_key(self, lexical: BM25Index, row: int) -> Any:
+        return row
+
+    def dense(self, vec: Sequence[float], n: int) -> List[Any]:
+        return [i for i, _ in self.index.search_by_vector(vec, n)]
+
+    def fetch(self, keys: List[Any]) -> Tuple[List[Any], List[Document], np.ndarray]:
+        rows = np.asarray(keys, dtype=np.int64)
+        return list(keys), [self.index._doc(int(i)) for i in rows], self.index._rows(rows)
+
+
+class _ChromaStore:
+    """LangChain Chroma: anahtar = belge kimliği; adaylar tek collection.get ile alınır."""
+    def __init__(self, db: Any):
+        self.db = db
+
+    def lexical_key(self, lexical: BM25Index, row: int) -> Any:
+        return str(lexical.ids[row])
+
+    def dense(self, vec: Sequence[float], n: int) -> List[Any]:
+        res = self.db._collection.query(query_embeddings=[[float(x) for x in vec]], n_results=n, include=[])
+        return list(res["ids"][0])
+
+    def fetch(self, keys: List[Any]) -> Tuple[List[Any], List[Document], np.ndarray]:
+        """(bulunan anahtarlar, belgeler, vektörler); get() sırayı korumaz, silinmiş kimlikler atlanır."""
+        res = self.db._collection.get(ids=list(keys), include=["embeddings", "documents", "metadatas"])
+        pos = {i: j for j, i in enumerate(res["ids"])}
+        found = [k for k in keys if k in pos]
+        order = [pos[k] for k in found]
+        docs = [Document(page_content=res["documents"][j], metadata=dict(res["metadatas"][j] or {})) for j in order]
+        emb = np.asarray(res["embeddings"], dtype=np.float32)[order] if order else np.zeros((0, 0), dtype=np.float32)
+        return found, docs, emb
+
+
+class HybridRetriever:
+    """
+    BM25 + vektör araması (RRF) → MMR. VectorStoreRetriever ile aynı alanlar
+    (vectorstore, search_type, search_kwargs); _SimpleRAGAdapter sorguyu bir kez gömer ve
+    search_hybrid(q, vec) çağırır.
+    """
+    def __init__(
+        self,
+        vectorstore: Any,
+        lexical: BM25Index,
+        search_type: str = "mmr",
+        search_kwargs: Optional[Dict[str, Any]] = None,
+        rrf_k: int = HYBRID_RRF_K,
+        lexical_first: bool = HYBRID_LEXICAL_FIRST,
+    ):
+        if search_type not in ("similarity", "mmr"):
+            raise ValueError(f"Desteklenmeyen search_type: {search_type}")
+        self.vectorstore = vectorstore
+        self.lexical = lexical
+        self.search_type = search_type
+        self.search_kwargs = dict(search_kwargs or {})
+        self.rrf_k = rrf_k
+        self.lexical_first = lexical_first
+        self._store = _ChromaStore(vectorstore) if hasattr(vectorstore, "_collection") else _NumpyStore(vectorstore)
+        if isinstance(self._store, _NumpyStore) and len(lexical) != len(vectorstore):
+            raise ValueError("BM25 indeksi ile NumPy indeksinin satır sayıları farklı.")
+
+    def search_hybrid(self, query: str, vec: Sequence[float]) -> List[Document]:
+        kw = self.search_kwargs
+        k = kw.get("k", 4)
+        fetch_k = max(kw.get("fetch_k", 20), k)
+        q = _normalize(np.asarray(vec, dtype=np.float32))
+
+        lex = [self._store.lexical_key(self.lexical, row) for row, _ in self.lexical.search(query, fetch_k)]
+        if self.lexical_first and len(lex) >= fetch_k:
+            # Yoğun sıralama yalnızca BM25 adaylarında: tüm korpus taranmaz
+            lex, lex_docs, lex_emb = self._store.fetch(lex)
+            dense = [lex[i] for i in np.argsort(-(_normalize(lex_emb) @ q), kind="stable")]
+            fused = rrf([dense, lex], self.rrf_k)[:fetch_k]
+            pos = {key: i for i, key in enumerate(lex)}
+            docs = [lex_docs[pos[key]] for key, _ in fused]
+            emb = lex_emb[[pos[key] for key, _ in fused]]
+        else:
+            fused = rrf([self._store.dense(vec, fetch_k), lex], self.rrf_k)[:fetch_k]
+            if not fused:
+                return []
+            found, docs, emb = self._store.fetch([key for key, _ in fused])
+            if len(found) < len(fused):
+                present = set(found)
+                fused = [kv for kv in fused if kv[0] in present]
+        scores = np.asarray([s for _, s in fused], dtype=np.float32)
+        if self.search_type == "mmr" and len(docs) > 0:
+            # Alaka: RRF skoru (0-1 aralığına ölçeklenir); çeşitlilik: adayların vektör benzerliği
+            picked = sorted(mmr_select(scores / scores.max(), _normalize(emb), k, kw.get("lambda_mult", 0.5)))
+        else:
+            picked = list(range(min(k, len(docs))))
+        out = []
+        for j in picked:
+            doc = docs[j]
+            doc.metadata["score"] = round(float(scores[j]), 6)
+            out.append(doc)
+        return out
+
+    def get_relevant_documents(self, query: str) -> List[Document]:
+        return self.search_hybrid(query, self.vectorstore.embeddings.embed_query(query))
+
+    def invoke(self, input: Any, config: Any = None, **kwargs: Any) -> List[Document]:
+        q = input.get("query", "") if isinstance(input, dict) else input
+        return self.get_relevant_documents(q)
+
+
+def make_retriever(vectorstore: Any, lexical: Optional[BM25Index], search_type: str = "mmr",
+                   search_kwargs: Optional[Dict[str, Any]] = None) -> Any:
+    """Kelime indeksi varsa (ve FOCUSIA_HYBRID=1 ise) HybridRetriever, yoksa vectorstore.as_retriever."""
+    if lexical is not None and HYBRID_ENABLED and len(lexical):
+        return HybridRetriever(vectorstore, lexical, search_type, search_kwargs)
+    return vectorstore.as_retriever(search_type=search_type, search_kwargs=search_kwargs or {})
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+metrics.py
+----------
+Süreç içi, bağımlılıksız metrik kayıt defteri (Prometheus metin formatıyla uyumlu).
+
+- counter(name, help)            → Counter: .inc(value=1, **labels)
+- histogram(name, help, buckets) → Histogram: .observe(value, **labels)
+- render_prometheus()            → tüm metriklerin text exposition çıktısı
+- serve(port)                    → 127.0.0.1:<port>/metrics adresinde HTTP uç noktası
+- write_textfile(path)           → node_exporter textfile collector için atomik dosya
+- start_exporters()              → FOCUSIA_METRICS_PORT / FOCUSIA_METRICS_FILE ortam değişkenlerine göre
+
+Aynı isimle tekrar çağrıldığında var olan metrik döner; modüller metriklerini import
+sırasında tanımlayabilir. Tüm işlemler thread-safe'tir (Streamlit oturumları aynı süreçte).
+
+Kullanım:
+    import metrics
+    FALLBACKS = metrics.counter("focusia_llm_fallback_total", "text_generation'a düşüş sayısı")
+    FALLBACKS.inc(model="Qwen/Qwen2.5-7B-Instruct")
+"""
+
+import bisect
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple
+
+METRICS_PORT = int(os.getenv("FOCUSIA_METRICS_PORT", "0"))           # 0 = HTTP uç noktası kapalı
+METRICS_FILE = os.getenv("FOCUSIA_METRICS_FILE", "")                  # boş = dosyaya yazma kapalı
+METRICS_INTERVAL = float(os.getenv("FOCUSIA_METRICS_INTERVAL", "15"))  # dosya yazma aralığı (sn)
+
+# Saniye cinsinden gecikmeler için varsayılan kovalar (5 ms … 60 sn)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(key: LabelKey, extra: Sequence[Tuple[str, str]] = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _fmt_value(v: float) -> str:
+    return repr(float(v)) if v != int(v) else str(int(v))
+
+
+class Counter:
+    """Yalnızca artan sayaç."""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, value: float = 1.0, **labels: object) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + value
+
+    def value(self, **labels: object) -> float:
+        with self._lock:
+            return self._values.get(_label_key(labels), 0.0)
+
+    def _render(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_fmt_labels(k)} {_fmt_value(v)}" for k, v in sorted(self._values.items())]
+
+
+class Histogram:
+    """Kova sayıları + toplam + adet (Prometheus histogram)."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # labels → [kova sayıları..., +Inf], toplam
+        self._counts: Dict[LabelKey, List[int]] = {}
+        self._sums: Dict[LabelKey, float] = {}
+
+    def observe(self, value: float, **labels: object) -> None:
+        key = _label_key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            counts[idx] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def count(self, **labels: object) -> int:
+        with self._lock:
+            return sum(self._counts.get(_label_key(labels), []))
+
+    def _render(self) -> List[str]:
+        lines: List[str] = []
+        with self._lock:
+            for key in sorted(self._counts):
+                counts = self._counts[key]
+                running = 0
+                for bound, c in zip(self.buckets, counts):
+                    running += c
+                    lines.append(f"{self.name}_bucket{_fmt_labels(key, [('le', _fmt_value(bound))])} {running}")
+                running += counts[-1]
+                lines.append(f"{self.name}_bucket{_fmt_labels(key, [('le', '+Inf')])} {running}")
+                lines.append(f"{self.name}_sum{_fmt_labels(key)} {_fmt_value(self._sums[key])}")
+                lines.append(f"{self.name}_count{_fmt_labels(key)} {running}")
+        return lines
+
+
+_REGISTRY: Dict[str, object] = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def counter(name: str, help: str = "") -> Counter:
+    with _REGISTRY_LOCK:
+        metric = _REGISTRY.get(name)
+        if metric is None:
+            metric = _REGISTRY[name] = Counter(name, help)
+        return metric
+
+
+def histogram(name: str, help: str = "", buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    with _REGISTRY_LOCK:
+        metric = _REGISTRY.get(name)
+        if metric is None:
+            metric = _REGISTRY[name] = Histogram(name, help, buckets)
+        return metric
+
+
+def render_prometheus() -> str:
+    """Kayıtlı tüm metrikleri Prometheus text formatında döner."""
+    with _REGISTRY_LOCK:
+        metrics = list(_REGISTRY.values())
+    out: List[str] = []
+    for m in metrics:
+        out.append(f"# HELP {m.name} {m.help}")
+        out.append(f"# TYPE {m.name} {m.kind}")
+        out.extend(m._render())
+    return "\n".join(out) + "\n"
+
+
+# ---- Dışa aktarım ----
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:  # noqa: N802 (http.server API)
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: object) -> None:  # her scrape'i loglama
+        pass
+
+
+def serve(port: int, addr: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """/metrics uç noktasını arka plan thread'inde başlatır (varsayılan yalnızca yerel erişim)."""
+    server = ThreadingHTTPServer((addr, port), _Handler)
+    threading.Thread(target=server.serve_forever, name="focusia-metrics", daemon=True).start()
+    print(f"[Metrics] Serving Prometheus metrics on http://{addr}:{server.server_address[1]}/metrics")
+    return server
+
+
+def write_textfile(path: str) -> None:
+    """Metrikleri dosyaya atomik yazar (okuyucu yarım dosya görmez)."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(render_prometheus())
+    os.replace(tmp, path)
+
+
+def _write_periodically(path: str, interval: float) -> None:
+    while True:
+        time.sleep(interval)
+        try:
+            write_textfile(path)
+        except OSError as e:
+            print(f"[Metrics] {path} yazılamadı: {e}")
+
+
+_STARTED = False
+
+
+def start_exporters(port: Optional[int] = None, path: Optional[str] = None, interval: Optional[float] = None) -> None:
+    """
+    Ortam değişkenlerine (ya da verilen değerlere) göre dışa aktarımı bir kez başlatır.
+    Aynı süreçte tekrar çağrılması zararsızdır (Streamlit yeniden çalıştırmaları).
+    """
+    global _STARTED
+    with _REGISTRY_LOCK:
+        if _STARTED:
+            return
+        _STARTED = True
+    port = METRICS_PORT if port is None else port
+    path = METRICS_FILE if path is None else path
+    interval = METRICS_INTERVAL if interval is None else interval
+    if port:
+        try:
+            serve(port)
+        except OSError as e:  # aynı makinede başka bir işçi portu almış olabilir
+            print(f"[Metrics] Port {port} açılamadı: {e}")
+    if path:
+        threading.Thread(target=_write_periodically, args=(path, interval), name="focusia-metrics-file", daemon=True).start()
+        print(f"[Metrics] Writing Prometheus metrics to {path} every {interval:g}s")
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+near_dedup.py
+-------------
+İndeks kurulumunda neredeyse aynı kayıtları (başka kelimelerle yazılmış kopyalar) tek temsilciye
+indirir. data_loader.iter_documents yalnızca birebir aynı (topic, içerik) kayıtları eler; birleşik
+ipucu korpuslarındaki kopyalar hem indeksi şişirir hem de MMR'ın fetch_k adaylarını harcar.
+
+- Shingle: metin Türkçe küçük harfe çevrilir ve kelimelere bölünür (köklenmez, durak kelimeler
+  atılmaz: "koy"/"koyma", "değil", "hiç" olumsuzluğu taşır); uzun metinlerde ardışık SHINGLE
+  kelime, kısa ipuçlarında (LONG_TEXT kelimeden az) ardışık SHORT_SHINGLE kelime 32 bit hash'lenir.
+  Parçalar sıra korur: yeri değişen ya da olumsuzlanan talimat kopya sayılmaz. ~10 kelimelik bir
+  ipucunda tek kelime eklemek 2'li parçaların ~%25'ini değiştirir (benzerlik ~0.75)
+- MinHash: NUM_PERM bağımsız (a·x + b) mod p permütasyonu → imza; iki imzanın eşit
+  bileşen oranı Jaccard benzerliğinin tahminidir
+- LSH: imza BANDS banda bölünür; aynı bant değerini paylaşan kayıtlar aday olur ve tahmini
+  benzerlik eşiği geçerse aynı kümeye girer. Her kayıt yalnızca kendi bant kovalarındaki
+  temsilcilerle (kova başına en fazla BUCKET_CAP) karşılaştırılır → maliyet kayıt sayısında doğrusal
+- Küme temsilcisi kaynakta ilk görülen kayıttır (eşitlemeler arasında kararlı); temsilcinin
+  metadata'sına kümedeki tüm başlıklar ("topics") ve kopya sayısı ("near_duplicates") yazılır;
+  kopyaların metni indekse girmez. Bu yüzden varsayılan kapalıdır (FOCUSIA_NEAR_DEDUP=1 ile açılır)
+
+Bellekte yalnızca temsilcilerin imzaları tutulur (kayıt başına NUM_PERM × 4 bayt).
+
+Kullanım:
+    plan = plan_near_duplicates((key, doc.page_content, doc.metadata["topic"]) for key, doc in iter_documents(path))
+    print(plan.report())
+    for key, doc in iter_documents(path):
+        kept = plan.apply(key, doc)   # kopyaysa None
+"""
+
+import hashlib
+import os
+import re
+import zlib
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from lexical_index import turkish_lower
+
+NEAR_DEDUP_ENABLED = os.getenv("FOCUSIA_NEAR_DEDUP", "0") == "1"
+NEAR_DEDUP_THRESHOLD = float(os.getenv("FOCUSIA_NEAR_DEDUP_THRESHOLD", "0.8"))   # tahmini Jaccard
+SHINGLE = 3
+SHORT_SHINGLE = 2                   # kısa ipuçlarında kelime ikilileri
+LONG_TEXT = 40                      # bu kadar kelimeden kısa metinlerde SHORT_SHINGLE
+NUM_PERM = 64
+BANDS = 16                          # 16 bant × 4 satır: ~0.5 benzerlikten itibaren aday olur
+BUCKET_CAP = 32                     # kova başına en fazla temsilci: yoğun kovalarda da maliyet doğrusal kalır
+SEED = 1
+_PRIME = np.uint64(4294967311)      # 2^32'den büyük ilk asal
+TOPIC_SEPARATOR = " | "
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def near_dedup_id(threshold: float = NEAR_DEDUP_THRESHOLD) -> str:
+    """Manifest'e yazılan ayar kimliği; değişirse kaynak aynı olsa da indeks yeniden eşitlenir."""
+    if not NEAR_DEDUP_ENABLED:
+        return "off"
+    return f"minhash{NUM_PERM}x{BANDS}-w{SHORT_SHINGLE}/{SHINGLE}@{LONG_TEXT}-j{threshold:g}"
+
+
+def shingle_hashes(text: str, size: int = SHINGLE) -> np.ndarray:
+    """Parçaların 32 bit hash'leri (tekil): ardışık kelime dizileri (kısa metinde SHORT_SHINGLE, uzunda size)."""
+    words = _WORD_RE.findall(turkish_lower(text))
+    n = SHORT_SHINGLE if len(words) < LONG_TEXT else size
+    if len(words) <= n:
+        grams = {" ".join(words)} if words else set()
+    else:
+        grams = {" ".join(words[i:i + n]) for i in range(len(words) - n + 1)}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+class MinHasher:
+    """NUM_PERM permütasyonlu MinHash; a < 2^31 ve x < 2^32 olduğundan a·x + b uint64'e sığar."""
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = SEED):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 1 << 31, size=(num_perm, 1), dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, size=(num_perm, 1), dtype=np.uint64)
+        self.num_perm = num_perm
+
+    def signature(self, hashes: np.ndarray) -> np.ndarray:
+        return ((self.a * hashes[None, :] + self.b) % _PRIME).min(axis=1).astype(np.uint32)
+
+
+@dataclass
+class DedupPlan:
+    """
+    Kümeleme sonucu.
+    - duplicate_of: kopya kaydın anahtarı → temsilcinin anahtarı
+    - topics: kopyası olan temsilci → kümedeki tekil başlıklar (temsilcininki önce)
+    """
+    threshold: float
+    total: int = 0
+    duplicate_of: Dict[bytes, bytes] = field(default_factory=dict)
+    topics: Dict[bytes, List[str]] = field(default_factory=dict)
+    counts: Dict[bytes, int] = field(default_factory=dict)
+
+    @property
+    def kept(self) -> int:
+        return self.total - len(self.duplicate_of)
+
+    def apply(self, key: bytes, doc: Document) -> Optional[Tuple[bytes, Document]]:
+        """
+        Kopyaysa None; kopyası olan temsilcide başlıkları metadata'ya yazar ve anahtarı başlık
+        listesiyle türetir (kümeye yeni kopya katılınca kayıt indekste güncellensin).
+        """
+        if key in self.duplicate_of:
+            return None
+        topics = self.topics.get(key)
+        if topics is None:
+            return key, doc
+        doc.metadata["topics"] = TOPIC_SEPARATOR.join(topics)
+        doc.metadata["near_duplicates"] = self.counts[key]
+        h = hashlib.blake2b(key, digest_size=16)
+        h.update(doc.metadata["topics"].encode("utf-8"))
+        return h.digest(), doc
+
+    def report(self) -> str:
+        dropped = len(self.duplicate_of)
+        pct = 100.0 * dropped / self.total if self.total else 0.0
+        return (
+            f"{self.total} → {self.kept} docs (-{dropped}, -{pct:.1f}%; "
+            f"{len(self.counts)} clusters, Jaccard ≥ {self.threshold:g})"
+        )
+
+
+def plan_near_duplicates(
+    items: Iterable[Tuple[bytes, str, str]],
+    threshold: float = NEAR_DEDUP_THRESHOLD,
+    num_perm: int = NUM_PERM,
+    bands: int = BANDS,
+) -> DedupPlan:
+    """
+    (anahtar, metin, başlık) akışını tek geçişte kümeler. Her kayıt, bant kovalarını paylaştığı
+    temsilciler arasında tahmini benzerliği en yüksek (ve eşiği geçen) olana bağlanır; yoksa
+    kendisi temsilci olur.
+    """
+    if num_perm % bands:
+        raise ValueError("num_perm, bands'e tam bölünmeli.")
+    rows = num_perm // bands
+    hasher = MinHasher(num_perm)
+    plan = DedupPlan(threshold=threshold)
+    buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+    reps: List[bytes] = []
+    rep_topics: List[str] = []
+    sigs = np.empty((1024, num_perm), dtype=np.uint32)
+
+    for key, text, topic in items:
+        plan.total += 1
+        hashes = shingle_hashes(text)
+        if len(hashes) == 0:  # yalnızca durak kelime / noktalama: karşılaştırılacak bir şey yok
+            continue
+        sig = hasher.signature(hashes)
+        band_keys = [sig[b * rows:(b + 1) * rows].tobytes() for b in range(bands)]
+        candidates = {r for b, bk in enumerate(band_keys) for r in buckets[b].get(bk, ())}
+        best = -1
+        if candidates:
+            cand = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            sims = (sigs[cand] == sig).mean(axis=1)
+            i = int(np.argmax(sims))
+            if sims[i] >= threshold:
+                best = int(cand[i])
+        if best >= 0:
+            rep = reps[best]
+            plan.duplicate_of[key] = rep
+            plan.counts[rep] = plan.counts.get(rep, 0) + 1
+            topics = plan.topics.setdefault(rep, [rep_topics[best]] if rep_topics[best] else [])
+            if topic and topic not in topics:
+                topics.append(topic)
+            continue
+        row = len(reps)
+        if row == len(sigs):
+            sigs = np.concatenate([sigs, np.empty_like(sigs)])
+        sigs[row] = sig
+        reps.append(key)
+        rep_topics.append(topic)
+        for b, bk in enumerate(band_keys):
+            bucket = buckets[b].setdefault(bk, [])
+            if len(bucket) < BUCKET_CAP:
+                bucket.append(row)
+    return plan
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+onnx_embeddings.py
+------------------
+sentence-transformers modelinin (varsayılan all-MiniLM-L6-v2) ONNX'e aktarılmış ve dinamik
+int8 ile nicemlenmiş kopyasıyla CPU'da embedding. PyTorch'a göre daha az bellek ve daha
+düşük gecikme; vektörler torch sürümüne çok yakındır (karşılaştırma:
+benchmarks/bench_embeddings.py ile recall@k, bellek ve gecikme).
+
+- export_onnx(model, out_dir): transformers + torch.onnx ile dışa aktarır, onnxruntime ile
+  int8'e çevirir, tokenizer.json'u yanına yazar. Bir kez çalışır; torch, transformers ve
+  onnx paketleri gerekir (sentence-transformers kuruluysa ilk ikisi zaten vardır).
+- OnnxEmbeddings(model_dir): yalnızca onnxruntime + tokenizers ile çalışır (torch yüklenmez).
+  Mean pooling + L2 normalizasyon sentence-transformers ile aynıdır.
+- Tokenizasyon önbelleği: metin → token id'leri (LRU); aynı sorgu/metin yeniden bölünmez.
+- Aynı LangChain Embeddings arayüzü (embed_documents / embed_query); data_loader'da
+  FOCUSIA_EMB_BACKEND=onnx ile seçilir.
+
+Kullanım:
+    python onnx_embeddings.py                      # onnx_models/ altına dışa aktar
+    emb = load_onnx_embeddings("sentence-transformers/all-MiniLM-L6-v2")
+    vec = emb.embed_query("Odaklanamıyorum")
+"""
+
+import argparse
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+ONNX_DIR = os.getenv("FOCUSIA_ONNX_DIR", "onnx_models")            # dışa aktarılan modellerin kökü
+ONNX_THREADS = int(os.getenv("FOCUSIA_ONNX_THREADS", "0"))          # 0 = onnxruntime varsayılanı
+MODEL_FILE = "model-int8.onnx"
+META_FILE = "focusia_onnx.json"
+MAX_SEQ_LENGTH = 256      # all-MiniLM-L6-v2 sentence_bert_config ile aynı
+TOKEN_CACHE_SIZE = 4096   # önbellekte tutulan en fazla metin
+BATCH_SIZE = 32
+
+
+def model_dir(model_name: str, root: str = ONNX_DIR) -> Path:
+    """Model adından dışa aktarım klasörü (örn. onnx_models/sentence-transformers__all-MiniLM-L6-v2)."""
+    return Path(root) / model_name.replace("/", "__")
+
+
+def export_onnx(model_name: str, out_dir: Path, opset: int = 14, keep_fp32: bool = False) -> Path:
+    """
+    Modeli ONNX'e aktarır ve ağırlıkları dinamik int8'e nicemler.
+    Çıktı: out_dir/model-int8.onnx + tokenizer.json + focusia_onnx.json (meta)
+    """
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModel, AutoTokenizer
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    tokenizer.save_pretrained(str(out_dir))  # hızlı tokenizer → tokenizer.json
+
+    model = AutoModel.from_pretrained(model_name)
+    model.config.return_dict = False  # çıktı: (last_hidden_state, pooler_output)
+    model.eval()
+    sample = tokenizer(["Odaklanmakta zorlanıyorum."], return_tensors="pt")
+    inputs = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+    axes = {n: {0: "batch", 1: "sequence"} for n in inputs}
+    axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    fp32 = out_dir / "model.onnx"
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[n] for n in inputs),
+            str(fp32),
+            input_names=inputs,
+            output_names=["last_hidden_state", "pooler_output"],
+            dynamic_axes=axes,
+            opset_version=opset,
+        )
+    quantize_dynamic(str(fp32), str(out_dir / MODEL_FILE), weight_type=QuantType.QInt8)
+    if not keep_fp32:
+        fp32.unlink()
+
+    meta = {"model": model_name, "inputs": inputs, "max_seq_length": MAX_SEQ_LENGTH, "quantization": "dynamic-int8"}
+    (out_dir / META_FILE).write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    size_mb = (out_dir / MODEL_FILE).stat().st_size / 1e6
+    print(f"[ONNX] Exported {model_name} → {out_dir / MODEL_FILE} ({size_mb:.1f} MB, int8)")
+    return out_dir
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    onnxruntime ile çalışan, torch'suz sentence embedding.
+    - model_dir: export_onnx çıktısı (model-int8.onnx + tokenizer.json)
+    - threads: onnxruntime intra-op thread sayısı (0 = varsayılan)
+    - batch_size: tek seferde modele verilen metin (benzer uzunluklar aynı batch'e düşer)
+    - cache_size: tokenizasyon önbelleğindeki en fazla metin
+    """
+    def __init__(
+        self,
+        model_dir: Path,
+        threads: int = ONNX_THREADS,
+        batch_size: int = BATCH_SIZE,
+        cache_size: int = TOKEN_CACHE_SIZE,
+    ):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_dir = Path(model_dir)
+        meta_path = model_dir / META_FILE
+        meta = json.loads(meta_path.read_text(encoding="utf-8")) if meta_path.exists() else {}
+        self.model_name = meta.get("model", model_dir.name)
+
+        self._tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self._tokenizer.enable_truncation(max_length=int(meta.get("max_seq_length", MAX_SEQ_LENGTH)))
+        self._tokenizer.no_padding()  # dolgu batch içinde, en uzun metne göre yapılır
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            opts.intra_op_num_threads = threads
+        self._session = ort.InferenceSession(str(model_dir / MODEL_FILE), opts, providers=["CPUExecutionProvider"])
+        self._inputs = {i.name for i in self._session.get_inputs()}
+
+        self.batch_size = max(1, batch_size)
+        self.cache_size = max(0, cache_size)
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.token_hits = 0
+        self.token_misses = 0
+
+    # ---- tokenizasyon (önbellekli) ----
+
+    def _token_ids(self, texts: Sequence[str]) -> List[np.ndarray]:
+        out: List[Optional[np.ndarray]] = [None] * len(texts)
+        missing: "OrderedDict[str, List[int]]" = OrderedDict()
+        with self._lock:
+            for i, text in enumerate(texts):
+                ids = self._cache.get(text)
+                if ids is None:
+                    missing.setdefault(text, []).append(i)
+                else:
+                    self._cache.move_to_end(text)
+                    out[i] = ids
+            self.token_hits += len(texts) - sum(len(v) for v in missing.values())
+            self.token_misses += len(missing)
+
+        if missing:
+            encodings = self._tokenizer.encode_batch(list(missing))
+            with self._lock:
+                for (text, positions), enc in zip(missing.items(), encodings):
+                    ids = np.asarray(enc.ids, dtype=np.int64)
+                    for i in positions:
+                        out[i] = ids
+                    if self.cache_size:
+                        self._cache[text] = ids
+                        if len(self._cache) > self.cache_size:
+                            self._cache.popitem(last=False)
+        return out  # type: ignore[return-value]
+
+    # ---- model ----
+
+    def _run(self, batch: List[np.ndarray]) -> np.ndarray:
+        length = max(len(ids) for ids in batch)
+        input_ids = np.zeros((len(batch), length), dtype=np.int64)
+        mask = np.zeros((len(batch), length), dtype=np.int64)
+        for row, ids in enumerate(batch):
+            input_ids[row, :len(ids)] = ids
+            mask[row, :len(ids)] = 1
+        feeds = {"input_ids": input_ids, "attention_mask": mask}
+        if "token_type_ids" in self._inputs:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+        hidden = self._session.run(None, {k: v for k, v in feeds.items() if k in self._inputs})[0]
+
+        # Mean pooling (dolgu hariç) + L2 normalizasyon
+        weights = mask[:, :, None].astype(np.float32)
+        pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return pooled / np.clip(norms, 1e-12, None)
+
+    def _embed(self, texts: Sequence[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        token_ids = self._token_ids(texts)
+        order = np.argsort([len(ids) for ids in token_ids], kind="stable")  # az dolgu için boya göre
+        out: Optional[np.ndarray] = None
+        for start in range(0, len(order), self.batch_size):
+            idx = order[start:start + self.batch_size]
+            vecs = self._run([token_ids[i] for i in idx])
+            if out is None:
+                out = np.empty((len(texts), vecs.shape[1]), dtype=np.float32)
+            out[idx] = vecs
+        return out
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text])[0].tolist()
+
+
+def ensure_exported(model_name: str, root: str = ONNX_DIR) -> Path:
+    """Dışa aktarılmış model klasörü; yoksa önce dışa aktarır (bir kez, torch/transformers/onnx gerekir)."""
+    target = model_dir(model_name, root)
+    if not (target / MODEL_FILE).exists():
+        print(f"[ONNX] {target / MODEL_FILE} bulunamadı; {model_name} dışa aktarılıyor (bir kez)...")
+        export_onnx(model_name, target)
+    return target
+
+
+def load_onnx_embeddings(model_name: str, root: str = ONNX_DIR, threads: int = ONNX_THREADS) -> OnnxEmbeddings:
+    return OnnxEmbeddings(ensure_exported(model_name, root), threads=threads)
+
+
+def main() -> None:
+    from data_loader import EMB_MODEL
+
+    ap = argparse.ArgumentParser(description="Embedding modelini ONNX + int8 olarak dışa aktarır.")
+    ap.add_argument("--model", default=EMB_MODEL)
+    ap.add_argument("--out", default=ONNX_DIR, help="kök klasör (model alt klasörü otomatik)")
+    ap.add_argument("--keep-fp32", action="store_true", help="nicemlenmemiş model.onnx dosyasını da sakla")
+    args = ap.parse_args()
+    export_onnx(args.model, model_dir(args.model, args.out), keep_fp32=args.keep_fp32)
+
+
+if __name__ == "__main__":
+    main()
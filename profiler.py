@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+profiler.py
+-----------
+Canlı istekler için isteğe bağlı örnekleyici (sampling) profilleyici. Süreç yavaşladığında
+zamanın Streamlit sürecinin içinde nereye gittiğini görmek için:
+
+- Örnekleme: oturum açıkken yardımcı bir thread her PROFILE_INTERVAL_MS'de oturumu açan
+  thread'in çağrı yığınını sys._current_frames() ile okur (profil edilen koda kanca eklenmez;
+  yük örnekleme sıklığıyla sınırlıdır). Aynı yığınlar sayılır ve "collapsed stacks" olarak yazılır:
+  her satır "kök;...;yaprak <örnek sayısı>" (flamegraph.pl, speedscope, inferno ile açılır)
+- Bellek: PROFILE_MEMORY açıksa oturum süresince tracemalloc çalışır; sonda snapshot
+  (.tracemalloc, tracemalloc.Snapshot.load ile okunur) ve tepe bellek özete yazılır.
+  tracemalloc her ayırmayı izler: import/indeks kurulumu gibi ayırma yoğun işler birkaç kat
+  yavaşlar ve yığın örneklerinde şişer; yalnızca süre için FOCUSIA_PROFILE_MEMORY=0
+- Dizin: PROFILE_DIR/<zaman>-<etiket>-<kimlik>.{folded,tracemalloc,json}; en yeni PROFILE_KEEP
+  profil tutulur, eskileri silinir
+- Açma: FOCUSIA_PROFILE=1 (tüm sarılı çağrılar) ya da istek başına session(..., force=True)
+  (app.py'de FOCUSIA_PROFILE_URL verilmişse URL'de ?profile=<o değer>, zincirde payload'da "profile": True)
+
+Kapalıyken sarılı çağrının ek maliyeti bir bayrak ve bir contextvar okumasıdır. İç içe
+oturum açılmaz: invoke içindeki _postprocess, invoke'un profiline girer. Yalnızca oturumu
+açan thread örneklenir (async yolda event loop thread'i paylaşıldığı için profil yoktur).
+
+Kullanım:
+    @profiler.profiled("build_or_load_chroma")
+    def build_or_load_chroma(...): ...
+
+    with profiler.session("invoke", force=payload.get("profile")):
+        ...
+"""
+
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import metrics
+
+PROFILE_ENABLED = os.getenv("FOCUSIA_PROFILE", "0") == "1"
+PROFILE_DIR = os.getenv("FOCUSIA_PROFILE_DIR", "profiles")
+PROFILE_INTERVAL_MS = float(os.getenv("FOCUSIA_PROFILE_INTERVAL_MS", "5"))   # örnekleme aralığı
+PROFILE_KEEP = int(os.getenv("FOCUSIA_PROFILE_KEEP", "50"))                  # dizinde tutulan profil sayısı
+PROFILE_MEMORY = os.getenv("FOCUSIA_PROFILE_MEMORY", "1") != "0"             # tracemalloc snapshot'ı
+MEMORY_FRAMES = 1      # ayırma başına saklanan çerçeve: satır bazlı istatistiğe yeter, her ek çerçeve yavaşlatır
+TOP_ALLOCATIONS = 20   # özet JSON'daki en büyük ayırma satırları
+
+_PROFILES = metrics.counter("focusia_profiles_total", "Yazılan profil sayısı (label=invoke|stream|postprocess|...)")
+
+# Süren profil oturumu (thread/async görev başına); iç içe çağrılar yeni oturum açmaz
+_ACTIVE: ContextVar[Optional["Session"]] = ContextVar("focusia_profile", default=None)
+
+# tracemalloc süreç geneli: eşzamanlı oturumlar paylaşır, son çıkan (başlatan bizsek) durdurur
+_MEMORY_LOCK = threading.Lock()
+_MEMORY_USERS = 0
+_MEMORY_OWNED = False
+
+_NAMES: Dict[Any, str] = {}  # kod nesnesi → "fonksiyon (dosya.py:satır)"
+
+
+def _frame_name(code: Any) -> str:
+    name = _NAMES.get(code)
+    if name is None:
+        name = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        _NAMES[code] = name
+    return name
+
+
+def collapse(stacks: "Counter[Tuple[Any, ...]]") -> List[str]:
+    """Kod nesnesi yığınları (kökten yaprağa) → "a;b;c sayı" satırları, çoktan aza."""
+    return [f"{';'.join(_frame_name(c) for c in stack)} {n}" for stack, n in stacks.most_common()]
+
+
+class Session:
+    """Tek profil: örnekleyici thread + (isteğe bağlı) tracemalloc; stop() dosyaları yazar."""
+    def __init__(self, label: str, interval_ms: float = PROFILE_INTERVAL_MS, memory: bool = PROFILE_MEMORY):
+        self.label = label
+        self.interval = max(0.0005, interval_ms / 1000.0)
+        self.memory = memory
+        self.stacks: "Counter[Tuple[Any, ...]]" = Counter()
+        self.samples = 0
+        self._thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self._t0 = 0.0
+
+    def _sample_loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            stack.reverse()
+            self.stacks[tuple(stack)] += 1
+            self.samples += 1
+
+    def start(self) -> "Session":
+        global _MEMORY_USERS, _MEMORY_OWNED
+        if self.memory:
+            with _MEMORY_LOCK:
+                if _MEMORY_USERS == 0 and not tracemalloc.is_tracing():
+                    tracemalloc.start(MEMORY_FRAMES)
+                    _MEMORY_OWNED = True
+                _MEMORY_USERS += 1
+                tracemalloc.reset_peak()
+        self._t0 = time.perf_counter()
+        self._sampler = threading.Thread(target=self._sample_loop, name="focusia-profiler", daemon=True)
+        self._sampler.start()
+        return self
+
+    def stop(self, out_dir: str = PROFILE_DIR) -> Optional[str]:
+        """Örneklemeyi durdurur, profili yazar; dosyaların ortak yolu (uzantısız) döner."""
+        global _MEMORY_USERS, _MEMORY_OWNED
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        seconds = time.perf_counter() - self._t0
+        snapshot, peak = None, None
+        if self.memory:
+            with _MEMORY_LOCK:
+                if tracemalloc.is_tracing():
+                    peak = tracemalloc.get_traced_memory()[1]
+                    snapshot = tracemalloc.take_snapshot().filter_traces(
+                        (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"))
+                    )
+                _MEMORY_USERS -= 1
+                if _MEMORY_USERS == 0 and _MEMORY_OWNED:
+                    tracemalloc.stop()
+                    _MEMORY_OWNED = False
+        try:
+            return self._write(out_dir, seconds, snapshot, peak)
+        except OSError as e:
+            print(f"[Profile] {self.label}: could not write profile: {e}")
+            return None
+
+    def _write(self, out_dir: str, seconds: float, snapshot: Any, peak: Optional[int]) -> str:
+        os.makedirs(out_dir, exist_ok=True)
+        now = time.time()
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(now)) + f"{now % 1:.3f}"[1:]
+        base = os.path.join(out_dir, f"{stamp}-{self.label}-{uuid.uuid4().hex[:6]}")
+        with open(base + ".folded", "w", encoding="utf-8") as f:
+            f.writelines(line + "\n" for line in collapse(self.stacks))
+        summary: Dict[str, Any] = {
+            "label": self.label,
+            "seconds": round(seconds, 4),
+            "samples": self.samples,
+            "interval_ms": self.interval * 1000.0,
+        }
+        if snapshot is not None:
+            snapshot.dump(base + ".tracemalloc")
+            summary["peak_bytes"] = peak
+            summary["top_allocations"] = [
+                {"where": str(s.traceback[0]), "bytes": s.size, "count": s.count}
+                for s in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]
+            ]
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        rotate(out_dir)
+        _PROFILES.inc(label=self.label)
+        print(f"[Profile] {self.label}: {self.samples} samples in {seconds:.2f}s → {base}.folded")
+        return base
+
+
+def rotate(out_dir: str = PROFILE_DIR, keep: int = PROFILE_KEEP) -> int:
+    """En yeni keep profili bırakır (adlar zamanla başladığı için ada göre sıralanır); silinen profil sayısı."""
+    try:
+        names = os.listdir(out_dir)
+    except OSError:
+        return 0
+    stems = sorted({n.rsplit(".", 1)[0] for n in names if n.endswith((".folded", ".tracemalloc", ".json"))})
+    stale = set(stems[:-keep] if keep > 0 else stems)
+    for n in names:
+        if n.rsplit(".", 1)[0] in stale:
+            try:
+                os.remove(os.path.join(out_dir, n))
+            except OSError:
+                pass
+    return len(stale)
+
+
+@contextmanager
+def session(label: str, force: Any = False) -> Iterator[Optional[Session]]:
+    """
+    FOCUSIA_PROFILE=1 ya da force ise bloğu profiller (iç içe oturum açılmaz); değilse None verir.
+    """
+    if not (PROFILE_ENABLED or force) or _ACTIVE.get() is not None:
+        yield None
+        return
+    sess = Session(label).start()
+    token = _ACTIVE.set(sess)
+    try:
+        yield sess
+    finally:
+        try:
+            _ACTIVE.reset(token)
+        except ValueError:  # üreteç başka bir bağlamda kapatıldı
+            pass
+        sess.stop()
+
+
+def profiled(label: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Fonksiyonu FOCUSIA_PROFILE=1 iken profilleyen dekoratör (kapalıyken doğrudan çağırır)."""
+    def deco(fn: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not PROFILE_ENABLED or _ACTIVE.get() is not None:
+                return fn(*args, **kwargs)
+            with session(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
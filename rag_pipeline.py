@@ -5,19 +5,64 @@ rag_pipeline.py
 Focusia'nın LLM ve RAG (Retrieval-Augmented Generation) akışını kurar.
 
 - HF Inference API ile sohbet (chat_completion) öncelikli; destek yoksa text_generation'a düşer.
+  Hangi yolun desteklendiği model başına bir kez öğrenilip saklanır; geçici hatalar
+  (zaman aşımı, 429/5xx) sınırlı sayıda, artan beklemeyle yeniden denenir.
 - Çıktı, _postprocess ile sadeleştirilir: madde işaretleri, kısa açıklamalar ve mini egzersiz.
+- Akışlı yol: HFClientLLM token'ları (stream=True) üretir, _StreamPostprocessor aynı
+  temizliği token'lar geldikçe yapar; _SimpleRAGAdapter.stream arayüzü kısmi metinleri verir.
+- Async yol: _SimpleRAGAdapter.ainvoke / abatch aramayı bir thread'de, üretimi
+  AsyncInferenceClient ile yapar; submit(payload, key) aynı oturumun önceki isteğini iptal eder.
+- HF çağrıları isteğe bağlı bir kabul kuyruğundan (admission.AdmissionQueue) geçer: aynı anda
+  en fazla FOCUSIA_LLM_CONCURRENCY çağrı, gerisi sırayla bekler (sıra bilgisi admission.listen).
+- Her sonuç sözlüğü "timings" taşır: aşama süreleri (embed/retrieve/format/llm/postprocess, ms),
+  token sayıları ve önbellek/birleştirme/geri düşme bayrakları; aynı değerler metrics
+  histogramlarına da yazılır.
+- Bağlam, context_packer ile token bütçesine sığdırılır (skor sırası, tekrar eleme, kırpma);
+  kazanılan token sayısı timings'e "context_tokens_saved" olarak yazılır.
+- Tekrarlanan sorgularda embedding ve arama sonucu retrieval_cache'ten gelir (bellek sınırlı
+  LRU; indeks yeniden kurulunca eski sonuçlar geçersizleşir).
 - _SimpleRAGAdapter sınıfı, LangChain v0.2+ ile gelen retriever API değişikliklerine
   uyumludur (hem .get_relevant_documents hem de .invoke yollarını destekler).
 """
 
+import asyncio
+import concurrent.futures
+import contextvars
+import hashlib
+import json
 import os
-from typing import Any, List, Optional, Dict
-from huggingface_hub import InferenceClient
+import random
+import re
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Callable, Iterator, List, Optional, Dict, Tuple
+from huggingface_hub import AsyncInferenceClient, InferenceClient
+
+try:  # huggingface_hub 1.x+ httpx kullanır; eski sürümlerde requests (hataları OSError'dır)
+    from httpx import TransportError as _HttpxTransportError
+except ImportError:  # pragma: no cover
+    _HttpxTransportError = OSError
 
 # LangChain v0.2+ çekirdek importları (chains modülüne gerek yok)
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
 from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
 from langchain_core.prompts import PromptTemplate
 
+import metrics
+import profiler
+from admission import ADMISSION_TIMEOUT, AdmissionQueue, make_admission_queue
+from context_packer import ContextPacker, make_context_packer
+from retrieval_cache import RetrievalCache, make_retrieval_cache
+from vector_index import chroma_search_by_vectors
+from answer_cache import (
+    ANSWER_CACHE_ENABLED,
+    ANSWER_CACHE_PATH,
+    AnswerCache,
+    source_key,
+)
+
 # Sistem rolü: modelin üslubunu ve çıktıyı sabitlemek için.
 SYSTEM_TR = (
     "Sen bir odaklanma koçusun. Türkçe, doğal ve kısa cümlelerle konuş.\n"
@@ -27,6 +72,125 @@ SYSTEM_TR = (
     "- İngilizce kelime, emoji, [INST] gibi kalıntılar yazma.\n"
 )
 
+# Model çıktısından atılan sistem/şablon kalıntıları
+_BAD_TOKENS = ("[/INST]", "[INST]", "Yanıt:", "Yanıtı:", "Answer:", "Response:")
+_SOURCE_PREFIXES = ("kaynak", "source")
+_DEFAULT_EXERCISE = "\n\nMini egzersiz: 2 dakika nefesine odaklan; her nefeste 4'e kadar say."
+
+
+def _clean_fragment(text: str) -> str:
+    """Etiket kalıntılarını siler ve madde sembollerini '-' yapar (satır sonlarına dokunmaz)."""
+    for bad in _BAD_TOKENS:
+        text = text.replace(bad, "")
+    return text.replace("•", "-").replace("●", "-").replace("►", "-")
+
+
+def _strip_bullet(ln: str) -> str:
+    """Başındaki numara/madde karakterlerini temizler (örn. "1.", "2)", "-")."""
+    while ln and (ln[0].isdigit() or ln[0] in "-•.–"):
+        ln = ln[1:].lstrip(" .-)")
+    return ln.strip()
+
+
+def _is_explanation(nxt: str) -> bool:
+    """Bir önceki maddeye parantez içinde eklenecek kısa açıklama satırı mı? (10 kelime ve altı)"""
+    return bool(
+        nxt
+        and not nxt[0].isdigit()
+        and not nxt.startswith("-")
+        and len(nxt.split()) <= 10
+        and not nxt.lower().startswith(_SOURCE_PREFIXES)
+    )
+
+
+class _StreamPostprocessor:
+    """
+    _postprocess'in artımlı hali: metin parça parça (token token) beslenir.
+    - Tamamlanan her satır hemen temizlenir; bir madde, bir sonraki satır onun kısa
+      açıklaması olabileceği için yalnızca bir satır bekletilir.
+    - "Kaynak"/"Source" satırı gelince sonrası yok sayılır.
+    - render(): o ana kadarki (yarım satır dahil) gösterilebilir metin
+    - finish(): _postprocess(tüm metin) ile birebir aynı sonuç
+    """
+    def __init__(self) -> None:
+        self._pending = ""              # henüz satır sonu gelmemiş ham metin
+        self._cleaned: List[str] = []   # temizlenmiş tüm metin (madde çıkmazsa geri dönüş için)
+        self._fixed: List[str] = []     # kesinleşmiş maddeler
+        self._held: Optional[str] = None  # açıklama satırı bekleyen madde
+        self._stopped = False
+        self._empty = True
+
+    def feed(self, chunk: str) -> None:
+        if not chunk:
+            return
+        self._empty = False
+        self._pending += chunk
+        parts = self._pending.splitlines(keepends=True)
+        # Son parça satır sonuyla bitmiyorsa henüz tamamlanmamıştır
+        self._pending = parts.pop() if parts[-1].splitlines()[0] == parts[-1] else ""
+        for part in parts:
+            self._line(part)
+
+    def _line(self, raw: str) -> None:
+        cleaned = _clean_fragment(raw)
+        self._cleaned.append(cleaned)
+        ln = cleaned.strip()
+        if not ln or self._stopped:
+            return
+
+        if self._held is not None:
+            if _is_explanation(ln):
+                self._fixed.append(f"{self._held} ({ln})")
+                self._held = None
+                return  # açıklama satırını tükettik
+            self._fixed.append(self._held)
+            self._held = None
+
+        # "Kaynak" / "Source" başlığından sonrasını alma (RAG dayanaklarını UI'da gösteriyoruz)
+        if ln.lower().startswith(_SOURCE_PREFIXES):
+            self._stopped = True
+            return
+
+        item = _strip_bullet(ln)
+        if item:
+            self._held = item
+
+    def render(self) -> str:
+        """Akış sırasında gösterilecek ara metin (mini egzersiz eklenmez)."""
+        items = list(self._fixed)
+        if self._held is not None:
+            items.append(self._held)
+        if not self._stopped:
+            tail = _clean_fragment(self._pending).strip()
+            low = tail.lower()
+            # "Kay..." gibi yarım bir kaynak başlığını da gösterme
+            if tail and not any(low.startswith(p) or p.startswith(low) for p in _SOURCE_PREFIXES):
+                tail = _strip_bullet(tail)
+                if tail:
+                    items.append(tail)
+        return ("- " + "\n- ".join(items)) if items else ""
+
+    def finish(self) -> str:
+        if self._empty:
+            return ""
+        if self._pending:
+            self._line(self._pending)
+            self._pending = ""
+        if self._held is not None:
+            self._fixed.append(self._held)
+            self._held = None
+
+        # Madde listesine dönüştür
+        out = ("- " + "\n- ".join(self._fixed)) if self._fixed else "".join(self._cleaned)
+
+        # Mini egzersiz ekle (yoksa)
+        if "egzersiz" not in out.lower():
+            out += _DEFAULT_EXERCISE
+
+        return out.strip()
+
+
+@profiler.profiled("postprocess")
 def _postprocess(text: str) -> str:
     """
     Model çıktısını düzenler:
@@ -35,109 +199,334 @@ def _postprocess(text: str) -> str:
     - Kısa açıklama satırlarını (varsa) bir önceki maddeye parantez içinde ekler
     - Sonuç yoksa güvenli geri dönüş yapar
     - Mini egzersiz yoksa ekler
+    (Akışlı yol ile aynı sonucu vermesi için _StreamPostprocessor'a tek seferde beslenir.)
     """
     if not text:
         return ""
+    pp = _StreamPostprocessor()
+    pp.feed(text)
+    return pp.finish()
 
-    # Fazla etiket ve semboller
-    for bad in ("[/INST]", "[INST]", "Yanıt:", "Yanıtı:", "Answer:", "Response:"):
-        text = text.replace(bad, "")
-    text = text.replace("•", "-").replace("●", "-").replace("►", "-")
 
-    # Satır bazlı işleme
-    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
-    fixed: List[str] = []
-    i = 0
-    while i < len(lines):
-        ln = lines[i]
+# ---- Model yetenek önbelleği + hata sınıflandırma ----
 
-        # "Kaynak" / "Source" başlığından sonrasını alma (RAG dayanaklarını UI'da gösteriyoruz)
-        if ln.lower().startswith(("kaynak", "source")):
-            break
+# Model id → "chat" | "text". FOCUSIA_HF_MODE ile (chat/text) baştan sabitlenebilir.
+_CAPABILITIES: Dict[str, str] = {}
+_CAP_LOCK = threading.Lock()
+_FORCED_MODE = os.getenv("FOCUSIA_HF_MODE", "").lower()
+LLM_MAX_RETRIES = int(os.getenv("FOCUSIA_LLM_RETRIES", "2"))     # geçici hatalarda ek deneme sayısı
+LLM_RETRY_BACKOFF = float(os.getenv("FOCUSIA_LLM_BACKOFF", "0.5"))  # ilk bekleme (sn), her denemede 2 katı
+LLM_TIMEOUT = float(os.getenv("FOCUSIA_LLM_TIMEOUT", "60"))       # HF çağrısı başına zaman aşımı (sn)
+BATCH_CONCURRENCY = int(os.getenv("FOCUSIA_BATCH_CONCURRENCY", "8"))  # batch(): eşzamanlı LLM çağrısı
+
+_LLM_FALLBACKS = metrics.counter(
+    "focusia_llm_fallback_total", "chat_completion desteklenmediği için text_generation'a düşüş sayısı"
+)
+_LLM_FALLBACK_SECONDS = metrics.histogram(
+    "focusia_llm_fallback_seconds", "Başarısız chat_completion denemesinde kaybedilen süre"
+)
+_LLM_RETRIES = metrics.counter("focusia_llm_retries_total", "Geçici hatalar nedeniyle yapılan yeniden denemeler")
+_LLM_ERRORS = metrics.counter("focusia_llm_errors_total", "Hata türüne göre HF çağrı hataları")
+
+
+# ---- İstek başına aşama zamanlamaları ----
+
+_STAGE_SECONDS = metrics.histogram("focusia_stage_seconds", "RAG aşama süreleri (stage=embed|retrieve|format|llm|postprocess|...)")
+_REQUEST_SECONDS = metrics.histogram("focusia_request_seconds", "Uçtan uca istek süresi (path=invoke|stream|ainvoke|batch)")
+_LLM_TOKENS = metrics.counter("focusia_llm_tokens_total", "LLM token sayıları (kind=prompt|completion)")
+# Aşama olmayan süreler: kuyruk beklemesi llm aşamasının içinde, ilk token süresi onun bir parçası.
+# Aşama serisine girerlerse aşamaların toplamı isteği aşar; kendi histogramlarına yazılırlar.
+_NON_STAGE_SECONDS = {
+    "queue_ms": metrics.histogram("focusia_llm_queue_seconds", "İstek başına LLM kabul kuyruğunda bekleme"),
+    "ttft_ms": metrics.histogram("focusia_llm_ttft_seconds", "Akışta ilk token'a kadar geçen süre"),
+}
 
-        # Başındaki numara/madde karakterlerini temizle (örn. "1.", "2)", "-")
-        while ln and (ln[0].isdigit() or ln[0] in "-•.–"):
-            ln = ln[1:].lstrip(" .-)")
+# Süren isteğin zamanlama kaydı (thread/async görev başına; kayıt yoksa ölçümler yalnızca atlanır)
+_TIMINGS: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar("focusia_timings", default=None)
 
-        ln = ln.strip()
-        if not ln:
-            i += 1
-            continue
 
-        # Sonraki satır kısa bir açıklamaysa paranteze al (10 kelime ve altı)
-        if i + 1 < len(lines):
-            nxt = lines[i + 1].strip()
-            if (
-                nxt
-                and not nxt[0].isdigit()
-                and not nxt.startswith("-")
-                and len(nxt.split()) <= 10
-                and not nxt.lower().startswith(("kaynak", "source"))
-            ):
-                ln = f"{ln} ({nxt})"
-                i += 1  # açıklama satırını tükettik
+@contextmanager
+def _stage(name: str) -> Iterator[None]:
+    """Bloğun süresini süren isteğin kaydına "<name>_ms" olarak ekler (aynı aşama tekrarlanırsa toplanır)."""
+    rec = _TIMINGS.get()
+    if rec is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        key = f"{name}_ms"
+        rec[key] = rec.get(key, 0.0) + (time.perf_counter() - t0) * 1000.0
 
-        fixed.append(ln)
-        i += 1
 
-    # Madde listesine dönüştür
-    out = ("- " + "\n- ".join(fixed)) if fixed else text
+def _note(**fields: Any) -> None:
+    """Süren isteğin kaydına bayrak/sayaç yazar (kayıt yoksa hiçbir şey yapmaz)."""
+    rec = _TIMINGS.get()
+    if rec is not None:
+        rec.update(fields)
+
+
+def _note_usage(out: Any) -> None:
+    """chat_completion yanıtındaki usage alanından token sayıları."""
+    usage = getattr(out, "usage", None) or (out.get("usage") if isinstance(out, dict) else None)
+    if usage is None:
+        return
+    get = usage.get if isinstance(usage, dict) else lambda k: getattr(usage, k, None)
+    prompt_tokens, completion_tokens = get("prompt_tokens"), get("completion_tokens")
+    if prompt_tokens is not None:
+        _note(prompt_tokens=int(prompt_tokens))
+    if completion_tokens is not None:
+        _note(completion_tokens=int(completion_tokens))
+
+
+def _finish_timings(rec: Dict[str, Any], started: float, path: str) -> Dict[str, Any]:
+    """Kaydı kapatır: toplam süre, histogramlar ve token sayaçları."""
+    total = time.perf_counter() - started
+    rec["total_ms"] = total * 1000.0
+    _REQUEST_SECONDS.observe(total, path=path)
+    for key, value in rec.items():
+        if key in _NON_STAGE_SECONDS:
+            _NON_STAGE_SECONDS[key].observe(value / 1000.0)
+        elif key.endswith("_ms") and key != "total_ms":
+            _STAGE_SECONDS.observe(value / 1000.0, stage=key[:-3])
+    for kind in ("prompt", "completion"):
+        if rec.get(f"{kind}_tokens"):
+            _LLM_TOKENS.inc(rec[f"{kind}_tokens"], kind=kind)
+    return {k: round(v, 2) if isinstance(v, float) else v for k, v in rec.items()}
+
+
+# chat uç noktası olmayan / chat şablonu bulunmayan model hataları (TGI, Inference API, SDK)
+_UNSUPPORTED_RE = re.compile(
+    r"chat[ _]?template|template error|not a chat model|conversational|"
+    r"(does not|doesn't|not) support(ed)?\b.*chat|chat\b.*not supported",
+    re.IGNORECASE,
+)
+
+
+def _error_kind(exc: BaseException) -> str:
+    """
+    HF çağrı hatasını sınıflandırır:
+    - "transient": zaman aşımı, taşıma katmanı hatası (httpx TransportError, OSError),
+      408/425/429, 5xx → yeniden dene
+    - "unsupported": 404/405/501 ya da tanınan "chat modeli değil / chat şablonu yok" hatası
+      → diğer uç noktaya düş
+    - "fatal": diğerleri (401/403, prompt çok uzun gibi 400/422, bilinmeyen hata) → yüzeye çıkar;
+      tek bir kötü istek modelin yeteneğini değiştirmesin
+    """
+    status = getattr(getattr(exc, "response", None), "status_code", None)
+    if isinstance(status, int):
+        if status in (408, 425, 429) or status >= 500 and status != 501:
+            return "transient"
+        if status in (404, 405, 501):
+            return "unsupported"
+    elif isinstance(exc, (TimeoutError, OSError, _HttpxTransportError)) or "Timeout" in type(exc).__name__:
+        return "transient"
+    if _UNSUPPORTED_RE.search(str(exc)):
+        return "unsupported"
+    return "fatal"
+
 
-    # Mini egzersiz ekle (yoksa)
-    if "egzersiz" not in out.lower():
-        out += "\n\nMini egzersiz: 2 dakika nefesine odaklan; her nefeste 4'e kadar say."
+def _capability(model_id: str) -> Optional[str]:
+    if _FORCED_MODE in ("chat", "text"):
+        return _FORCED_MODE
+    with _CAP_LOCK:
+        return _CAPABILITIES.get(model_id)
 
-    return out.strip()
+
+def _remember_capability(model_id: str, mode: str) -> None:
+    with _CAP_LOCK:
+        _CAPABILITIES[model_id] = mode
+
+
+def _prime(events: Any, extract: Callable[[Any], str]) -> Tuple[Optional[str], Iterator[Any]]:
+    """Akışı ilk boş olmayan token'a kadar ilerletir (bağlantı/uç nokta hataları burada çıkar)."""
+    it = iter(events)
+    for ev in it:
+        token = extract(ev)
+        if token:
+            return token, it
+    return None, it
 
 
 class HFClientLLM(LLM):
     """
     Hugging Face Inference API adaptörü.
     - Önce chat_completion kullanır (Qwen gibi sohbet-tabanlı modeller için ideal).
-    - chat_completion başarısız olursa text_generation'a geri düşer.
+    - chat_completion desteklenmiyorsa text_generation'a geri düşer ve bunu model başına
+      hatırlar; sonraki isteklerde başarısız ön deneme yapılmaz.
+    - Geçici hatalar (zaman aşımı, 429, 5xx) max_retries kez, üstel beklemeyle tekrar denenir.
     - LangChain LLM arayüzünü uygular: .invoke / _call üzerinden string alır, string döner.
+    - .stream / _stream: aynı yolları stream=True ile çağırır, ham token parçaları üretir.
+    - .ainvoke / _acall: async_client (AsyncInferenceClient) verilmişse aynı mantık thread
+      tutmadan çalışır; verilmemişse _call bir thread'de çalışır.
+    - admission verilmişse her HF çağrısı (akışta akış bitene kadar) kuyruktan yer alır;
+      kuyrukta geçen süre timings'e "queue_ms" olarak yazılır.
     """
     client: InferenceClient
+    async_client: Optional[AsyncInferenceClient] = None
     max_new_tokens: int = 160
     temperature: float = 0.2
     top_p: float = 0.8
     repetition_penalty: float = 1.08
+    max_retries: int = LLM_MAX_RETRIES
+    retry_backoff: float = LLM_RETRY_BACKOFF
+    admission: Optional[AdmissionQueue] = None
 
     @property
     def _llm_type(self) -> str:
         return "hf_inferenceclient"
 
-    def _call(self, prompt: str, stop: Optional[List[str]] = None, **kwargs: Any) -> str:
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        # Aynı parametrelerle yapılan çağrılar aynı çıktıyı üretir (tek uçuş anahtarı, önbellek)
+        return {
+            "model": self._model_id(),
+            "max_new_tokens": self.max_new_tokens,
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            "repetition_penalty": self.repetition_penalty,
+        }
+
+    def _messages(self, prompt: str) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": SYSTEM_TR},
+            {"role": "user", "content": prompt},
+        ]
+
+    def _tg_prompt(self, prompt: str) -> str:
+        return f"{SYSTEM_TR}\n\nKullanıcı mesajı:\n{prompt}\n\nYanıt:"
+
+    def _model_id(self) -> str:
+        return getattr(self.client, "model", None) or "default"
+
+    def _should_retry(self, exc: Exception, attempt: int, mode: str) -> float:
+        """Yeniden denenecekse beklenecek süre (sn), denenmeyecekse -1."""
+        kind = _error_kind(exc)
+        _LLM_ERRORS.inc(mode=mode, kind=kind)
+        if kind != "transient" or attempt >= self.max_retries:
+            return -1.0
+        _LLM_RETRIES.inc(mode=mode)
+        rec = _TIMINGS.get()
+        if rec is not None:
+            rec["llm_retries"] = rec.get("llm_retries", 0) + 1
+        return self.retry_backoff * (2 ** attempt) * random.uniform(0.75, 1.25)
+
+    def _with_retries(self, fn: Callable[[], Any], mode: str) -> Any:
+        """fn'i çağırır; yalnızca geçici hatalarda üstel bekleme (+ jitter) ile yeniden dener."""
+        attempt = 0
+        while True:
+            try:
+                return fn()
+            except Exception as e:
+                delay = self._should_retry(e, attempt, mode)
+                if delay < 0:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+
+    async def _awith_retries(self, fn: Callable[[], Any], mode: str) -> Any:
+        """_with_retries'in async karşılığı (fn bir coroutine döner; bekleme event loop'u tutmaz)."""
+        attempt = 0
+        while True:
+            try:
+                return await fn()
+            except Exception as e:
+                delay = self._should_retry(e, attempt, mode)
+                if delay < 0:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    def _fall_back_to_text(self, model_id: str, exc: Exception, started: float) -> None:
+        """chat hatası "desteklenmiyor" değilse hatayı yükseltir; değilse geri düşmeyi kaydeder."""
+        if _error_kind(exc) != "unsupported":
+            raise exc
+        _LLM_FALLBACKS.inc(model=model_id)
+        _LLM_FALLBACK_SECONDS.observe(time.perf_counter() - started, model=model_id)
+        _note(llm_fallback=True)
+
+    @staticmethod
+    def _text_works(model_id: str, exc: Exception) -> None:
+        """Geri düşülen text_generation başarılı: yetenek ancak şimdi hatırlanır."""
+        _remember_capability(model_id, "text")
+        print(f"[HF] {model_id}: chat_completion desteklenmiyor ({type(exc).__name__}); text_generation kullanılacak.")
+
+    def _chat_or_text(self, chat_fn: Callable[[], Any], text_fn: Callable[[], Any]) -> Any:
         """
-        Tek bir string prompt alır ve modelden yanıt üretir.
-        stop: (opsiyonel) durdurma dizeleri içeriyorsa çıktıyı bu dizelerden önce keser.
+        Modelin bilinen yeteneğine göre doğru uç noktayı çağırır.
+        Yetenek bilinmiyorsa chat denenir; "desteklenmiyor" hatasında text'e düşülür ve
+        text_generation başarılı olursa hatırlanır.
         """
-        try:
-            # 1) Sohbet arayüzü (tercih edilen yol)
-            out = self.client.chat_completion(
-                messages=[
-                    {"role": "system", "content": SYSTEM_TR},
-                    {"role": "user", "content": prompt},
-                ],
-                max_tokens=self.max_new_tokens,
-                temperature=self.temperature,
-                top_p=self.top_p,
-            )
-            choice = out.choices[0]
-            msg: Dict[str, Any] = getattr(choice, "message", choice.get("message", {}))  # SDK sürüm uyumu
-            text = getattr(msg, "content", None) or msg.get("content") or str(out)
-        except Exception:
-            # 2) text_generation'a düş (bazı modellerde yalnızca bu desteklenir)
-            out = self.client.text_generation(
-                prompt=f"{SYSTEM_TR}\n\nKullanıcı mesajı:\n{prompt}\n\nYanıt:",
-                max_new_tokens=self.max_new_tokens,
-                temperature=self.temperature,
-                top_p=self.top_p,
-                repetition_penalty=self.repetition_penalty,
-                do_sample=True,
-            )
-            text = out if isinstance(out, str) else str(out)
+        model_id = self._model_id()
+        chat_error: Optional[Exception] = None
+        if _capability(model_id) != "text":
+            t0 = time.perf_counter()
+            try:
+                out = self._with_retries(chat_fn, "chat")
+            except Exception as e:
+                self._fall_back_to_text(model_id, e, t0)
+                chat_error = e
+            else:
+                if _capability(model_id) is None:
+                    _remember_capability(model_id, "chat")
+                _note(llm_mode="chat")
+                return out
+        out = self._with_retries(text_fn, "text")
+        if chat_error is not None:
+            self._text_works(model_id, chat_error)
+        _note(llm_mode="text")
+        return out
+
+    async def _achat_or_text(self, chat_fn: Callable[[], Any], text_fn: Callable[[], Any]) -> Any:
+        model_id = self._model_id()
+        chat_error: Optional[Exception] = None
+        if _capability(model_id) != "text":
+            t0 = time.perf_counter()
+            try:
+                out = await self._awith_retries(chat_fn, "chat")
+            except Exception as e:
+                self._fall_back_to_text(model_id, e, t0)
+                chat_error = e
+            else:
+                if _capability(model_id) is None:
+                    _remember_capability(model_id, "chat")
+                _note(llm_mode="chat")
+                return out
+        out = await self._awith_retries(text_fn, "text")
+        if chat_error is not None:
+            self._text_works(model_id, chat_error)
+        _note(llm_mode="text")
+        return out
+
+    def _chat_kwargs(self, prompt: str) -> Dict[str, Any]:
+        return {
+            "messages": self._messages(prompt),
+            "max_tokens": self.max_new_tokens,
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+        }
+
+    def _tg_kwargs(self, prompt: str) -> Dict[str, Any]:
+        return {
+            "prompt": self._tg_prompt(prompt),
+            "max_new_tokens": self.max_new_tokens,
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            "repetition_penalty": self.repetition_penalty,
+            "do_sample": True,
+        }
+
+    def _chat_text(self, prompt: str) -> str:
+        out = self.client.chat_completion(**self._chat_kwargs(prompt))
+        _note_usage(out)
+        return _chat_content(out)
 
+    def _generated_text(self, prompt: str) -> str:
+        out = self.client.text_generation(**self._tg_kwargs(prompt))
+        return out if isinstance(out, str) else str(out)
+
+    def _finish(self, text: str, stop: Optional[List[str]]) -> str:
         # Çıktıyı sadeleştir
         text = _postprocess(text)
 
@@ -148,6 +537,133 @@ class HFClientLLM(LLM):
                     text = text.split(s)[0]
         return text
 
+    @contextmanager
+    def _admitted(self) -> Iterator[None]:
+        """Kabul kuyruğundan yer alır (kuyruk yoksa doğrudan geçer)."""
+        if self.admission is None:
+            yield
+            return
+        with self.admission.slot() as ticket:
+            _note(queue_ms=ticket.waited_ms, queue_position=ticket.position)
+            yield
+
+    @asynccontextmanager
+    async def _aadmitted(self) -> AsyncIterator[None]:
+        if self.admission is None:
+            yield
+            return
+        async with self.admission.aslot() as ticket:
+            _note(queue_ms=ticket.waited_ms, queue_position=ticket.position)
+            yield
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, **kwargs: Any) -> str:
+        """
+        Tek bir string prompt alır ve modelden yanıt üretir.
+        stop: (opsiyonel) durdurma dizeleri içeriyorsa çıktıyı bu dizelerden önce keser.
+        """
+        # 1) Sohbet arayüzü (tercih edilen yol)  2) text_generation (bazı modellerde yalnızca bu var)
+        with self._admitted(), _stage("llm"):
+            text = self._chat_or_text(lambda: self._chat_text(prompt), lambda: self._generated_text(prompt))
+        with _stage("postprocess"):
+            return self._finish(text, stop)
+
+    async def _acall(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        """
+        _call'un async karşılığı: HTTP çağrısı AsyncInferenceClient ile event loop'ta bekler.
+        Görev iptal edilirse (CancelledError) istek de iptal olur.
+        """
+        aclient = self.async_client
+        if aclient is None:
+            return await asyncio.to_thread(self._call, prompt, stop, **kwargs)
+
+        async def chat() -> str:
+            out = await aclient.chat_completion(**self._chat_kwargs(prompt))
+            _note_usage(out)
+            return _chat_content(out)
+
+        async def text() -> str:
+            out = await aclient.text_generation(**self._tg_kwargs(prompt))
+            return out if isinstance(out, str) else str(out)
+
+        async with self._aadmitted():
+            with _stage("llm"):
+                raw = await self._achat_or_text(chat, text)
+        with _stage("postprocess"):
+            return self._finish(raw, stop)
+
+    def _stream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[GenerationChunk]:
+        """
+        Token akışı: ham parçalar üretir (temizlik çağıranda, _StreamPostprocessor ile).
+        Uç nokta seçimi ve yeniden denemeler ilk token'a kadar geçerlidir; akış başladıktan
+        sonraki hatalar yeniden denenmez (kullanıcı aynı metni iki kez görmesin).
+        """
+        for token in self._stream_tokens(prompt):
+            chunk = GenerationChunk(text=token)
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    def _stream_tokens(self, prompt: str) -> Iterator[str]:
+        def open_chat() -> Tuple[Optional[str], Iterator[Any], Callable[[Any], str]]:
+            events = self.client.chat_completion(**self._chat_kwargs(prompt), stream=True)
+            return (*_prime(events, _delta_text), _delta_text)
+
+        def open_text() -> Tuple[Optional[str], Iterator[Any], Callable[[Any], str]]:
+            events = self.client.text_generation(**self._tg_kwargs(prompt), stream=True)
+            return (*_prime(events, _tg_token_text), _tg_token_text)
+
+        with self._admitted():
+            t0 = time.perf_counter()
+            first, rest, extract = self._chat_or_text(open_chat, open_text)
+            _note(ttft_ms=(time.perf_counter() - t0) * 1000.0)
+            count = 0
+            if first:
+                count += 1
+                yield first
+            for ev in rest:
+                token = extract(ev)
+                if token:
+                    count += 1
+                    yield token
+        _note(completion_tokens=count)  # akışta her olay bir token
+
+
+def _chat_content(out: Any) -> str:
+    """chat_completion yanıtından mesaj metni (SDK sürümüne göre nesne ya da dict)."""
+    choice = out.choices[0]
+    msg: Dict[str, Any] = getattr(choice, "message", None) or choice.get("message", {})  # SDK sürüm uyumu
+    return getattr(msg, "content", None) or (msg.get("content") if isinstance(msg, dict) else None) or str(out)
+
+
+def _tg_token_text(ev: Any) -> str:
+    """text_generation akış olayı: details=False iken str; bazı sürümlerde token nesnesi döner."""
+    return ev if isinstance(ev, str) else getattr(getattr(ev, "token", None), "text", "") or ""
+
+
+def _delta_text(ev: Any) -> str:
+    """chat_completion akış olayından yeni metin parçasını çıkarır (SDK sürüm uyumu)."""
+    choices = getattr(ev, "choices", None) or (ev.get("choices") if isinstance(ev, dict) else None) or []
+    if not choices:
+        return ""
+    choice = choices[0]
+    delta = getattr(choice, "delta", None) or (choice.get("delta") if isinstance(choice, dict) else None) or {}
+    content = getattr(delta, "content", None)
+    if content is None and isinstance(delta, dict):
+        content = delta.get("content")
+    return content or ""
+
 
 def make_llm() -> HFClientLLM:
     """
@@ -165,9 +681,148 @@ def make_llm() -> HFClientLLM:
         raise RuntimeError("HF token yok. HF_TOKEN (veya HUGGINGFACEHUB_API_TOKEN/HF_API_TOKEN) ekleyin.")
 
     model_id = os.getenv("HF_MODEL", "Qwen/Qwen2.5-7B-Instruct")
-    client = InferenceClient(model=model_id, token=token)
+    client = InferenceClient(model=model_id, token=token, timeout=LLM_TIMEOUT)
+    # ainvoke/abatch için: HTTP çağrıları event loop'ta bekler, istek başına thread tutulmaz
+    async_client = AsyncInferenceClient(model=model_id, token=token, timeout=LLM_TIMEOUT)
     print(f"[HF] Using model: {model_id}")
-    return HFClientLLM(client=client)
+    # Süreç genelinde tek kuyruk: tüm oturumların HF çağrıları aynı sınırı paylaşır
+    return HFClientLLM(client=client, async_client=async_client, admission=make_admission_queue())
+
+
+# ---- Tek uçuş (single-flight): aynı anda gelen özdeş istekleri birleştirme ----
+
+_COALESCED = metrics.counter(
+    "focusia_singleflight_shared_total", "Süren özdeş bir isteğin sonucunu paylaşan çağrılar"
+)
+_FLIGHT_TIMEOUTS = metrics.counter(
+    "focusia_singleflight_timeout_total", "Lideri beklemeyi bırakıp isteği kendisi yürüten takipçiler"
+)
+
+# Takipçinin lideri en fazla bekleme süresi: liderin en kötü durumu (kuyruk + tüm denemeler + beklemeler).
+# Lider takılırsa (örn. yanıt vermeyen bağlantı) takipçi bu süreden sonra isteği kendisi yürütür.
+FLIGHT_WAIT_TIMEOUT = (
+    ADMISSION_TIMEOUT
+    + (LLM_MAX_RETRIES + 1) * LLM_TIMEOUT
+    + LLM_RETRY_BACKOFF * (2 ** LLM_MAX_RETRIES - 1)
+)
+
+
+def _normalize_query(q: str) -> str:
+    """Tek uçuş anahtarı için sorgu: boşluklar sadeleşir, büyük/küçük harf (Türkçe İ/I dahil) yok sayılır."""
+    return " ".join(q.replace("İ", "i").replace("I", "ı").split()).casefold()
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error", "abandoned")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[dict] = None
+        self.error: Optional[BaseException] = None
+        self.abandoned = False
+
+
+class _FlightTimeout(Exception):
+    """Takipçi lideri FLIGHT_WAIT_TIMEOUT boyunca bekledi; istek bağımsız yürütülmeli."""
+
+
+class _SingleFlight:
+    """
+    Anahtar başına en fazla bir süren iş. İlk gelen (lider) işi yürütür; aynı anahtarla
+    gelenler (takipçiler) bitmesini bekleyip sonucu/hatayı paylaşır. Lider yarıda bırakırsa
+    (örn. akış okuyucusu ayrıldı) takipçiler işi kendileri yürütür; lider FLIGHT_WAIT_TIMEOUT
+    içinde bitmezse takipçi uçuşa bağlanmadan kendi isteğini yürütür.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[Any, _Flight] = {}
+
+    def begin(self, key: Any) -> Tuple[_Flight, bool]:
+        """(uçuş, lider_mi)"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight, False
+            flight = self._flights[key] = _Flight()
+            return flight, True
+
+    def finish(
+        self,
+        key: Any,
+        flight: _Flight,
+        result: Optional[dict] = None,
+        error: Optional[BaseException] = None,
+        abandoned: bool = False,
+    ) -> None:
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.result, flight.error, flight.abandoned = result, error, abandoned
+        flight.done.set()
+
+    def wait(self, flight: _Flight, timeout: Optional[float] = FLIGHT_WAIT_TIMEOUT) -> Optional[dict]:
+        """
+        Liderin sonucunun kopyası; lider yarıda bıraktıysa None. Liderin hatası aynen yükselir.
+        Lider timeout içinde bitmezse _FlightTimeout yükselir (çağıran isteği kendisi yürütür).
+        """
+        if not flight.done.wait(timeout):
+            _FLIGHT_TIMEOUTS.inc()
+            _note(coalesce_timeout=True)
+            raise _FlightTimeout()
+        if flight.error is not None:
+            raise flight.error
+        if flight.abandoned or flight.result is None:
+            return None
+        _COALESCED.inc()
+        _note(coalesced=True)
+        return dict(flight.result)
+
+    def do(self, key: Any, fn: Callable[[], dict]) -> dict:
+        while True:
+            flight, leader = self.begin(key)
+            if not leader:
+                try:
+                    shared = self.wait(flight)
+                except _FlightTimeout:
+                    return dict(fn())  # takılı liderden bağımsız; uçuş liderde kalır
+                if shared is not None:
+                    return shared
+                continue
+            try:
+                result = fn()
+            except Exception as e:
+                self.finish(key, flight, error=e)
+                raise
+            except BaseException:  # KeyboardInterrupt vb.: takipçiler kendileri denesin
+                self.finish(key, flight, abandoned=True)
+                raise
+            self.finish(key, flight, result=result)
+            return dict(result)
+
+
+class _AsyncRunner:
+    """
+    Arka planda tek bir event loop çalıştıran daemon thread. Streamlit oturumları (her biri
+    kendi script thread'inde) async işleri buraya gönderir; tüm süren HTTP çağrıları bu
+    tek loop'ta bekler.
+    """
+    _instance: Optional["_AsyncRunner"] = None
+    _lock = threading.Lock()
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="focusia-async", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def get(cls) -> "_AsyncRunner":
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def submit(self, coro: Any) -> "concurrent.futures.Future":
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
 
 
 # ---- Basit, bağımsız RAG zinciri (chains modülüne ihtiyaç yok) ----
@@ -185,11 +840,43 @@ class _SimpleRAGAdapter:
       (hem .get_relevant_documents hem de .invoke çağrıları denenir)
     - llm: HFClientLLM (string alır, string döner)
     - prompt: PromptTemplate (değişkenler: {context}, {input}/{question})
+    - answer_cache: (opsiyonel) AnswerCache; benzer sorgu + aynı kaynak kümesinde LLM çağrılmaz
+    - packer: (opsiyonel) ContextPacker; verilmezse tüm belgeler _format_docs ile birleştirilir.
+      Verilirse source_documents, bağlama gerçekten giren belgelerdir.
+    - retrieval_cache: (opsiyonel) RetrievalCache; aynı sorgu tekrar gelince model ve arama atlanır
+    - payload["profile"]: True ise invoke/stream isteği profiller; ainvoke/abatch/submit profil almaz
     """
-    def __init__(self, retriever, llm: LLM, prompt: PromptTemplate):
+    def __init__(
+        self,
+        retriever,
+        llm: LLM,
+        prompt: PromptTemplate,
+        answer_cache: Optional[AnswerCache] = None,
+        packer: Optional[ContextPacker] = None,
+        retrieval_cache: Optional[RetrievalCache] = None,
+    ):
         self.retriever = retriever
         self.llm = llm
         self.prompt = prompt
+        self.answer_cache = answer_cache
+        self.packer = packer
+        self.retrieval_cache = retrieval_cache
+        self._flights = _SingleFlight()
+        # async yol: (loop, anahtar) → [ortak görev, bekleyen sayısı]; submit: oturum → future
+        self._aflights: Dict[Any, List[Any]] = {}
+        self._submitted: Dict[Any, "concurrent.futures.Future"] = {}
+        self._submit_lock = threading.Lock()
+
+    def with_retriever(self, retriever) -> "_SimpleRAGAdapter":
+        """Aynı LLM, prompt ve önbelleklerle başka bir retriever kullanan zincir (ör. parça alt kümesi)."""
+        return _SimpleRAGAdapter(
+            retriever,
+            self.llm,
+            self.prompt,
+            answer_cache=self.answer_cache,
+            packer=self.packer,
+            retrieval_cache=self.retrieval_cache,
+        )
 
     def _retrieve(self, q: str) -> List:
         """
@@ -214,22 +901,408 @@ class _SimpleRAGAdapter:
             return res
         return [res]  # tek dökümanı listeye sar
 
+    def _embed_and_retrieve(self, q: str) -> Tuple[Optional[List[float]], List]:
+        """
+        Sorguyu bir kez gömer ve aramayı bu vektörle yapar (vektör önbellek için de kullanılır;
+        HybridRetriever'da BM25 tarafı sorgu metniyle aranır).
+        retriever bir vectorstore'a (Chroma / NumpyVectorIndex) bağlı değilse ya da arama
+        türü vektörle yapılamıyorsa düz _retrieve'e düşer ve vektör None döner.
+        """
+        emb = self._query_embeddings()
+        if emb is None:
+            with _stage("retrieve"):  # gömme retriever'ın içinde, ayrı ölçülemez
+                return None, self._retrieve(q)
+        cache = self.retrieval_cache
+        if cache is None:
+            with _stage("embed"):
+                vec = emb.embed_query(q)
+            with _stage("retrieve"):
+                return vec, self._search_vector(vec, q)
+
+        qkey = cache.query_key(q)
+        with _stage("embed"):
+            vec = cache.get_embedding(qkey)
+            if vec is None:
+                vec = emb.embed_query(q)
+                cache.put_embedding(qkey, vec)
+        with _stage("retrieve"):
+            rkey = cache.result_key(qkey, self.retriever)
+            docs = cache.get_docs(rkey)
+            _note(retrieval_cache_hit=docs is not None)
+            if docs is None:
+                docs = self._search_vector(vec, q)
+                cache.put_docs(rkey, docs)
+        return vec, docs
+
+    def _query_embeddings(self) -> Any:
+        """Vektörle arama yapılabiliyorsa vectorstore'un embedding nesnesi, yoksa None."""
+        vs = getattr(self.retriever, "vectorstore", None)
+        if getattr(self.retriever, "search_type", None) not in ("mmr", "similarity"):
+            return None
+        return getattr(vs, "embeddings", None)
+
+    def _search_vector(self, vec: List[float], q: str = "") -> List:
+        if hasattr(self.retriever, "search_hybrid"):  # HybridRetriever / ShardedRetriever: BM25 sorgu metnini de ister
+            return self.retriever.search_hybrid(q, vec)
+        if hasattr(self.retriever, "search_by_vector"):  # NumpyRetriever
+            return self.retriever.search_by_vector(vec)
+        vs = self.retriever.vectorstore
+        kw = getattr(self.retriever, "search_kwargs", None) or {}
+        if self.retriever.search_type == "mmr":
+            return vs.max_marginal_relevance_search_by_vector(
+                vec, k=kw.get("k", 4), fetch_k=kw.get("fetch_k", 20), lambda_mult=kw.get("lambda_mult", 0.5)
+            )
+        return vs.similarity_search_by_vector(vec, k=kw.get("k", 4))
+
+    def _search_many(self, qs: List[str]) -> Tuple[Optional[List[List[float]]], List[List]]:
+        """
+        Toplu arama: sorgular tek batch'te gömülür, arama vektörize yapılır
+        (NumpyRetriever.search_by_vectors ya da tek Chroma collection.query).
+        retrieval_cache varsa yalnızca önbellekte olmayan sorgular gömülür / aranır.
+        """
+        emb = self._query_embeddings()
+        if emb is None:
+            return None, [self._retrieve(q) for q in qs]
+        cache = self.retrieval_cache
+        qkeys = [cache.query_key(q) for q in qs] if cache is not None else []
+        embed_many = getattr(emb, "embed_queries", None) or emb.embed_documents
+        with _stage("embed"):
+            vecs = [cache.get_embedding(k) for k in qkeys] if cache is not None else [None] * len(qs)
+            missing = [i for i, v in enumerate(vecs) if v is None]
+            if missing:
+                for i, vec in zip(missing, embed_many([qs[i] for i in missing])):
+                    vecs[i] = vec
+                    if cache is not None:
+                        cache.put_embedding(qkeys[i], vec)
+        with _stage("retrieve"):
+            if cache is None:
+                return vecs, self._search_vectors(qs, vecs)
+            rkeys = [cache.result_key(k, self.retriever) for k in qkeys]
+            docs_list = [cache.get_docs(k) for k in rkeys]
+            missing = [i for i, d in enumerate(docs_list) if d is None]
+            _note(retrieval_cache_hits=len(qs) - len(missing))
+            if missing:
+                found = self._search_vectors([qs[i] for i in missing], [vecs[i] for i in missing])
+                for i, docs in zip(missing, found):
+                    docs_list[i] = docs
+                    cache.put_docs(rkeys[i], docs)
+            return vecs, docs_list
+
+    def _search_vectors(self, qs: List[str], vecs: List[List[float]]) -> List[List]:
+        """Gömülmüş sorgular için vektörize arama (_search_many'nin arama kısmı)."""
+        if hasattr(self.retriever, "search_hybrid"):
+            return [self.retriever.search_hybrid(q, v) for q, v in zip(qs, vecs)]
+        if hasattr(self.retriever, "search_by_vectors"):
+            return self.retriever.search_by_vectors(vecs)
+        vs = self.retriever.vectorstore
+        if hasattr(vs, "_collection"):  # LangChain Chroma
+            kw = getattr(self.retriever, "search_kwargs", None) or {}
+            return chroma_search_by_vectors(vs, vecs, self.retriever.search_type, kw)
+        return [self._search_vector(v, q) for q, v in zip(qs, vecs)]
+
+    def _prepare(self, q: str) -> Tuple[List, str, Optional[str], Optional[List[float]], str]:
+        """Arama + prompt; önbellek açıksa (docs, prompt, önbellekteki yanıt, vektör, kaynak anahtarı)."""
+        vec, docs = self._embed_and_retrieve(q)
+        return self._prepare_with(q, docs, vec)
+
+    def _prepare_with(self, q: str, docs: List, vec: Optional[List[float]]) -> Tuple[List, str, Optional[str], Optional[List[float]], str]:
+        """Arama sonucu hazırsa prompt + önbellek bakışı (_prepare ile aynı dönüş)."""
+        with _stage("format"):
+            if self.packer is None:
+                context = _format_docs(docs)
+            else:
+                packed = self.packer.pack(docs)
+                docs, context = packed.docs, packed.text
+                _note(**packed.timings())
+            filled = self.prompt.format(context=context, input=q, question=q)
+        if vec is None or self.answer_cache is None:
+            return docs, filled, None, None, ""
+        with _stage("cache"):
+            skey = source_key(docs)
+            cached = self.answer_cache.get(vec, skey)
+        _note(cache_hit=cached is not None)
+        return docs, filled, cached, vec, skey
+
+    def _remember(self, vec: Optional[List[float]], skey: str, answer: str) -> None:
+        if vec is not None and self.answer_cache is not None:
+            self.answer_cache.put(vec, skey, answer)
+
+    def _flight_key(self, q: str) -> Tuple[str, str]:
+        """Normalize sorgu + model parametreleri: aynı anahtar = aynı yanıt."""
+        params = getattr(self.llm, "_identifying_params", None) or {}
+        return _normalize_query(q), json.dumps(params, sort_keys=True, default=str)
+
     def invoke(self, payload: dict):
         """
         Dış arayüz:
-        payload: {'query': '...'} veya {'input': '...'}
-        Dönüş: {'result': <model çıktısı>, 'source_documents': <bağlam belgeleri>}
+        payload: {'query': '...'} veya {'input': '...'}; "profile": True bu isteği profiller
+        Dönüş: {'result': <model çıktısı>, 'source_documents': <bağlam belgeleri>,
+                'timings': <aşama süreleri (ms), token sayıları, bayraklar>}
+        Aynı anda gelen özdeş sorgular (tüm Streamlit oturumlarında) tek bir
+        arama + üretimi bekler ve sonucunu paylaşır.
         """
         q = payload.get("query") or payload.get("input") or ""
-        docs = self._retrieve(q)
-        context = _format_docs(docs)
+        with profiler.session("invoke", force=payload.get("profile")):
+            return self._timed("invoke", lambda: self._flights.do(self._flight_key(q), lambda: self._answer(q)))
+
+    @staticmethod
+    def _timed(path: str, fn: Callable[[], dict], seed: Optional[Dict[str, Any]] = None) -> dict:
+        """fn'i yeni bir zamanlama kaydıyla çalıştırır; sonuca "timings" ekler."""
+        rec: Dict[str, Any] = dict(seed or {})
+        t0 = time.perf_counter()
+        token = _TIMINGS.set(rec)
+        try:
+            result = fn()
+        finally:
+            _TIMINGS.reset(token)
+        result["timings"] = _finish_timings(rec, t0, path)
+        return result
 
-        # Prompt'u doldur ve LLM'yi çağır
-        filled = self.prompt.format(context=context, input=q, question=q)
-        answer = self.llm.invoke(filled)
+    def _answer(self, q: str) -> dict:
+        return self._generate(*self._prepare(q))
+
+    def _invoke_llm(self, filled: str) -> str:
+        if isinstance(self.llm, HFClientLLM):  # llm/postprocess aşamalarını kendisi ölçer
+            return self.llm.invoke(filled)
+        with _stage("llm"):
+            return self.llm.invoke(filled)
+
+    def _generate(self, docs: List, filled: str, cached: Optional[str], vec: Optional[List[float]], skey: str) -> dict:
+        if cached is not None:
+            return {"result": cached, "source_documents": docs}
+
+        # LLM'yi çağır
+        answer = self._invoke_llm(filled)
+        self._remember(vec, skey, answer)
 
         return {"result": answer, "source_documents": docs}
 
+    def batch(self, queries: List[Any], max_concurrency: int = BATCH_CONCURRENCY) -> List[dict]:
+        """
+        Toplu çağrı (çevrimdışı değerlendirme, önceden üretim).
+        queries: string ya da invoke payload'ı ({'query': ...}) listesi
+        - Tüm sorgular tek embedding çağrısıyla gömülür, arama vektörize yapılır.
+        - LLM çağrıları en fazla max_concurrency thread'li bir havuzdan gider.
+        Dönüş: girişle aynı sırada invoke sözlükleri; hata alan öğe istisnayı fırlatmaz,
+        sözlüğünde 'error' (istisna nesnesi) taşır ve 'result' None olur. Toplu gömme/arama
+        süreleri her öğenin timings["batch_search"] alanında (tüm batch için) yer alır.
+        """
+        qs = [q if isinstance(q, str) else (q.get("query") or q.get("input") or "") for q in queries]
+        if not qs:
+            return []
+        search_rec: Dict[str, Any] = {}
+        t0 = time.perf_counter()
+        token = _TIMINGS.set(search_rec)
+        try:
+            vecs, docs_list = self._search_many(qs)
+        except Exception as e:
+            print(f"[Batch] Toplu arama başarısız, sorgu başına aramaya geçiliyor: {e}")
+            vecs, docs_list = None, None
+        finally:
+            _TIMINGS.reset(token)
+        seed = {"batch_size": len(qs), "batch_search": _finish_timings(search_rec, t0, "batch_search")}
+
+        def run(i: int) -> dict:
+            q = qs[i]
+            try:
+                if docs_list is None:
+                    return self.invoke({"query": q})
+                return self._timed("batch", lambda: self._flights.do(
+                    self._flight_key(q),
+                    lambda: self._generate(*self._prepare_with(q, docs_list[i], vecs[i] if vecs is not None else None)),
+                ), seed)
+            except Exception as e:
+                docs = docs_list[i] if docs_list is not None else []
+                return {"result": None, "source_documents": docs, "error": e}
+
+        workers = max(1, min(int(max_concurrency), len(qs)))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="focusia-batch") as pool:
+            return list(pool.map(run, range(len(qs))))
+
+    async def ainvoke(self, payload: dict) -> dict:
+        """
+        invoke'un async karşılığı (aynı payload ve dönüş).
+        - Arama (embedding + vektör araması) bir thread'de, üretim HFClientLLM.ainvoke ile
+          (AsyncInferenceClient) event loop'ta bekler.
+        - Aynı loop'taki özdeş istekler tek görevi paylaşır; bekleyenlerin hepsi iptal
+          edilirse görev (ve HTTP isteği) de iptal edilir.
+        - payload["profile"] yok sayılır: profil yalnızca invoke/stream'de alınır (event loop
+          thread'i paylaşıldığı için örnekler tek isteğe ait olmaz). Profil isteyen invoke çağırmalı.
+        """
+        q = payload.get("query") or payload.get("input") or ""
+        key = (id(asyncio.get_running_loop()),) + self._flight_key(q)
+        rec: Dict[str, Any] = {}
+        t0 = time.perf_counter()
+        token = _TIMINGS.set(rec)  # görev oluşturulurken bağlamla birlikte kopyalanır
+        try:
+            entry = self._aflights.get(key)
+            if entry is None:
+                task = asyncio.ensure_future(self._aanswer(q))
+                entry = self._aflights[key] = [task, 0]
+                task.add_done_callback(lambda _t, k=key, e=entry: self._aflights.pop(k) if self._aflights.get(k) is e else None)
+            else:
+                _COALESCED.inc()
+                rec["coalesced"] = True
+        finally:
+            _TIMINGS.reset(token)
+        entry[1] += 1
+        try:
+            result = dict(await asyncio.shield(entry[0]))
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and not entry[0].done():
+                entry[0].cancel()
+        result["timings"] = _finish_timings(rec, t0, "ainvoke")
+        return result
+
+    async def _aanswer(self, q: str) -> dict:
+        docs, filled, cached, vec, skey = await asyncio.to_thread(self._prepare, q)
+        if cached is not None:
+            return {"result": cached, "source_documents": docs}
+
+        if isinstance(self.llm, HFClientLLM):
+            answer = await self.llm.ainvoke(filled)
+        else:
+            with _stage("llm"):
+                answer = await self.llm.ainvoke(filled)
+        self._remember(vec, skey, answer)
+        return {"result": answer, "source_documents": docs}
+
+    async def abatch(
+        self,
+        payloads: List[dict],
+        max_concurrency: Optional[int] = None,
+        return_exceptions: bool = False,
+    ) -> List[Any]:
+        """
+        Birden çok payload'ı eşzamanlı yürütür; sonuçlar girişle aynı sırada döner.
+        max_concurrency: aynı anda en fazla kaç istek (None = sınırsız)
+        return_exceptions: True ise hatalı öğeler için istisna nesnesi döner, diğerleri etkilenmez
+        """
+        sem = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+
+        async def one(p: dict) -> dict:
+            if sem is None:
+                return await self.ainvoke(p)
+            async with sem:
+                return await self.ainvoke(p)
+
+        return await asyncio.gather(*(one(p) for p in payloads), return_exceptions=return_exceptions)
+
+    def submit(self, payload: dict, key: Any = None) -> "concurrent.futures.Future":
+        """
+        ainvoke'u paylaşılan arka plan loop'unda başlatır; .result() ile beklenebilir.
+        key (örn. Streamlit oturum id'si) verilirse aynı key'in hâlâ süren önceki isteği iptal
+        edilir: kullanıcı formu yeniden gönderdiğinde eski üretim için beklenmez.
+        """
+        future = _AsyncRunner.get().submit(self.ainvoke(payload))
+        if key is None:
+            return future
+        with self._submit_lock:
+            prev = self._submitted.get(key)
+            self._submitted[key] = future
+        if prev is not None and not prev.done():
+            prev.cancel()
+
+        def _forget(f: "concurrent.futures.Future") -> None:
+            with self._submit_lock:
+                if self._submitted.get(key) is f:
+                    del self._submitted[key]
+
+        future.add_done_callback(_forget)
+        return future
+
+    def stream(self, payload: dict) -> Iterator[dict]:
+        """
+        Akışlı dış arayüz (invoke ile aynı payload):
+        - Token'lar geldikçe {'partial': <o ana kadarki temizlenmiş metin>}
+        - En sonda invoke ile aynı sözlük: {'result': ..., 'source_documents': ...}
+        LLM akış desteklemiyorsa tek seferde invoke sonucu döner.
+        Özdeş bir istek zaten sürüyorsa (invoke ya da stream) onun sonucu beklenir ve
+        yalnızca son sözlük döner. "profile": True akışın tamamını profiller.
+        """
+        with profiler.session("stream", force=payload.get("profile")):
+            yield from self._stream(payload)
+
+    def _stream(self, payload: dict) -> Iterator[dict]:
+        q = payload.get("query") or payload.get("input") or ""
+        key = self._flight_key(q)
+        rec: Dict[str, Any] = {}
+        t0 = time.perf_counter()
+        token = _TIMINGS.set(rec)
+        try:
+            flight: Optional[_Flight] = None
+            while True:
+                flight, leader = self._flights.begin(key)
+                if leader:
+                    break
+                try:
+                    shared = self._flights.wait(flight)
+                except _FlightTimeout:
+                    flight = None  # takılı liderden bağımsız akış; uçuş liderde kalır
+                    break
+                if shared is not None:
+                    shared["timings"] = _finish_timings(rec, t0, "stream")
+                    yield shared
+                    return
+
+            result = None
+            try:
+                for event in self._stream_answer(q):
+                    if "result" in event:
+                        event["timings"] = _finish_timings(rec, t0, "stream")
+                        result = event
+                    yield event
+            except Exception as e:
+                if flight is not None:
+                    self._flights.finish(key, flight, error=e)
+                raise
+            finally:
+                # Okuyucu akışı yarıda bıraktıysa (GeneratorExit) takipçiler kendileri yürütür
+                if flight is not None and not flight.done.is_set():
+                    self._flights.finish(key, flight, result=result, abandoned=result is None)
+        finally:
+            try:
+                _TIMINGS.reset(token)
+            except ValueError:  # üreteç başka bir bağlamda kapatıldı
+                pass
+
+    def _stream_answer(self, q: str) -> Iterator[dict]:
+        docs, filled, cached, vec, skey = self._prepare(q)
+        if cached is not None:
+            yield {"result": cached, "source_documents": docs}
+            return
+
+        if not isinstance(self.llm, HFClientLLM):
+            answer = self._invoke_llm(filled)
+            self._remember(vec, skey, answer)
+            yield {"result": answer, "source_documents": docs}
+            return
+
+        # llm = akışın toplam süresi − kuyruk − temizlik − tüketicinin (UI) kısmi metinle geçirdiği süre
+        pp = _StreamPostprocessor()
+        last = ""
+        pp_secs = consumer_secs = 0.0
+        started = time.perf_counter()
+        for token in self.llm.stream(filled):
+            t = time.perf_counter()
+            pp.feed(token)
+            partial = pp.render()
+            pp_secs += time.perf_counter() - t
+            if partial and partial != last:
+                last = partial
+                t = time.perf_counter()
+                yield {"partial": partial}
+                consumer_secs += time.perf_counter() - t
+        queued = ((_TIMINGS.get() or {}).get("queue_ms") or 0.0) / 1000.0
+        llm_secs = time.perf_counter() - started - queued - pp_secs - consumer_secs
+        t = time.perf_counter()
+        answer = pp.finish()
+        pp_secs += time.perf_counter() - t
+        _note(llm_ms=llm_secs * 1000.0, postprocess_ms=pp_secs * 1000.0)
+        self._remember(vec, skey, answer)
+        yield {"result": answer, "source_documents": docs}
+
 
 def make_retrieval_chain(retriever):
     """
@@ -237,6 +1310,9 @@ def make_retrieval_chain(retriever):
     - Türkçe, kısa ve uygulanabilir öneri üretimine odaklı bir prompt
     - HFClientLLM ile yanıt üretimi
     - _SimpleRAGAdapter ile uyumlu .invoke arayüzü
+    - FOCUSIA_ANSWER_CACHE=1 (varsayılan) ise anlamsal yanıt önbelleği
+    - Bağlam, hedef modelin tokenizer'ıyla FOCUSIA_CONTEXT_TOKENS bütçesine paketlenir
+    - FOCUSIA_RETRIEVAL_CACHE=1 (varsayılan) ise sorgu embedding'i + arama sonucu LRU önbelleği
     """
     # Prompt değişkenleri: {context} ve {input}/{question}
     prompt = PromptTemplate.from_template(
@@ -247,5 +1323,16 @@ def make_retrieval_chain(retriever):
         "Bağlam:\n{context}\n\nKullanıcı: {input}\n\nYanıt:"
     )
     llm = make_llm()
-    return _SimpleRAGAdapter(retriever, llm, prompt)
+    packer = make_context_packer(llm._model_id())
+
+    answer_cache = None
+    if ANSWER_CACHE_ENABLED:
+        # Model, prompt, bağlam bütçesi ya da arama türü değişince diskteki eski yanıtlar kullanılmasın
+        namespace = f"{llm._model_id()}|{hashlib.sha1(prompt.template.encode('utf-8')).hexdigest()[:12]}|ctx{packer.budget}"
+        if hasattr(retriever, "search_hybrid"):
+            namespace += "|hybrid"
+        answer_cache = AnswerCache(path=ANSWER_CACHE_PATH or None, namespace=namespace)
+    return _SimpleRAGAdapter(
+        retriever, llm, prompt, answer_cache=answer_cache, packer=packer, retrieval_cache=make_retrieval_cache()
+    )
 
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+retrieval_cache.py
+------------------
+Sorgu embedding'i ve arama sonucu için iki katmanlı, bellek sınırlı LRU önbellek.
+
+Aynı metin tekrar geldiğinde (yeniden gönderim, Streamlit rerun'ı, popüler örnek sorgular)
+model ileri geçişi ve MMR araması yeniden yapılmaz:
+
+1. embedding: normalize sorgu metni → sorgu vektörü (float32)
+2. sonuç:     (sorgu anahtarı, arama türü, k, fetch_k, lambda_mult, retriever türü, indeks sürümü)
+              → getirilen belgeler
+
+Her katmanın bayt bütçesi vardır; aşılınca en uzun süredir kullanılmayan kayıt atılır.
+İndeks sürümü, vectorstore'un kimliği (Chroma'da persist_dir) + bu süreçteki yeniden kurulma
+sayısıdır: build_or_load_chroma indeksi değiştirdiğinde invalidate_index(persist_dir) çağırır,
+eski sonuçlar bir daha eşleşmez ve bellekten de hemen atılır.
+
+- Sorgu normalizasyonu: Unicode NFC + boşlukların sadeleştirilmesi (büyük/küçük harfe dokunulmaz;
+  modelin gördüğü metin anlamca aynı kalır)
+- Kullanıcı sorguları yalnızca bellekte tutulur, diske yazılmaz
+- metrics: focusia_retrieval_cache_total{level=embedding|result, result=hit|miss}
+
+Kullanım:
+    cache = RetrievalCache()
+    qkey = cache.query_key(q)
+    vec = cache.get_embedding(qkey)
+    rkey = cache.result_key(qkey, retriever)
+    docs = cache.get_docs(rkey)
+"""
+
+import hashlib
+import os
+import re
+import sys
+import threading
+import unicodedata
+import uuid
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import metrics
+
+RETRIEVAL_CACHE_ENABLED = os.getenv("FOCUSIA_RETRIEVAL_CACHE", "1") != "0"
+QUERY_EMB_CACHE_MB = float(os.getenv("FOCUSIA_QUERY_EMB_CACHE_MB", "8"))       # embedding katmanı
+RETRIEVAL_CACHE_MB = float(os.getenv("FOCUSIA_RETRIEVAL_CACHE_MB", "32"))      # sonuç katmanı
+ENTRY_OVERHEAD = 200  # kayıt başına sözlük/anahtar payı (bayt, yaklaşık)
+
+_LOOKUPS = metrics.counter(
+    "focusia_retrieval_cache_total", "Sorgu embedding / arama sonucu önbelleği (level=embedding|result, result=hit|miss)"
+)
+_SPACE_RE = re.compile(r"\s+", re.UNICODE)
+
+
+def normalize_query(text: str) -> str:
+    """Önbellek anahtarı için metin: NFC, baş/son boşluk yok, iç boşluklar tek boşluk."""
+    return _SPACE_RE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+# ---- İndeks sürümü ----
+
+_GENERATIONS: Dict[str, int] = {}
+_CACHES: "weakref.WeakSet[RetrievalCache]" = weakref.WeakSet()
+_VERSION_LOCK = threading.Lock()
+
+
+def _index_token(vectorstore: Any) -> str:
+    """Chroma: persist_dir'in gerçek yolu (aynı dizini açan nesneler paylaşır); diğerleri: nesne başına kimlik."""
+    path = getattr(vectorstore, "_persist_directory", None)
+    if path:
+        return os.path.realpath(path)
+    token = getattr(vectorstore, "_focusia_cache_token", None)
+    if token is None:
+        token = f"mem:{uuid.uuid4().hex}"  # id() yeniden kullanılabilir; bellek içi indekse kalıcı kimlik
+        setattr(vectorstore, "_focusia_cache_token", token)
+    return token
+
+
+def index_version(vectorstore: Any) -> str:
+    """Parçalı depoda (shards.ShardSet) parçaların sürümleri "+" ile birleştirilir."""
+    parts = getattr(vectorstore, "parts", None)
+    if parts is not None:
+        return "+".join(index_version(p) for p in parts)
+    token = _index_token(vectorstore)
+    return f"{token}@{_GENERATIONS.get(token, 0)}"
+
+
+def invalidate_index(persist_dir: str) -> None:
+    """persist_dir'deki indeks değişti: sürümü artırır, eski sonuçları tüm önbelleklerden atar."""
+    token = os.path.realpath(persist_dir)
+    with _VERSION_LOCK:
+        _GENERATIONS[token] = _GENERATIONS.get(token, 0) + 1
+        caches = list(_CACHES)
+    prefix = f"{token}@"
+    for cache in caches:
+        cache.results.discard_where(lambda key: any(p.startswith(prefix) for p in key[-1].split("+")))
+
+
+# ---- LRU ----
+
+class LRUCache:
+    """
+    Bayt bütçeli LRU sözlük (thread-safe). Kayıt boyutu put sırasında verilir;
+    toplam max_bytes'ı aşınca en eski kullanılan kayıtlar atılır. Bütçeden büyük kayıt saklanmaz.
+    """
+    def __init__(self, max_bytes: int, level: str = ""):
+        self.max_bytes = max(0, int(max_bytes))
+        self.level = level
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+            else:
+                self._data.move_to_end(key)
+                self.hits += 1
+        _LOOKUPS.inc(level=self.level, result="miss" if item is None else "hit")
+        return None if item is None else item[0]
+
+    def put(self, key: Hashable, value: Any, nbytes: int) -> None:
+        nbytes += ENTRY_OVERHEAD
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[1]
+            self._data[key] = (value, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes:
+                _, (_, size) = self._data.popitem(last=False)
+                self.nbytes -= size
+
+    def discard_where(self, predicate: Any) -> int:
+        with self._lock:
+            stale = [k for k in self._data if predicate(k)]
+            for k in stale:
+                self.nbytes -= self._data.pop(k)[1]
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+
+
+def _doc_nbytes(doc: Any) -> int:
+    meta = getattr(doc, "metadata", None) or {}
+    size = sys.getsizeof(getattr(doc, "page_content", ""))
+    return size + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in meta.items())
+
+
+# ---- İki katmanlı önbellek ----
+
+class RetrievalCache:
+    """
+    Sorgu → embedding ve (sorgu, arama ayarları, indeks sürümü) → belgeler.
+    - embedding_mb / results_mb: katmanların bellek bütçesi (MB)
+    Sonuç katmanındaki belgeler paylaşılır; çağıran değiştirmemeli (liste kopyası döner).
+    """
+    def __init__(self, embedding_mb: float = QUERY_EMB_CACHE_MB, results_mb: float = RETRIEVAL_CACHE_MB):
+        self.embeddings = LRUCache(int(embedding_mb * 1024 * 1024), level="embedding")
+        self.results = LRUCache(int(results_mb * 1024 * 1024), level="result")
+        _CACHES.add(self)
+
+    @staticmethod
+    def query_key(text: str) -> bytes:
+        return hashlib.blake2b(normalize_query(text).encode("utf-8"), digest_size=16).digest()
+
+    def get_embedding(self, qkey: bytes) -> Optional[List[float]]:
+        vec = self.embeddings.get(qkey)
+        return None if vec is None else vec.tolist()
+
+    def put_embedding(self, qkey: bytes, vec: Sequence[float]) -> None:
+        arr = np.asarray(vec, dtype=np.float32)
+        self.embeddings.put(qkey, arr, arr.nbytes)
+
+    @staticmethod
+    def result_key(qkey: bytes, retriever: Any) -> Tuple[Any, ...]:
+        kw = getattr(retriever, "search_kwargs", None) or {}
+        return (
+            qkey,
+            getattr(retriever, "search_type", None),
+            kw.get("k", 4),
+            kw.get("fetch_k", 20),
+            kw.get("lambda_mult", 0.5),
+            type(retriever).__name__,
+            index_version(getattr(retriever, "vectorstore", retriever)),
+        )
+
+    def get_docs(self, rkey: Tuple[Any, ...]) -> Optional[List[Any]]:
+        docs = self.results.get(rkey)
+        return None if docs is None else list(docs)
+
+    def put_docs(self, rkey: Tuple[Any, ...], docs: Sequence[Any]) -> None:
+        self.results.put(rkey, tuple(docs), sum(_doc_nbytes(d) for d in docs))
+
+    def clear(self) -> None:
+        self.embeddings.clear()
+        self.results.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            level: {"entries": len(c), "bytes": c.nbytes, "hits": c.hits, "misses": c.misses}
+            for level, c in (("embedding", self.embeddings), ("result", self.results))
+        }
+
+
+def make_retrieval_cache() -> Optional[RetrievalCache]:
+    """FOCUSIA_RETRIEVAL_CACHE=0 ise None."""
+    return RetrievalCache() if RETRIEVAL_CACHE_ENABLED else None
@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+"""
+shards.py
+---------
+Birden çok ipucu korpusu için parçalı (sharded) indeks katmanı. Her korpus (ders çalışma, iş,
+DEHB'ye özel, İngilizce çeviriler...) ayrı bir parçadır: kendi persist_dir'i, manifesti ve BM25
+indeksi olur; farklı takvimlerle güncellenir ve tek başına yeniden eşitlenebilir.
+
+- Tanım: FOCUSIA_SHARDS="study=tips/study.json,work=tips/work.jsonl,adhd=tips/adhd.json"
+  → her parça FOCUSIA_SHARD_DIR/<ad> altında (varsayılan chroma_shards/<ad>)
+- Kurulum: build_shards parçaları bir thread havuzunda paralel kurar/eşitler (tek embedding
+  modeli ve önbelleği paylaşılır); only=[...] ile yalnızca seçilen parçalar
+- Arama: ShardedRetriever sorguyu bir kez gömer ve parçalara thread havuzunda dağıtır. Her parça
+  kendi ilk fetch_k adayını (vektör + varsa BM25) vektörleriyle döner; adaylar birleştirilir
+  (alaka: kosinüs; BM25 isabeti varsa kosinüs sırası ile parça içinde normalize BM25 sırasının
+  RRF'si) ve MMR birleşik havuzdan k belge seçer. metadata["shard"] belgenin geldiği parçadır.
+- subset(names): aynı parçaları paylaşan, yalnızca seçilenlerde arayan retriever (app._get_chain)
+
+Ağır importlar (numpy, langchain, chromadb, lexical_index) ilk kullanımda yapılır; app.py
+parça adlarını okumak için modülü açılışta import edebilir.
+
+Kullanım:
+    python shards.py                     # tüm parçaları paralel kur/eşitle
+    python shards.py --only work,adhd    # yalnızca seçilen parçaları yeniden eşitle
+
+    shards = load_shards()
+    retriever = ShardedRetriever(shards, "mmr", {"k": 5, "fetch_k": 20, "lambda_mult": 0.7})
+    retriever.subset(["study", "adhd"]).invoke("ders çalışırken dağılıyorum")
+"""
+
+import argparse
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+SHARDS_SPEC = os.getenv("FOCUSIA_SHARDS", "")                              # boş = tek korpus (JSON_PATH)
+SHARD_DIR = os.getenv("FOCUSIA_SHARD_DIR", "chroma_shards")
+SHARD_BUILD_WORKERS = int(os.getenv("FOCUSIA_SHARD_BUILD_WORKERS", "4"))   # aynı anda kurulan parça
+SHARD_THREADS = int(os.getenv("FOCUSIA_SHARD_THREADS", "8"))               # sorgu dağıtım havuzu
+
+_NAME_RE = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+@dataclass(frozen=True)
+class ShardSpec:
+    name: str
+    json_path: str
+    persist_dir: str
+
+
+def parse_shards(spec: str = SHARDS_SPEC, root: str = SHARD_DIR) -> List[ShardSpec]:
+    """"ad=yol,ad=yol" → ShardSpec listesi (boş → []); geçersiz ya da tekrar eden ad ValueError."""
+    out: List[ShardSpec] = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, sep, path = (x.strip() for x in part.partition("="))
+        if not sep or not path or not _NAME_RE.match(name):
+            raise ValueError(f"FOCUSIA_SHARDS öğesi geçersiz: {part!r} (beklenen: ad=yol)")
+        if any(s.name == name for s in out):
+            raise ValueError(f"FOCUSIA_SHARDS içinde parça adı tekrar ediyor: {name}")
+        out.append(ShardSpec(name, path, os.path.join(root, name)))
+    return out
+
+
+def shard_names(spec: str = SHARDS_SPEC) -> List[str]:
+    return [s.name for s in parse_shards(spec)]
+
+
+# ---- Kurulum ----
+
+@dataclass
+class Shard:
+    """Tek parça: vektör deposu (Chroma ya da NumpyVectorIndex) + varsa BM25 indeksi."""
+    spec: ShardSpec
+    store: Any
+    lexical: Any = None
+    _backend: Any = field(default=None, repr=False)
+
+    @property
+    def name(self) -> str:
+        return self.spec.name
+
+    @property
+    def backend(self) -> Any:
+        """lexical_index'teki depo sarmalayıcısı (dense / fetch / lexical_key)."""
+        if self._backend is None:
+            from lexical_index import _ChromaStore, _NumpyStore
+            self._backend = _ChromaStore(self.store) if hasattr(self.store, "_collection") else _NumpyStore(self.store)
+        return self._backend
+
+
+def _build_one(spec: ShardSpec, backend: str, embedding_model: str, embeddings: Any) -> Shard:
+    from data_loader import build_numpy_index, build_or_load_chroma, load_lexical_index
+
+    t0 = time.perf_counter()
+    if backend == "numpy":
+        store = build_numpy_index(spec.json_path, embedding_model, embeddings=embeddings)
+        shard = Shard(spec, store, store.lexical)
+    else:
+        store = build_or_load_chroma(spec.json_path, spec.persist_dir, embedding_model, embeddings=embeddings)
+        shard = Shard(spec, store, load_lexical_index(spec.persist_dir))
+    docs = len(store) if backend == "numpy" else store._collection.count()
+    print(f"[Shards] {spec.name}: {docs} docs ready in {time.perf_counter() - t0:.1f}s")
+    return shard
+
+
+def build_shards(
+    specs: Optional[Sequence[ShardSpec]] = None,
+    backend: str = "chroma",
+    only: Optional[Iterable[str]] = None,
+    workers: int = SHARD_BUILD_WORKERS,
+    embeddings: Any = None,
+) -> Dict[str, Shard]:
+    """
+    Parçaları paralel kurar/eşitler (her biri build_or_load_chroma ya da build_numpy_index).
+    - only: yalnızca bu parçalar (diğerlerine dokunulmaz); bilinmeyen ad ValueError
+    - embeddings: verilmezse FOCUSIA_EMB_* ayarlarıyla tek nesne kurulur, tüm parçalar paylaşır
+    Dönüş: {ad: Shard}, FOCUSIA_SHARDS sırasıyla.
+    """
+    from data_loader import EMB_MODEL, embedding_id, make_embeddings
+
+    specs = list(parse_shards() if specs is None else specs)
+    if only is not None:
+        wanted = set(only)
+        unknown = wanted - {s.name for s in specs}
+        if unknown:
+            raise ValueError(f"Bilinmeyen parça: {', '.join(sorted(unknown))}")
+        specs = [s for s in specs if s.name in wanted]
+    if not specs:
+        raise ValueError("Kurulacak parça yok (FOCUSIA_SHARDS boş).")
+
+    embedding_model = embedding_id(EMB_MODEL)
+    if embeddings is None:
+        embeddings = make_embeddings(embedding_model)
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(specs))), thread_name_prefix="focusia-shard-build") as pool:
+        built = list(pool.map(lambda s: _build_one(s, backend, embedding_model, embeddings), specs))
+    print(f"[Shards] {len(built)} shard(s) ready in {time.perf_counter() - t0:.1f}s")
+    return {s.name: s for s in built}
+
+
+def load_shards(backend: str = "chroma", specs: Optional[Sequence[ShardSpec]] = None) -> Dict[str, Shard]:
+    """Tüm parçaları açar (kaynağı değişmeyenler yalnızca yüklenir, değişenler eşitlenir)."""
+    return build_shards(specs, backend=backend)
+
+
+# ---- Dağıtık arama ----
+
+_POOL: Optional[ThreadPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ThreadPoolExecutor(max_workers=max(1, SHARD_THREADS), thread_name_prefix="focusia-shard")
+        return _POOL
+
+
+def _shard_candidates(shard: Shard, query: str, vec: Sequence[float], fetch_k: int) -> Tuple[List[Any], Any, List[float]]:
+    """Parçanın ilk fetch_k vektör adayı ∪ ilk fetch_k BM25 adayı: (belgeler, vektörler, normalize BM25)."""
+    backend = shard.backend
+    keys = backend.dense(vec, fetch_k)
+    bm25: Dict[Any, float] = {}
+    if shard.lexical is not None and len(shard.lexical):
+        hits = shard.lexical.search(query, fetch_k)
+        top = hits[0][1] if hits else 1.0
+        bm25 = {backend.lexical_key(shard.lexical, row): score / top for row, score in hits}
+        keys = list(dict.fromkeys(keys + list(bm25)))
+    if not keys:
+        return [], None, []
+    found, docs, emb = backend.fetch(keys)
+    for doc in docs:
+        doc.metadata["shard"] = shard.name
+    return docs, emb, [bm25.get(k, 0.0) for k in found]
+
+
+class ShardSet:
+    """
+    Retriever'ın "vectorstore"u: sorgu embedding'i (ilk parçanınki; tüm parçalar aynı modelle
+    kurulur) ve retrieval_cache için parça depoları (parts).
+    """
+    def __init__(self, shards: Sequence[Shard]):
+        self.shards = list(shards)
+
+    @property
+    def embeddings(self) -> Any:
+        return self.shards[0].store.embeddings
+
+    @property
+    def parts(self) -> List[Any]:
+        return [s.store for s in self.shards]
+
+
+class ShardedRetriever:
+    """
+    Parçalara dağıtılan arama → birleşik aday havuzu → MMR. VectorStoreRetriever ile aynı alanlar
+    (vectorstore, search_type, search_kwargs); _SimpleRAGAdapter sorguyu bir kez gömer ve
+    search_hybrid(q, vec) çağırır.
+    """
+    def __init__(
+        self,
+        shards: "Dict[str, Shard] | Sequence[Shard]",
+        search_type: str = "mmr",
+        search_kwargs: Optional[Dict[str, Any]] = None,
+        rrf_k: Optional[int] = None,
+    ):
+        from lexical_index import HYBRID_RRF_K
+
+        if search_type not in ("similarity", "mmr"):
+            raise ValueError(f"Desteklenmeyen search_type: {search_type}")
+        items = list(shards.values()) if isinstance(shards, dict) else list(shards)
+        if not items:
+            raise ValueError("En az bir parça gerekli.")
+        self.shards = {s.name: s for s in items}
+        self.vectorstore = ShardSet(items)
+        self.search_type = search_type
+        self.search_kwargs = dict(search_kwargs or {})
+        self.rrf_k = HYBRID_RRF_K if rrf_k is None else rrf_k
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.shards)
+
+    def subset(self, names: Iterable[str]) -> "ShardedRetriever":
+        """Yalnızca verilen parçalarda arayan kopya (parçalar ve bağlantılar paylaşılır)."""
+        names = list(dict.fromkeys(names))
+        unknown = [n for n in names if n not in self.shards]
+        if unknown:
+            raise ValueError(f"Bilinmeyen parça: {', '.join(unknown)}")
+        return ShardedRetriever([self.shards[n] for n in names], self.search_type, self.search_kwargs, self.rrf_k)
+
+    def search_hybrid(self, query: str, vec: Sequence[float]) -> List[Any]:
+        import numpy as np
+        from lexical_index import rrf
+        from vector_index import _normalize, mmr_select
+
+        kw = self.search_kwargs
+        k = kw.get("k", 4)
+        fetch_k = max(kw.get("fetch_k", 20), k)
+        shards = list(self.shards.values())
+        if len(shards) == 1:
+            results = [_shard_candidates(shards[0], query, vec, fetch_k)]
+        else:
+            results = list(_pool().map(lambda s: _shard_candidates(s, query, vec, fetch_k), shards))
+
+        docs = [d for r in results for d in r[0]]
+        if not docs:
+            return []
+        emb = _normalize(np.concatenate([r[1] for r in results if r[0]]).astype(np.float32))
+        bm25 = np.asarray([b for r in results for b in r[2]], dtype=np.float32)
+        cosine = emb @ _normalize(np.asarray(vec, dtype=np.float32))
+
+        if bm25.any():
+            # Parçaların BM25 skorları karşılaştırılamaz (idf parçaya özgü): parça içi normalize skorla sırala
+            dense = np.argsort(-cosine, kind="stable").tolist()
+            lexical = [int(i) for i in np.argsort(-bm25, kind="stable") if bm25[i] > 0]
+            fused = rrf([dense, lexical], self.rrf_k)[:fetch_k]
+            pool = np.asarray([i for i, _ in fused], dtype=np.int64)
+            relevance = np.asarray([s for _, s in fused], dtype=np.float32)
+            sims = relevance / relevance.max()
+        else:
+            pool = np.argsort(-cosine, kind="stable")[:fetch_k]
+            relevance = sims = cosine[pool]
+
+        if self.search_type == "mmr":
+            picked = sorted(mmr_select(sims, emb[pool], k, kw.get("lambda_mult", 0.5)))  # aday (alaka) sırası
+        else:
+            picked = list(range(min(k, len(pool))))
+        out = []
+        for j in picked:
+            doc = docs[int(pool[j])]
+            doc.metadata["score"] = round(float(relevance[j]), 6)
+            out.append(doc)
+        return out
+
+    def get_relevant_documents(self, query: str) -> List[Any]:
+        return self.search_hybrid(query, self.vectorstore.embeddings.embed_query(query))
+
+    def invoke(self, input: Any, config: Any = None, **kwargs: Any) -> List[Any]:
+        q = input.get("query", "") if isinstance(input, dict) else input
+        return self.get_relevant_documents(q)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="FOCUSIA_SHARDS'taki parçaları paralel kurar/eşitler.")
+    ap.add_argument("--only", default="", help="virgülle ayrılmış parça adları (boş = hepsi)")
+    ap.add_argument("--backend", default="chroma", choices=["chroma", "numpy"])
+    ap.add_argument("--workers", type=int, default=SHARD_BUILD_WORKERS)
+    args = ap.parse_args()
+    only = [n.strip() for n in args.only.split(",") if n.strip()] or None
+    build_shards(backend=args.backend, only=only, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+"""
+vector_index.py
+---------------
+Chroma'ya alternatif, süreç içi NumPy vektör indeksi.
+
+- Belgeler tek bir bitişik, satır bazında normalize edilmiş float32/float16 matriste tutulur.
+- Top-k: sorgu vektörüyle matris çarpımı + argpartition (kaba kuvvet, ama vektörize).
+- MMR: fetch_k aday üzerinde vektörize maksimal marjinal alaka (LangChain'in MMR'ı ile
+  aynı anlam: ilk seçim en benzer aday, sonra λ·alaka − (1−λ)·seçilenlere en yüksek benzerlik).
+- as_retriever(search_type="mmr", search_kwargs={"k", "fetch_k", "lambda_mult"}) Chroma ile
+  aynı imzaya sahiptir; dönen retriever _SimpleRAGAdapter._retrieve ile doğrudan çalışır.
+- Toplu arama: *_by_vectors metodları birçok sorguyu tek matris çarpımıyla skorlar;
+  chroma_search_by_vectors aynısını Chroma için tek collection.query ile yapar.
+
+Kullanım:
+    from data_loader import build_numpy_index
+    index = build_numpy_index()
+    retriever = index.as_retriever(search_type="mmr", search_kwargs={"k": 5, "fetch_k": 20, "lambda_mult": 0.7})
+"""
+
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+SCORE_BLOCK = 8192  # float16 matriste skorlar bu kadar satırlık bloklarla float32'de hesaplanır
+BATCH_SCORE_CELLS = 1 << 24  # toplu aramada bir seferde tutulan en fazla (sorgu × belge) skor (~64 MB)
+
+
+def _normalize(mat: np.ndarray) -> np.ndarray:
+    """Satırları birim uzunluğa getirir (sıfır vektörler olduğu gibi kalır)."""
+    norms = np.linalg.norm(mat, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return mat / norms
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """En yüksek k skorun indeksleri (azalan sırada); tüm diziyi sıralamadan."""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx], kind="stable")]
+
+
+def mmr_select(query_sims: np.ndarray, candidates: np.ndarray, k: int, lambda_mult: float) -> List[int]:
+    """
+    Vektörize MMR.
+    query_sims: (m,) adayların sorguya kosinüs benzerliği
+    candidates: (m, d) normalize aday vektörleri
+    Dönüş: seçilen adayların (candidates içindeki) sıra numaraları, seçim sırasıyla.
+    """
+    m = query_sims.shape[0]
+    k = min(k, m)
+    if k <= 0:
+        return []
+    pair = candidates @ candidates.T  # (m, m) aday-aday benzerlikleri, tek çarpım
+    first = int(np.argmax(query_sims))
+    selected = [first]
+    chosen = np.zeros(m, dtype=bool)
+    chosen[first] = True
+    max_sim = pair[:, first].copy()  # her adayın seçilenlere en yüksek benzerliği
+    while len(selected) < k:
+        scores = lambda_mult * query_sims - (1.0 - lambda_mult) * max_sim
+        scores[chosen] = -np.inf
+        j = int(np.argmax(scores))
+        selected.append(j)
+        chosen[j] = True
+        np.maximum(max_sim, pair[:, j], out=max_sim)
+    return selected
+
+
+class NumpyVectorIndex:
+    """
+    Bellek içi vektör indeksi (LangChain VectorStore'un kullandığımız alt kümesi).
+    - vectors: (n, d) belge vektörleri (normalize edilir)
+    - texts / metadatas / ids: satırlarla aynı sırada
+    - embedding: sorguları gömmek için LangChain Embeddings nesnesi
+    - dtype: "float32" ya da "float16" (yarı bellek; skorlar yine float32 hesaplanır)
+    """
+    def __init__(
+        self,
+        vectors: Any,
+        texts: Sequence[str],
+        metadatas: Optional[Sequence[Dict[str, Any]]] = None,
+        ids: Optional[Sequence[str]] = None,
+        embedding: Any = None,
+        dtype: str = "float32",
+    ):
+        mat = np.asarray(vectors, dtype=np.float32)
+        if mat.ndim != 2 or mat.shape[0] != len(texts):
+            raise ValueError("Vektör matrisi ile belge sayısı uyuşmuyor.")
+        if dtype not in ("float32", "float16"):
+            raise ValueError(f"Desteklenmeyen dtype: {dtype} (float32 ya da float16)")
+        self._matrix = np.ascontiguousarray(_normalize(mat).astype(dtype))
+        self._texts = list(texts)
+        self._metadatas = list(metadatas) if metadatas is not None else [{} for _ in self._texts]
+        self._ids = list(ids) if ids is not None else [str(i) for i in range(len(self._texts))]
+        self._embedding = embedding
+        self.lexical: Any = None  # aynı satır sırasıyla BM25 indeksi (lexical_index; build_numpy_index kurar)
+
+    @classmethod
+    def from_chroma(cls, db: Any, dtype: str = "float32") -> "NumpyVectorIndex":
+        """Var olan bir Chroma koleksiyonundaki vektörleri ve belgeleri kopyalar."""
+        data = db.get(include=["embeddings", "documents", "metadatas"])
+        return cls(
+            data["embeddings"],
+            data["documents"],
+            metadatas=data["metadatas"],
+            ids=data["ids"],
+            embedding=db.embeddings,
+            dtype=dtype,
+        )
+
+    def __len__(self) -> int:
+        return self._matrix.shape[0]
+
+    @property
+    def embeddings(self) -> Any:
+        return self._embedding
+
+    # ---- alt seviye: skor ve satır erişimi (alt sınıflar farklı depolama kullanabilir) ----
+
+    def _scores(self, query: np.ndarray) -> np.ndarray:
+        """Tüm belgelerin sorguya kosinüs benzerliği (float32)."""
+        mat = self._matrix
+        if mat.dtype == np.float32:
+            return mat @ query
+        out = np.empty(mat.shape[0], dtype=np.float32)
+        for start in range(0, mat.shape[0], SCORE_BLOCK):
+            block = mat[start:start + SCORE_BLOCK].astype(np.float32)
+            out[start:start + SCORE_BLOCK] = block @ query
+        return out
+
+    def _rows(self, idx: np.ndarray) -> np.ndarray:
+        """Verilen satırların float32 kopyası."""
+        return self._matrix[idx].astype(np.float32)
+
+    def _scores_many(self, queries: np.ndarray) -> np.ndarray:
+        """(m, d) normalize sorgular → (m, n) skor matrisi; tek (bloklu) matris çarpımı."""
+        mat = self._matrix
+        if mat.dtype == np.float32:
+            return queries @ mat.T
+        out = np.empty((queries.shape[0], mat.shape[0]), dtype=np.float32)
+        for start in range(0, mat.shape[0], SCORE_BLOCK):
+            end = start + SCORE_BLOCK
+            out[:, start:end] = queries @ self._rows(slice(start, end)).T
+        return out
+
+    def _iter_scores(self, embeddings: Sequence[Sequence[float]]) -> Iterator[np.ndarray]:
+        """Her sorgu için skor satırı; sorgular bellek sınırına göre gruplar halinde skorlanır."""
+        queries = self._query_vector(embeddings)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+        step = max(1, BATCH_SCORE_CELLS // max(1, len(self)))
+        for start in range(0, queries.shape[0], step):
+            yield from self._scores_many(queries[start:start + step])
+
+    def _doc(self, i: int) -> Document:
+        return Document(page_content=self._texts[i], metadata=dict(self._metadatas[i] or {}))
+
+    def _query_vector(self, embedding: Sequence[float]) -> np.ndarray:
+        return _normalize(np.asarray(embedding, dtype=np.float32))
+
+    def embed_query(self, text: str) -> np.ndarray:
+        if self._embedding is None:
+            raise ValueError("Sorgu gömmek için bir embedding nesnesi verilmeli.")
+        return self._query_vector(self._embedding.embed_query(text))
+
+    # ---- arama (LangChain VectorStore ile aynı isimler) ----
+
+    def search_by_vector(self, embedding: Sequence[float], k: int = 4) -> List[Tuple[int, float]]:
+        """(satır, skor) çiftleri: en benzer k belge."""
+        scores = self._scores(self._query_vector(embedding))
+        idx = top_k(scores, k)
+        return [(int(i), float(scores[i])) for i in idx]
+
+    def search_by_vectors(self, embeddings: Sequence[Sequence[float]], k: int = 4) -> List[List[Tuple[int, float]]]:
+        """search_by_vector'ün toplu hali: her sorgu için (satır, skor) listesi."""
+        out = []
+        for scores in self._iter_scores(embeddings):
+            idx = top_k(scores, k)
+            out.append([(int(i), float(scores[i])) for i in idx])
+        return out
+
+    def similarity_search_by_vector(self, embedding: Sequence[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [self._doc(i) for i, _ in self.search_by_vector(embedding, k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return [(self._doc(i), s) for i, s in self.search_by_vector(self.embed_query(query), k)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return self.similarity_search_by_vector(self.embed_query(query), k)
+
+    def mmr_by_vector(
+        self,
+        embedding: Sequence[float],
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+    ) -> List[int]:
+        """
+        MMR ile seçilen satır numaraları. LangChain'in Chroma MMR'ı gibi, seçilenler
+        sorguya benzerlik sırasıyla (aday sırası) döner.
+        """
+        q = self._query_vector(embedding)
+        scores = self._scores(q)
+        cand = top_k(scores, max(fetch_k, k))
+        picked = mmr_select(scores[cand], self._rows(cand), k, lambda_mult)
+        return [int(cand[j]) for j in sorted(picked)]
+
+    def mmr_by_vectors(
+        self,
+        embeddings: Sequence[Sequence[float]],
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+    ) -> List[List[int]]:
+        """mmr_by_vector'ün toplu hali (skorlar tek çarpımla, MMR sorgu başına aday kümesinde)."""
+        out = []
+        for scores in self._iter_scores(embeddings):
+            cand = top_k(scores, max(fetch_k, k))
+            picked = mmr_select(scores[cand], self._rows(cand), k, lambda_mult)
+            out.append([int(cand[j]) for j in sorted(picked)])
+        return out
+
+    def max_marginal_relevance_search_by_vector(
+        self,
+        embedding: Sequence[float],
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        **kwargs: Any,
+    ) -> List[Document]:
+        return [self._doc(i) for i in self.mmr_by_vector(embedding, k, fetch_k, lambda_mult)]
+
+    def max_marginal_relevance_search(
+        self,
+        query: str,
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        **kwargs: Any,
+    ) -> List[Document]:
+        return self.max_marginal_relevance_search_by_vector(self.embed_query(query), k, fetch_k, lambda_mult)
+
+    def as_retriever(self, search_type: str = "similarity", search_kwargs: Optional[Dict[str, Any]] = None) -> "NumpyRetriever":
+        return NumpyRetriever(self, search_type=search_type, search_kwargs=search_kwargs or {})
+
+
+class NumpyRetriever:
+    """
+    NumpyVectorIndex için hafif retriever (LangChain VectorStoreRetriever ile aynı alanlar).
+    - .invoke(q) / .get_relevant_documents(q) → belge listesi
+    """
+    def __init__(self, vectorstore: NumpyVectorIndex, search_type: str = "similarity", search_kwargs: Optional[Dict[str, Any]] = None):
+        if search_type not in ("similarity", "mmr"):
+            raise ValueError(f"Desteklenmeyen search_type: {search_type}")
+        self.vectorstore = vectorstore
+        self.search_type = search_type
+        self.search_kwargs = dict(search_kwargs or {})
+
+    def search_by_vector(self, embedding: Sequence[float]) -> List[Document]:
+        """Önceden gömülmüş bir sorgu vektörüyle arama (sorgu tekrar gömülmez)."""
+        kw = self.search_kwargs
+        if self.search_type == "mmr":
+            return self.vectorstore.max_marginal_relevance_search_by_vector(
+                embedding,
+                k=kw.get("k", 4),
+                fetch_k=kw.get("fetch_k", 20),
+                lambda_mult=kw.get("lambda_mult", 0.5),
+            )
+        return self.vectorstore.similarity_search_by_vector(embedding, k=kw.get("k", 4))
+
+    def search_by_vectors(self, embeddings: Sequence[Sequence[float]]) -> List[List[Document]]:
+        """search_by_vector'ün toplu hali: sonuçlar sorgularla aynı sırada."""
+        kw = self.search_kwargs
+        vs = self.vectorstore
+        if self.search_type == "mmr":
+            rows = vs.mmr_by_vectors(
+                embeddings,
+                k=kw.get("k", 4),
+                fetch_k=kw.get("fetch_k", 20),
+                lambda_mult=kw.get("lambda_mult", 0.5),
+            )
+        else:
+            rows = [[i for i, _ in hits] for hits in vs.search_by_vectors(embeddings, k=kw.get("k", 4))]
+        return [[vs._doc(i) for i in r] for r in rows]
+
+    def get_relevant_documents(self, query: str) -> List[Document]:
+        return self.search_by_vector(self.vectorstore.embed_query(query))
+
+    def invoke(self, input: Any, config: Any = None, **kwargs: Any) -> List[Document]:
+        q = input.get("query", "") if isinstance(input, dict) else input
+        return self.get_relevant_documents(q)
+
+
+def chroma_search_by_vectors(
+    db: Any,
+    embeddings: Sequence[Sequence[float]],
+    search_type: str = "similarity",
+    search_kwargs: Optional[Dict[str, Any]] = None,
+) -> List[List[Document]]:
+    """
+    LangChain Chroma için toplu arama: tüm sorgular tek collection.query çağrısıyla.
+    MMR, LangChain'in max_marginal_relevance_search_by_vector'ı ile aynı sonucu verir
+    (adaylar fetch_k, seçilenler aday sırasıyla).
+    """
+    kw = search_kwargs or {}
+    k = kw.get("k", 4)
+    mmr = search_type == "mmr"
+    include = ["metadatas", "documents", "distances"] + (["embeddings"] if mmr else [])
+    res = db._collection.query(
+        query_embeddings=[[float(x) for x in v] for v in embeddings],
+        n_results=max(kw.get("fetch_k", 20), k) if mmr else k,
+        include=include,
+    )
+    out: List[List[Document]] = []
+    for i, vec in enumerate(embeddings):
+        docs = [
+            Document(page_content=text, metadata=meta or {})
+            for text, meta in zip(res["documents"][i], res["metadatas"][i])
+        ]
+        if mmr and docs:
+            cand = _normalize(np.asarray(res["embeddings"][i], dtype=np.float32))
+            q = _normalize(np.asarray(vec, dtype=np.float32))
+            picked = mmr_select(cand @ q, cand, k, kw.get("lambda_mult", 0.5))
+            docs = [docs[j] for j in sorted(picked)]
+        out.append(docs)
+    return out
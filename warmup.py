@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+warmup.py
+---------
+Açılışta ağır işleri (langchain/chromadb/torch importları, indeks, embedding modeli)
+arka plan thread'inde yapar; arayüz beklemeden çizilir, yalnızca hazır olmadan gelen ilk
+istek bekler. Aşama süreleri açılış raporunda toplanır:
+
+- stages: ısınma aşamalarının süreleri (ms)
+- marks:  süreç başlangıcından itibaren önemli anlar (sn): form çizildi, zincir hazır...
+- [Startup] log satırı, metrics histogramı (focusia_startup_seconds{stage=...}) ve
+  FOCUSIA_STARTUP_REPORT verilmişse JSON dosyası (Space soğuk açılışını izlemek için)
+
+Kullanım:
+    def build(w: Warmup):
+        with w.stage("import"):
+            from rag_pipeline import make_retrieval_chain
+        ...
+        return qa
+
+    warm = Warmup(build).start()
+    warm.mark("form_rendered")
+    qa = warm.result()          # hazır değilse bekler; ısınma hata verdiyse hatayı yükseltir
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+import metrics
+
+STARTUP_REPORT = os.getenv("FOCUSIA_STARTUP_REPORT", "")  # boş = rapor dosyası yazılmaz
+
+_STARTUP_SECONDS = metrics.histogram(
+    "focusia_startup_seconds",
+    "Açılış ısınma aşamaları (stage=import|index|chain|query|total)",
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0),
+)
+
+
+def process_age() -> Optional[float]:
+    """Sürecin başlamasından bu yana geçen süre (sn); /proc yoksa None (Linux dışı)."""
+    try:
+        with open("/proc/self/stat", "r") as f:
+            # comm alanı boşluk içerebilir; ")" sonrasındaki 20. alan starttime (clock tick)
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime", "r") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class Warmup:
+    """
+    build(warmup) çağrısını daemon thread'de çalıştırır ve sonucunu saklar.
+    - stage(name): bloğun süresini rapora ekler
+    - mark(name): süreç başlangıcına göre anı kaydeder (aynı isim bir kez)
+    - result(timeout): hazır olana kadar bekler; build hata verdiyse aynı hatayı yükseltir
+    """
+    def __init__(self, build: Callable[["Warmup"], Any], name: str = "focusia-warmup"):
+        self._build = build
+        self._name = name
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._value: Any = None
+        self._error: Optional[BaseException] = None
+        self._t0 = time.perf_counter()
+        age = process_age()
+        # Süreç yaşı okunamazsa saat, Warmup'ın oluşturulduğu andan başlar
+        self._offset = age if age is not None else 0.0
+        self.clock = "process" if age is not None else "warmup"
+        self.stages: Dict[str, float] = {}
+        self.marks: Dict[str, float] = {}
+
+    def start(self) -> "Warmup":
+        self.mark("warmup_started")
+        threading.Thread(target=self._run, name=self._name, daemon=True).start()
+        return self
+
+    # ---- ölçüm ----
+
+    def _now(self) -> float:
+        return self._offset + time.perf_counter() - self._t0
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            secs = time.perf_counter() - t0
+            with self._lock:
+                self.stages[name] = self.stages.get(name, 0.0) + secs * 1000.0
+            _STARTUP_SECONDS.observe(secs, stage=name)
+
+    def mark(self, name: str) -> None:
+        with self._lock:
+            if name in self.marks:
+                return
+            self.marks[name] = self._now()
+        if self._done.is_set():
+            self._write_report()
+
+    # ---- durum ----
+
+    @property
+    def ready(self) -> bool:
+        return self._done.is_set()
+
+    @property
+    def failed(self) -> bool:
+        return self._done.is_set() and self._error is not None
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def result(self, timeout: Optional[float] = None) -> Any:
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"Isınma {timeout:g} sn içinde bitmedi.")
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "clock": self.clock,
+                "ready": self.ready,
+                "error": f"{type(self._error).__name__}: {self._error}" if self._error is not None else None,
+                "stages_ms": {k: round(v, 1) for k, v in self.stages.items()},
+                "marks_s": {k: round(v, 3) for k, v in self.marks.items()},
+            }
+
+    # ---- arka plan ----
+
+    def _run(self) -> None:
+        t0 = time.perf_counter()
+        try:
+            self._value = self._build(self)
+        except BaseException as e:  # hata result() çağıranda yükselir
+            self._error = e
+        total = time.perf_counter() - t0
+        with self._lock:
+            self.stages["total"] = total * 1000.0
+            self.marks["ready"] = self._now()
+        _STARTUP_SECONDS.observe(total, stage="total")
+        self._done.set()
+
+        parts = ", ".join(f"{k} {v / 1000.0:.1f}s" for k, v in self.stages.items() if k != "total")
+        since = "process start" if self.clock == "process" else "warm-up start"
+        status = "ready" if self._error is None else f"FAILED ({type(self._error).__name__}: {self._error})"
+        print(f"[Startup] Chain {status} {self.marks['ready']:.1f}s after {since} (warm-up {total:.1f}s{': ' + parts if parts else ''})")
+        self._write_report()
+
+    def _write_report(self) -> None:
+        if not STARTUP_REPORT:
+            return
+        tmp = f"{STARTUP_REPORT}.{threading.get_ident()}.tmp"  # mark() ile _run aynı anda yazabilir
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.report(), f, ensure_ascii=False, indent=2)
+            os.replace(tmp, STARTUP_REPORT)
+        except OSError as e:
+            print(f"[Startup] {STARTUP_REPORT} yazılamadı: {e}")